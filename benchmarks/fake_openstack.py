@@ -0,0 +1,986 @@
+import collections
+import datetime
+import hashlib
+import ipaddress
+import json
+import logging
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs, urlencode
+
+from openstack_vim_driver.metrics import get_operation
+
+log = logging.getLogger(__name__)
+
+# the catalog sizes of the scale presets of the benchmarks
+SCALES = {
+    'small': {'servers': 200, 'networks': 50, 'ports': 400, 'images': 50},
+    'medium': {'servers': 2000, 'networks': 1000, 'ports': 4000, 'images': 600},
+    'large': {'servers': 10000, 'networks': 5000, 'ports': 20000, 'images': 3000},
+}
+
+# the maximum number of servers Nova returns per page (osapi_max_limit)
+NOVA_MAX_LIMIT = 1000
+
+# the size of the block repeated in the image files of the fake image repository
+IMAGE_BLOCK_SIZE = 1048576
+
+# the first path segment of each emulated service, also used as service label of the call counts
+SERVICES = ('identity', 'compute', 'network', 'image', 'repository')
+
+_IMAGE_SCHEMA_PROPERTIES = ('id', 'name', 'status', 'visibility', 'protected', 'checksum', 'owner', 'size',
+                            'virtual_size', 'min_ram', 'min_disk', 'disk_format', 'container_format', 'created_at',
+                            'updated_at', 'tags', 'file', 'schema', 'os_hidden', 'os_hash_algo', 'os_hash_value')
+
+
+def _timestamp():
+    return datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _new_id():
+    return str(uuid.uuid4())
+
+
+class _NotFound(Exception):
+    pass
+
+
+class _Conflict(Exception):
+    pass
+
+
+class _Subnet(object):
+    """
+    Allocates the IP addresses of a subnet.
+    """
+
+    def __init__(self, cidr):
+        self.network = ipaddress.ip_network(cidr)
+        self.used = set()
+        self._next = 10
+
+    def allocate(self, address=None):
+        if address is not None:
+            if ipaddress.ip_address(address) not in self.network:
+                raise _Conflict('IP address {} is not in subnet {}'.format(address, self.network))
+            if address in self.used:
+                raise _Conflict('IP address {} is already allocated in subnet {}'.format(address, self.network))
+        else:
+            while True:
+                if self._next >= self.network.num_addresses - 1:
+                    raise _Conflict('No more IP addresses available in subnet {}'.format(self.network))
+                address = str(self.network[self._next])
+                self._next += 1
+                if address not in self.used:
+                    break
+        self.used.add(address)
+        return address
+
+    def release(self, address):
+        self.used.discard(address)
+
+
+class FakeOpenStack(object):
+    """
+    Local stand-in for the Keystone, Nova, Neutron and Glance APIs used by the VIM driver, together with an image
+    repository like the NFVO's. The resources are kept in memory, VMs become active server_build_time seconds after
+    their creation and disappear server_delete_time seconds after their deletion. Every request is delayed by the
+    latency configured for its service and counted per operation, e.g. 'network GET /network/v2.0/ports'.
+    """
+
+    def __init__(self, latency=0.0, service_latencies=None, server_build_time=0.5, server_delete_time=0.2,
+                 address='127.0.0.1', port=0):
+        """
+        :param latency: the delay added to every request in seconds
+        :param service_latencies: a dictionary mapping services (see SERVICES) to delays overriding latency
+        :param server_build_time: the number of seconds until a created VM becomes active
+        :param server_delete_time: the number of seconds until a deleted VM disappears
+        :param address: the address the HTTP server binds to
+        :param port: the port of the HTTP server, 0 means a free port is chosen
+        """
+        self.latency = latency
+        self.service_latencies = dict(service_latencies or {})
+        self.server_build_time = server_build_time
+        self.server_delete_time = server_delete_time
+        self.project_id = uuid.uuid4().hex
+        self.servers = collections.OrderedDict()
+        self.deleted_servers = {}
+        self.networks = collections.OrderedDict()
+        self.subnets = collections.OrderedDict()
+        self.ports = collections.OrderedDict()
+        self.routers = collections.OrderedDict()
+        self.floatingips = collections.OrderedDict()
+        self.images = collections.OrderedDict()
+        self.flavors = collections.OrderedDict()
+        self.keypairs = collections.OrderedDict()
+        self.security_groups = collections.OrderedDict()
+        self.public_network_id = None
+        self._allocators = {}
+        self._ports_by_device = collections.defaultdict(list)
+        self._fips_by_port = {}
+        self._transitions = []
+        self._counts = collections.Counter()
+        self._lock = threading.RLock()
+        self._server = _ThreadingHTTPServer((address, port), _FakeOpenStackRequestHandler)
+        self._server.fake_openstack = self
+        self._thread = None
+        self.__create_defaults()
+
+    @property
+    def url(self):
+        return 'http://{}:{}'.format(self._server.server_address[0], self._server.server_address[1])
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-openstack')
+        self._thread.daemon = True
+        self._thread.start()
+        log.debug('Fake OpenStack listening on {}'.format(self.url))
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def vim_instance(self, name='fake-openstack'):
+        """
+        Returns a VIM instance pointing to this fake OpenStack.
+
+        :param name:
+        :return:
+        """
+        return {'id': 'vim-{}'.format(self.project_id[:8]), 'name': name, 'type': 'openstack',
+                'authUrl': '{}/identity/v3'.format(self.url), 'username': 'admin', 'password': 'secret',
+                'tenant': self.project_id, 'domain': 'Default', 'metadata': {}, 'networks': [], 'images': []}
+
+    def image_url(self, name, size):
+        """
+        Returns the URL of an image file of size bytes in the fake image repository.
+
+        :param name:
+        :param size:
+        :return:
+        """
+        return '{}/repository/{}?size={}'.format(self.url, name, size)
+
+    # ----- call counts -----
+
+    def call_counts(self):
+        """
+        :return: a copy of the number of requests per operation since the last reset
+        """
+        with self._lock:
+            return dict(self._counts)
+
+    def reset_call_counts(self):
+        with self._lock:
+            self._counts.clear()
+
+    def count(self, operation):
+        with self._lock:
+            self._counts[operation] += 1
+
+    def get_latency(self, service):
+        return self.service_latencies.get(service, self.latency)
+
+    # ----- fixtures -----
+
+    def populate(self, servers=0, networks=0, ports=0, images=0, flavors=10, keypairs=5, floating_ips=None,
+                 networks_per_router=50):
+        """
+        Creates a catalog of the given size. Every network has a subnet and is attached to a router connected to the
+        external network 'public'. The ports which are not router interfaces are spread over the VMs, every VM gets at
+        least one port. By default a tenth of the VMs gets a floating IP.
+
+        :param servers:
+        :param networks:
+        :param ports: the total number of ports including the router interfaces
+        :param images:
+        :param flavors:
+        :param keypairs:
+        :param floating_ips: the number of VMs with a floating IP
+        :param networks_per_router:
+        :return:
+        """
+        with self._lock:
+            for i in range(flavors):
+                self.create_flavor('m1.flavor-{}'.format(i), ram=512 * (i + 1), vcpus=i + 1, disk=10 * (i + 1))
+            for i in range(keypairs):
+                self.create_keypair('key-{}'.format(i))
+            for i in range(images):
+                self.create_image('image-{}'.format(i), data='image-{}'.format(i).encode('ascii'))
+            routers = []
+            network_ids = []
+            for i in range(networks):
+                if i % networks_per_router == 0:
+                    routers.append(self.create_router('router-{}'.format(len(routers)), self.public_network_id))
+                network = self.create_network('net-{}'.format(i))
+                subnet = self.create_subnet(network.get('id'), 'subnet-{}'.format(i),
+                                            '10.{}.{}.0/24'.format(i // 256, i % 256))
+                self.add_router_interface(routers[-1].get('id'), subnet_id=subnet.get('id'))
+                network_ids.append(network.get('id'))
+            if servers > 0 and len(network_ids) == 0:
+                raise ValueError('VMs need at least one network')
+            server_ports = max(ports - networks, servers)
+            flavor_ids = list(self.flavors)
+            image_ids = list(self.images)
+            floating_ips = servers // 10 if floating_ips is None else floating_ips
+            for i in range(servers):
+                port_count = server_ports // servers + (1 if i < server_ports % servers else 0)
+                self.create_server_with_ports('vm-{}'.format(i), image_ids[i % len(image_ids)] if image_ids else None,
+                                              flavor_ids[i % len(flavor_ids)] if flavor_ids else None,
+                                              [network_ids[(i + j) % len(network_ids)] for j in range(port_count)],
+                                              floating_ip=i < floating_ips)
+            self.__backdate()
+
+    def __backdate(self):
+        # the fixture exists since yesterday, so that it is not returned by filters for recently changed resources
+        yesterday = (datetime.datetime.utcnow() - datetime.timedelta(days=1)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        for resources in (self.servers, self.networks, self.subnets, self.ports, self.routers, self.floatingips,
+                          self.images):
+            for resource in resources.values():
+                for key in ('created', 'updated', 'created_at', 'updated_at'):
+                    if key in resource:
+                        resource[key] = yesterday
+
+    def create_server_with_ports(self, name, image_id, flavor_id, network_ids, floating_ip=False, status='ACTIVE'):
+        """
+        Creates a VM with one port in each of the networks, bypassing the API.
+
+        :return: the VM
+        """
+        with self._lock:
+            ports = [self.create_port(network_id, 'port-{}'.format(name)) for network_id in network_ids]
+            server = self.create_server(name, image_id, flavor_id, [p.get('id') for p in ports], status=status)
+            if floating_ip and len(ports) > 0:
+                self.create_floatingip(self.public_network_id, port_id=ports[0].get('id'))
+            return server
+
+    def __create_defaults(self):
+        self.security_groups['default'] = {'id': _new_id(), 'name': 'default', 'tenant_id': self.project_id,
+                                           'project_id': self.project_id, 'description': 'default',
+                                           'security_group_rules': []}
+        public = self.create_network('public', external=True, shared=True)
+        self.public_network_id = public.get('id')
+        self.create_subnet(self.public_network_id, 'public-subnet', '172.16.0.0/12')
+
+    # ----- Nova -----
+
+    def create_flavor(self, name, ram, vcpus, disk):
+        with self._lock:
+            flavor = {'id': _new_id(), 'name': name, 'ram': ram, 'vcpus': vcpus, 'disk': disk,
+                      'OS-FLV-EXT-DATA:ephemeral': 0, 'swap': '', 'rxtx_factor': 1.0,
+                      'os-flavor-access:is_public': True, 'links': []}
+            self.flavors[flavor.get('id')] = flavor
+            return flavor
+
+    def create_keypair(self, name):
+        with self._lock:
+            keypair = {'name': name, 'public_key': 'ssh-rsa AAAA{} benchmark'.format(uuid.uuid4().hex),
+                       'fingerprint': ':'.join(uuid.uuid4().hex[i:i + 2] for i in range(0, 32, 2))}
+            self.keypairs[name] = keypair
+            return keypair
+
+    def create_server(self, name, image_id, flavor_id, port_ids, status='BUILD'):
+        with self._lock:
+            now = _timestamp()
+            server = {'id': _new_id(), 'name': name, 'status': status, 'tenant_id': self.project_id,
+                      'user_id': 'admin', 'created': now, 'updated': now, 'hostId': uuid.uuid4().hex,
+                      'image': {'id': image_id} if image_id else '', 'flavor': {'id': flavor_id},
+                      'key_name': None, 'metadata': {}, 'links': [], 'OS-EXT-STS:task_state': None,
+                      'OS-EXT-SRV-ATTR:instance_name': 'instance-{:08x}'.format(len(self.servers) + 1),
+                      'OS-EXT-SRV-ATTR:hypervisor_hostname': 'compute-{}'.format(len(self.servers) % 16),
+                      'OS-EXT-AZ:availability_zone': 'nova'}
+            self.servers[server.get('id')] = server
+            for port_id in port_ids:
+                self.__attach_port(port_id, server.get('id'), 'compute:nova')
+            if status == 'BUILD':
+                self._transitions.append((time.monotonic() + self.server_build_time, server.get('id'), 'ACTIVE'))
+            return server
+
+    def delete_server(self, server_id):
+        with self._lock:
+            self.__advance()
+            server = self.__get(self.servers, server_id)
+            server['OS-EXT-STS:task_state'] = 'deleting'
+            server['updated'] = _timestamp()
+            self._transitions.append((time.monotonic() + self.server_delete_time, server_id, 'DELETED'))
+
+    def rebuild_server(self, server_id, image_id):
+        with self._lock:
+            self.__advance()
+            server = self.__get(self.servers, server_id)
+            server['status'] = 'REBUILD'
+            server['image'] = {'id': image_id}
+            server['updated'] = _timestamp()
+            self._transitions.append((time.monotonic() + self.server_build_time, server_id, 'ACTIVE'))
+            return server
+
+    def __advance(self):
+        # applies the due state transitions of the VMs
+        now = time.monotonic()
+        due = [t for t in self._transitions if t[0] <= now]
+        if len(due) == 0:
+            return
+        self._transitions = [t for t in self._transitions if t[0] > now]
+        for _, server_id, status in due:
+            server = self.servers.get(server_id)
+            if server is None:
+                continue
+            server['updated'] = _timestamp()
+            if status == 'DELETED':
+                del self.servers[server_id]
+                server = dict(server, status='DELETED')
+                self.deleted_servers[server_id] = server
+                for port_id in list(self._ports_by_device.pop(server_id, [])):
+                    port = self.ports.get(port_id)
+                    if port is not None:
+                        port['device_id'] = ''
+                        port['device_owner'] = ''
+            else:
+                server['status'] = status
+
+    def __server_view(self, server):
+        addresses = collections.OrderedDict()
+        for port_id in self._ports_by_device.get(server.get('id'), []):
+            port = self.ports.get(port_id)
+            if port is None:
+                continue
+            network = self.networks.get(port.get('network_id'))
+            entries = addresses.setdefault(network.get('name') if network else port.get('network_id'), [])
+            for fixed_ip in port.get('fixed_ips'):
+                entries.append({'addr': fixed_ip.get('ip_address'), 'version': 4, 'OS-EXT-IPS:type': 'fixed',
+                                'OS-EXT-IPS-MAC:mac_addr': port.get('mac_address')})
+            fip = self.floatingips.get(self._fips_by_port.get(port_id))
+            if fip is not None:
+                entries.append({'addr': fip.get('floating_ip_address'), 'version': 4, 'OS-EXT-IPS:type': 'floating',
+                                'OS-EXT-IPS-MAC:mac_addr': port.get('mac_address')})
+        return dict(server, addresses=addresses)
+
+    def list_servers(self, query):
+        with self._lock:
+            self.__advance()
+            changes_since = query.get('changes-since', [None])[0]
+            servers = list(self.servers.values())
+            if changes_since is not None:
+                since = changes_since[:19]
+                servers = [s for s in servers + list(self.deleted_servers.values()) if s.get('updated')[:19] >= since]
+            project_id = query.get('project_id', query.get('tenant_id', [None]))[0]
+            if project_id is not None:
+                servers = [s for s in servers if s.get('tenant_id') == project_id]
+            marker = query.get('marker', [None])[0]
+            if marker is not None:
+                ids = [s.get('id') for s in servers]
+                if marker not in ids:
+                    raise _NotFound('marker [{}] not found'.format(marker))
+                servers = servers[ids.index(marker) + 1:]
+            limit = min(int(query.get('limit', [NOVA_MAX_LIMIT])[0]), NOVA_MAX_LIMIT)
+            return [self.__server_view(s) for s in servers[:limit]]
+
+    def get_server(self, server_id):
+        with self._lock:
+            self.__advance()
+            return self.__server_view(self.__get(self.servers, server_id))
+
+    # ----- Neutron -----
+
+    def create_network(self, name, external=False, shared=False):
+        with self._lock:
+            now = _timestamp()
+            network = {'id': _new_id(), 'name': name, 'tenant_id': self.project_id, 'project_id': self.project_id,
+                       'subnets': [], 'shared': shared, 'router:external': external, 'status': 'ACTIVE',
+                       'admin_state_up': True, 'mtu': 1450, 'created_at': now, 'updated_at': now}
+            self.networks[network.get('id')] = network
+            return network
+
+    def delete_network(self, network_id):
+        with self._lock:
+            network = self.__get(self.networks, network_id)
+            if any(p.get('network_id') == network_id and p.get('device_owner', '').startswith('network:router')
+                   for p in self.ports.values()):
+                raise _Conflict('Unable to complete operation on network {}. There are one or more ports still in '
+                                'use on the network.'.format(network_id))
+            for port_id in [p.get('id') for p in self.ports.values() if p.get('network_id') == network_id]:
+                self.delete_port(port_id)
+            for subnet_id in network.get('subnets'):
+                self.subnets.pop(subnet_id, None)
+                self._allocators.pop(subnet_id, None)
+            del self.networks[network_id]
+
+    def create_subnet(self, network_id, name, cidr, dns_nameservers=None):
+        with self._lock:
+            network = self.__get(self.networks, network_id)
+            allocator = _Subnet(cidr)
+            now = _timestamp()
+            subnet = {'id': _new_id(), 'name': name, 'network_id': network_id, 'tenant_id': self.project_id,
+                      'project_id': self.project_id, 'cidr': str(allocator.network), 'ip_version': 4,
+                      'gateway_ip': allocator.allocate(str(allocator.network[1])), 'enable_dhcp': True,
+                      'dns_nameservers': dns_nameservers or [], 'created_at': now, 'updated_at': now,
+                      'allocation_pools': [{'start': str(allocator.network[2]),
+                                            'end': str(allocator.network[allocator.network.num_addresses - 2])}]}
+            self.subnets[subnet.get('id')] = subnet
+            self._allocators[subnet.get('id')] = allocator
+            network['subnets'] = network.get('subnets') + [subnet.get('id')]
+            network['updated_at'] = now
+            return subnet
+
+    def create_port(self, network_id, name='', fixed_ips=None, device_id='', device_owner='',
+                    security_groups=None):
+        with self._lock:
+            network = self.__get(self.networks, network_id)
+            allocated = []
+            try:
+                for fixed_ip in (fixed_ips or [{}]):
+                    subnet_id = fixed_ip.get('subnet_id') or (network.get('subnets') or [None])[0]
+                    if subnet_id is None:
+                        break
+                    address = self._allocators.get(subnet_id).allocate(fixed_ip.get('ip_address'))
+                    allocated.append({'subnet_id': subnet_id, 'ip_address': address})
+            except _Conflict:
+                for fixed_ip in allocated:
+                    self._allocators.get(fixed_ip.get('subnet_id')).release(fixed_ip.get('ip_address'))
+                raise
+            now = _timestamp()
+            port_number = len(self.ports)
+            port = {'id': _new_id(), 'name': name, 'network_id': network_id, 'tenant_id': self.project_id,
+                    'project_id': self.project_id, 'device_id': '', 'device_owner': '', 'fixed_ips': allocated,
+                    'mac_address': 'fa:16:3e:{:02x}:{:02x}:{:02x}'.format((port_number >> 16) & 0xff,
+                                                                        (port_number >> 8) & 0xff, port_number & 0xff),
+                    'status': 'DOWN', 'admin_state_up': True, 'created_at': now, 'updated_at': now,
+                    'security_groups': security_groups or [self.security_groups['default'].get('id')]}
+            self.ports[port.get('id')] = port
+            if device_id:
+                self.__attach_port(port.get('id'), device_id, device_owner)
+            return port
+
+    def __attach_port(self, port_id, device_id, device_owner):
+        port = self.__get(self.ports, port_id)
+        if port.get('device_id'):
+            self._ports_by_device[port.get('device_id')].remove(port_id)
+        port['device_id'] = device_id
+        port['device_owner'] = device_owner
+        port['status'] = 'ACTIVE'
+        port['updated_at'] = _timestamp()
+        self._ports_by_device[device_id].append(port_id)
+
+    def delete_port(self, port_id):
+        with self._lock:
+            port = self.__get(self.ports, port_id)
+            for fixed_ip in port.get('fixed_ips'):
+                allocator = self._allocators.get(fixed_ip.get('subnet_id'))
+                if allocator is not None:
+                    allocator.release(fixed_ip.get('ip_address'))
+            if port.get('device_id') and port_id in self._ports_by_device.get(port.get('device_id'), []):
+                self._ports_by_device[port.get('device_id')].remove(port_id)
+            fip = self.floatingips.get(self._fips_by_port.pop(port_id, None))
+            if fip is not None:
+                fip.update(port_id=None, fixed_ip_address=None, status='DOWN')
+            del self.ports[port_id]
+
+    def create_router(self, name, external_network_id=None):
+        with self._lock:
+            now = _timestamp()
+            router = {'id': _new_id(), 'name': name, 'tenant_id': self.project_id, 'project_id': self.project_id,
+                      'status': 'ACTIVE', 'admin_state_up': True, 'external_gateway_info': None, 'routes': [],
+                      'created_at': now, 'updated_at': now}
+            self.routers[router.get('id')] = router
+            if external_network_id is not None:
+                self.set_router_gateway(router.get('id'), external_network_id)
+            return router
+
+    def set_router_gateway(self, router_id, external_network_id):
+        with self._lock:
+            router = self.__get(self.routers, router_id)
+            router['external_gateway_info'] = {'network_id': external_network_id, 'enable_snat': True}
+            return router
+
+    def add_router_interface(self, router_id, subnet_id=None, port_id=None):
+        with self._lock:
+            self.__get(self.routers, router_id)
+            if port_id is None:
+                subnet = self.__get(self.subnets, subnet_id)
+                port = self.create_port(subnet.get('network_id'), fixed_ips=[
+                    {'subnet_id': subnet_id, 'ip_address': self.__release_gateway(subnet)}])
+                port_id = port.get('id')
+            port = self.__get(self.ports, port_id)
+            self.__attach_port(port_id, router_id, 'network:router_interface')
+            return {'id': router_id, 'port_id': port_id, 'subnet_id': port.get('fixed_ips')[0].get('subnet_id'),
+                    'tenant_id': self.project_id}
+
+    def __release_gateway(self, subnet):
+        # the router interface takes the gateway address allocated when the subnet was created
+        self._allocators.get(subnet.get('id')).release(subnet.get('gateway_ip'))
+        return subnet.get('gateway_ip')
+
+    def remove_router_interface(self, router_id, port_id=None, subnet_id=None):
+        with self._lock:
+            self.__get(self.routers, router_id)
+            for port in list(self.ports.values()):
+                if port.get('device_id') == router_id and (port.get('id') == port_id or any(
+                        f.get('subnet_id') == subnet_id for f in port.get('fixed_ips'))):
+                    self.delete_port(port.get('id'))
+                    return {'id': router_id, 'port_id': port.get('id')}
+            raise _NotFound('Router {} does not have an interface with port {}'.format(router_id, port_id))
+
+    def create_floatingip(self, floating_network_id, port_id=None, floating_ip_address=None):
+        with self._lock:
+            network = self.__get(self.networks, floating_network_id)
+            address = self._allocators.get(network.get('subnets')[0]).allocate(floating_ip_address)
+            fip = {'id': _new_id(), 'floating_ip_address': address, 'floating_network_id': floating_network_id,
+                   'port_id': None, 'fixed_ip_address': None, 'router_id': None, 'status': 'DOWN',
+                   'tenant_id': self.project_id, 'project_id': self.project_id, 'updated_at': _timestamp()}
+            self.floatingips[fip.get('id')] = fip
+            if port_id is not None:
+                self.update_floatingip(fip.get('id'), port_id)
+            return fip
+
+    def update_floatingip(self, fip_id, port_id):
+        with self._lock:
+            fip = self.__get(self.floatingips, fip_id)
+            if fip.get('port_id') is not None:
+                self._fips_by_port.pop(fip.get('port_id'), None)
+            if port_id is None:
+                fip.update(port_id=None, fixed_ip_address=None, status='DOWN')
+            else:
+                port = self.__get(self.ports, port_id)
+                if port_id in self._fips_by_port:
+                    raise _Conflict('Port {} already has a floating IP'.format(port_id))
+                fip.update(port_id=port_id, fixed_ip_address=port.get('fixed_ips')[0].get('ip_address'),
+                           status='ACTIVE')
+                self._fips_by_port[port_id] = fip_id
+            fip['updated_at'] = _timestamp()
+            return fip
+
+    def delete_floatingip(self, fip_id):
+        with self._lock:
+            fip = self.__get(self.floatingips, fip_id)
+            if fip.get('port_id') is not None:
+                self._fips_by_port.pop(fip.get('port_id'), None)
+            network = self.networks.get(fip.get('floating_network_id'))
+            if network is not None:
+                self._allocators.get(network.get('subnets')[0]).release(fip.get('floating_ip_address'))
+            del self.floatingips[fip_id]
+
+    # ----- Glance -----
+
+    def create_image(self, name, disk_format='qcow2', container_format='bare', min_ram=0, min_disk=0,
+                     visibility='public', data=None):
+        with self._lock:
+            now = _timestamp()
+            image = {'id': _new_id(), 'name': name, 'status': 'queued', 'visibility': visibility,
+                     'protected': False, 'checksum': None, 'owner': self.project_id, 'size': None,
+                     'virtual_size': None, 'min_ram': min_ram, 'min_disk': min_disk, 'disk_format': disk_format,
+                     'container_format': container_format, 'created_at': now, 'updated_at': now, 'tags': [],
+                     'os_hidden': False, 'os_hash_algo': None, 'os_hash_value': None}
+            image['file'] = '/v2/images/{}/file'.format(image.get('id'))
+            image['self'] = '/v2/images/{}'.format(image.get('id'))
+            image['schema'] = '/v2/schemas/image'
+            self.images[image.get('id')] = image
+            if data is not None:
+                self.set_image_data(image.get('id'), len(data), hashlib.md5(data).hexdigest())
+            return image
+
+    def set_image_data(self, image_id, size, checksum):
+        with self._lock:
+            image = self.__get(self.images, image_id)
+            image.update(status='active', size=size, checksum=checksum, updated_at=_timestamp())
+            return image
+
+    def list_images(self, query):
+        with self._lock:
+            images = list(self.images.values())
+            for name, values in query.items():
+                if name in ('limit', 'marker', 'sort_key', 'sort_dir', 'sort'):
+                    continue
+                value = values[0]
+                if name in ('updated_at', 'created_at') and ':' in value and value.split(':')[0] in (
+                        'gte', 'gt', 'lte', 'lt', 'eq', 'neq'):
+                    operator, timestamp = value.split(':', 1)
+                    timestamp = timestamp[:19]
+                    compare = {'gte': lambda a: a >= timestamp, 'gt': lambda a: a > timestamp,
+                               'lte': lambda a: a <= timestamp, 'lt': lambda a: a < timestamp,
+                               'eq': lambda a: a == timestamp, 'neq': lambda a: a != timestamp}.get(operator)
+                    images = [i for i in images if compare(i.get(name)[:19])]
+                else:
+                    images = [i for i in images if str(i.get(name)) == value]
+            marker = query.get('marker', [None])[0]
+            if marker is not None:
+                ids = [i.get('id') for i in images]
+                if marker not in ids:
+                    raise _NotFound('marker {} not found'.format(marker))
+                images = images[ids.index(marker) + 1:]
+            limit = int(query.get('limit', [25])[0])
+            page = images[:limit]
+            result = {'images': [dict(i) for i in page], 'first': '/v2/images', 'schema': '/v2/schemas/images'}
+            if len(images) > limit:
+                next_query = dict((name, values[0]) for name, values in query.items() if name != 'marker')
+                next_query['marker'] = page[-1].get('id')
+                result['next'] = '/v2/images?{}'.format(urlencode(next_query))
+            return result
+
+    def image_schema(self):
+        return {'name': 'image', 'additionalProperties': {'type': 'string'},
+                'properties': {name: {} for name in _IMAGE_SCHEMA_PROPERTIES}, 'links': []}
+
+    # ----- helpers -----
+
+    @staticmethod
+    def __get(resources, resource_id):
+        resource = resources.get(resource_id)
+        if resource is None:
+            raise _NotFound('Resource {} could not be found'.format(resource_id))
+        return resource
+
+    def filter_resources(self, resources, query):
+        """
+        Applies Neutron's list filters: repeated parameters match any of the values, fields selects the attributes.
+
+        :param resources: the list of resources
+        :param query: the parsed query string
+        :return:
+        """
+        with self._lock:
+            result = list(resources)
+            changed_since = query.get('changed_since', [None])[0]
+            if changed_since is not None:
+                result = [r for r in result if (r.get('updated_at') or '')[:19] >= changed_since[:19]]
+            for name, values in query.items():
+                if name in ('fields', 'limit', 'marker', 'sort_key', 'sort_dir', 'page_reverse', 'changed_since'):
+                    continue
+                if name == 'id':
+                    result = [r for r in result if r.get('id') in values]
+                    continue
+                lowered = set(v.lower() for v in values)
+                result = [r for r in result if
+                          (str(r.get(name)).lower() in lowered if isinstance(r.get(name), bool) else
+                           str(r.get(name) if r.get(name) is not None else '') in values)]
+            fields = query.get('fields')
+            if fields:
+                return [{name: r.get(name) for name in fields} for r in result]
+            return [dict(r) for r in result]
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _FakeOpenStackRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        log.debug('{} {}'.format(self.client_address[0], format % args))
+
+    def do_GET(self):
+        self.__handle('GET')
+
+    def do_HEAD(self):
+        self.__handle('HEAD')
+
+    def do_POST(self):
+        self.__handle('POST')
+
+    def do_PUT(self):
+        self.__handle('PUT')
+
+    def do_DELETE(self):
+        self.__handle('DELETE')
+
+    def __read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            return self.__read_chunks()
+        length = int(self.headers.get('Content-Length') or 0)
+        return iter([self.rfile.read(length)] if length > 0 else [])
+
+    def __read_chunks(self):
+        while True:
+            size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+            if size == 0:
+                # skip the trailer
+                while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                    pass
+                return
+            yield self.rfile.read(size)
+            self.rfile.readline()
+
+    def __handle(self, method):
+        fake = self.server.fake_openstack
+        parsed = urlparse(self.path)
+        segments = [s for s in parsed.path.split('/') if s != '']
+        service = segments[0] if len(segments) > 0 else ''
+        # the image files are counted together, their names differ in every benchmark
+        operation = '{} /repository/{{file}}'.format(method) if service == 'repository' else get_operation(
+            method, parsed.path)
+        fake.count('{} {}'.format(service, operation))
+        body = self.__read_body()
+        latency = fake.get_latency(service)
+        if latency > 0:
+            time.sleep(latency)
+        handler = {'identity': _identity, 'compute': _compute, 'network': _network, 'image': _image,
+                   'repository': _repository}.get(service)
+        try:
+            if handler is None:
+                raise _NotFound('Unknown service {}'.format(service))
+            handler(self, fake, method, segments[1:], parse_qs(parsed.query, keep_blank_values=True), body)
+        except _NotFound as e:
+            self.send_json(404, self.__error(service, 404, 'itemNotFound', str(e)))
+        except _Conflict as e:
+            self.send_json(409, self.__error(service, 409, 'conflictingRequest', str(e)))
+        except Exception as e:
+            log.exception('Error in fake OpenStack handling {} {}'.format(method, self.path))
+            self.send_json(500, self.__error(service, 500, 'computeFault', str(e)))
+
+    @staticmethod
+    def __error(service, code, nova_type, message):
+        if service == 'network':
+            return {'NeutronError': {'type': 'NotFound' if code == 404 else 'Conflict', 'message': message,
+                                     'detail': ''}}
+        return {nova_type: {'code': code, 'message': message}}
+
+    def send_json(self, status, document=None, headers=None):
+        data = json.dumps(document).encode('utf-8') if document is not None else b''
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if document is not None:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+
+def _json(body):
+    data = b''.join(body)
+    return json.loads(data.decode('utf-8')) if len(data) > 0 else {}
+
+
+def _identity(handler, fake, method, path, query, body):
+    if method == 'GET' and path in (['v3'], []):
+        version = {'id': 'v3.14', 'status': 'stable', 'updated': '2020-04-07T00:00:00Z',
+                   'links': [{'rel': 'self', 'href': '{}/identity/v3/'.format(fake.url)}],
+                   'media-types': [{'base': 'application/json', 'type': 'application/vnd.openstack.identity-v3+json'}]}
+        if path == []:
+            handler.send_json(300, {'versions': {'values': [version]}})
+        else:
+            handler.send_json(200, {'version': version})
+        return
+    if method == 'POST' and path == ['v3', 'auth', 'tokens']:
+        _json(body)
+        domain = {'id': 'default', 'name': 'Default'}
+        catalog = [{'type': service_type, 'name': name, 'id': uuid.uuid4().hex,
+                    'endpoints': [{'id': uuid.uuid4().hex, 'interface': interface, 'region': 'RegionOne',
+                                   'region_id': 'RegionOne', 'url': '{}/{}'.format(fake.url, url)} for interface in
+                                  ('public', 'internal', 'admin')]} for service_type, name, url in (
+                       ('identity', 'keystone', 'identity'), ('compute', 'nova', 'compute/v2.1'),
+                       ('network', 'neutron', 'network'), ('image', 'glance', 'image'))]
+        expires = (datetime.datetime.utcnow() + datetime.timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M:%S.000000Z')
+        token = {'methods': ['password'], 'expires_at': expires, 'issued_at': _timestamp(),
+                 'user': {'id': 'admin', 'name': 'admin', 'domain': domain},
+                 'project': {'id': fake.project_id, 'name': 'benchmark', 'domain': domain},
+                 'roles': [{'id': 'admin', 'name': 'admin'}], 'catalog': catalog}
+        handler.send_json(201, {'token': token}, headers={'X-Subject-Token': uuid.uuid4().hex})
+        return
+    raise _NotFound('Unknown identity path /{}'.format('/'.join(path)))
+
+
+def _compute(handler, fake, method, path, query, body):
+    if len(path) > 0 and path[0] == 'v2.1':
+        path = path[1:]
+    # Nova's legacy URLs contain the project ID
+    if len(path) > 0 and path[0] == fake.project_id:
+        path = path[1:]
+    route = (method, path[0] if len(path) > 0 else '', len(path))
+    if route == ('GET', 'servers', 2) and path[1] == 'detail' or route == ('GET', 'servers', 1):
+        handler.send_json(200, {'servers': fake.list_servers(query)})
+    elif route == ('GET', 'servers', 2):
+        handler.send_json(200, {'server': fake.get_server(path[1])})
+    elif route == ('POST', 'servers', 1):
+        document = _json(body).get('server')
+        port_ids = [n.get('port') for n in document.get('networks') or [] if n.get('port')]
+        for network in document.get('networks') or []:
+            if network.get('port') is None and network.get('uuid') is not None:
+                port_ids.append(fake.create_port(network.get('uuid')).get('id'))
+        server = fake.create_server(document.get('name'), document.get('imageRef'), document.get('flavorRef'),
+                                    port_ids)
+        handler.send_json(202, {'server': {'id': server.get('id'), 'links': [], 'adminPass': 'secret',
+                                           'OS-DCF:diskConfig': 'MANUAL',
+                                           'security_groups': document.get('security_groups') or []}})
+    elif route == ('DELETE', 'servers', 2):
+        fake.delete_server(path[1])
+        handler.send_json(204)
+    elif route == ('POST', 'servers', 3) and path[2] == 'action':
+        document = _json(body)
+        if 'rebuild' not in document:
+            raise _NotFound('Unsupported server action {}'.format(list(document)))
+        fake.rebuild_server(path[1], document.get('rebuild').get('imageRef'))
+        handler.send_json(202, {'server': fake.get_server(path[1])})
+    elif route == ('GET', 'flavors', 2) and path[1] == 'detail':
+        handler.send_json(200, {'flavors': list(fake.flavors.values())})
+    elif route == ('GET', 'flavors', 2):
+        handler.send_json(200, {'flavor': fake.flavors.get(path[1]) or _raise(_NotFound(path[1]))})
+    elif route == ('POST', 'flavors', 1):
+        document = _json(body).get('flavor')
+        handler.send_json(200, {'flavor': fake.create_flavor(document.get('name'), document.get('ram'),
+                                                             document.get('vcpus'), document.get('disk'))})
+    elif route[:2] == ('GET', 'os-availability-zone'):
+        handler.send_json(200, {'availabilityZoneInfo': [{'zoneName': 'nova', 'zoneState': {'available': True},
+                                                          'hosts': None}]})
+    elif route == ('GET', 'os-keypairs', 1):
+        handler.send_json(200, {'keypairs': [{'keypair': k} for k in fake.keypairs.values()]})
+    elif route == ('GET', 'os-quota-sets', 2):
+        handler.send_json(200, {'quota_set': {'id': path[1], 'cores': 1000, 'instances': 10000, 'key_pairs': 100,
+                                              'ram': 5120000, 'metadata_items': 128, 'server_groups': 10,
+                                              'server_group_members': 10, 'injected_files': 5,
+                                              'injected_file_content_bytes': 10240,
+                                              'injected_file_path_bytes': 255}})
+    else:
+        raise _NotFound('Unknown compute path /{}'.format('/'.join(path)))
+
+
+def _raise(exception):
+    raise exception
+
+
+# the Neutron collections and the attributes of the FakeOpenStack holding them
+_NEUTRON_COLLECTIONS = {'networks': 'networks', 'subnets': 'subnets', 'ports': 'ports', 'routers': 'routers',
+                        'floatingips': 'floatingips', 'security-groups': 'security_groups'}
+
+
+def _network(handler, fake, method, path, query, body):
+    if len(path) > 0 and path[0] == 'v2.0':
+        path = path[1:]
+    path = [segment[:-len('.json')] if segment.endswith('.json') else segment for segment in path]
+    collection = path[0] if len(path) > 0 else ''
+    singular = {'security-groups': 'security_group', 'floatingips': 'floatingip'}.get(collection, collection[:-1])
+    if method == 'GET' and len(path) == 1 and collection in _NEUTRON_COLLECTIONS:
+        resources = getattr(fake, _NEUTRON_COLLECTIONS.get(collection)).values()
+        handler.send_json(200, {collection.replace('-', '_'): fake.filter_resources(resources, query)})
+    elif method == 'GET' and len(path) == 2 and collection == 'quotas':
+        handler.send_json(200, {'quota': {'network': 1000, 'subnet': 1000, 'port': 50000, 'router': 100,
+                                          'floatingip': 5000, 'security_group': 100, 'security_group_rule': 1000}})
+    elif method == 'GET' and len(path) == 2 and collection in _NEUTRON_COLLECTIONS:
+        resource = getattr(fake, _NEUTRON_COLLECTIONS.get(collection)).get(path[1])
+        if resource is None:
+            raise _NotFound('{} {} could not be found'.format(singular, path[1]))
+        handler.send_json(200, {singular.replace('-', '_'): dict(resource)})
+    elif method == 'POST' and len(path) == 1:
+        document = _json(body).get(singular)
+        if collection == 'networks':
+            resource = fake.create_network(document.get('name'), external=document.get('router:external', False),
+                                           shared=document.get('shared', False))
+        elif collection == 'subnets':
+            resource = fake.create_subnet(document.get('network_id'), document.get('name'), document.get('cidr'),
+                                          document.get('dns_nameservers'))
+        elif collection == 'ports':
+            resource = fake.create_port(document.get('network_id'), document.get('name', ''),
+                                        fixed_ips=document.get('fixed_ips'),
+                                        device_id=document.get('device_id', ''),
+                                        device_owner=document.get('device_owner', ''),
+                                        security_groups=document.get('security_groups'))
+        elif collection == 'floatingips':
+            resource = fake.create_floatingip(document.get('floating_network_id'), port_id=document.get('port_id'),
+                                              floating_ip_address=document.get('floating_ip_address'))
+        elif collection == 'routers':
+            gateway = document.get('external_gateway_info') or {}
+            resource = fake.create_router(document.get('name'), gateway.get('network_id'))
+        else:
+            raise _NotFound('Unable to create {}'.format(collection))
+        handler.send_json(201, {singular: dict(resource)})
+    elif method == 'PUT' and len(path) == 3 and collection == 'routers':
+        document = _json(body)
+        if path[2] == 'add_router_interface':
+            handler.send_json(200, fake.add_router_interface(path[1], subnet_id=document.get('subnet_id'),
+                                                             port_id=document.get('port_id')))
+        elif path[2] == 'remove_router_interface':
+            handler.send_json(200, fake.remove_router_interface(path[1], port_id=document.get('port_id'),
+                                                                subnet_id=document.get('subnet_id')))
+        else:
+            raise _NotFound('Unknown router action {}'.format(path[2]))
+    elif method == 'PUT' and len(path) == 2 and collection == 'routers':
+        gateway = (_json(body).get('router') or {}).get('external_gateway_info') or {}
+        handler.send_json(200, {'router': dict(fake.set_router_gateway(path[1], gateway.get('network_id')))})
+    elif method == 'PUT' and len(path) == 2 and collection == 'floatingips':
+        document = _json(body).get('floatingip')
+        handler.send_json(200, {'floatingip': dict(fake.update_floatingip(path[1], document.get('port_id')))})
+    elif method == 'DELETE' and len(path) == 2 and collection in ('networks', 'ports', 'floatingips'):
+        {'networks': fake.delete_network, 'ports': fake.delete_port,
+         'floatingips': fake.delete_floatingip}.get(collection)(path[1])
+        handler.send_json(204)
+    else:
+        raise _NotFound('Unknown network path /{}'.format('/'.join(path)))
+
+
+def _image(handler, fake, method, path, query, body):
+    if len(path) > 0 and path[0] == 'v2':
+        path = path[1:]
+    if method == 'GET' and path == ['schemas', 'image']:
+        handler.send_json(200, fake.image_schema())
+    elif method == 'GET' and path == ['images']:
+        handler.send_json(200, fake.list_images(query))
+    elif method == 'POST' and path == ['images']:
+        document = _json(body)
+        image = fake.create_image(document.get('name'), disk_format=document.get('disk_format'),
+                                  container_format=document.get('container_format'),
+                                  min_ram=document.get('min_ram', 0), min_disk=document.get('min_disk', 0),
+                                  visibility=document.get('visibility', 'shared'))
+        handler.send_json(201, dict(image))
+    elif method == 'GET' and len(path) == 2 and path[0] == 'images':
+        image = fake.images.get(path[1])
+        if image is None:
+            raise _NotFound('Image {} not found'.format(path[1]))
+        handler.send_json(200, dict(image))
+    elif method == 'PUT' and len(path) == 3 and path[0] == 'images' and path[2] == 'file':
+        md5 = hashlib.md5()
+        size = 0
+        for chunk in body:
+            md5.update(chunk)
+            size += len(chunk)
+        fake.set_image_data(path[1], size, md5.hexdigest())
+        handler.send_json(204)
+    elif method == 'DELETE' and len(path) == 2 and path[0] == 'images':
+        with fake._lock:
+            if fake.images.pop(path[1], None) is None:
+                raise _NotFound('Image {} not found'.format(path[1]))
+        handler.send_json(204)
+    else:
+        raise _NotFound('Unknown image path /{}'.format('/'.join(path)))
+
+
+def _image_block(name):
+    seed = hashlib.sha256(name.encode('utf-8')).digest()
+    return (seed * (IMAGE_BLOCK_SIZE // len(seed) + 1))[:IMAGE_BLOCK_SIZE]
+
+
+def _repository(handler, fake, method, path, query, body):
+    if method not in ('GET', 'HEAD') or len(path) != 1:
+        raise _NotFound('Unknown repository path /{}'.format('/'.join(path)))
+    size = int(query.get('size', [IMAGE_BLOCK_SIZE])[0])
+    block = _image_block(path[0])
+    etag = '"{}-{}"'.format(path[0], size)
+    if handler.headers.get('If-None-Match') == etag:
+        handler.send_response(304)
+        handler.send_header('ETag', etag)
+        handler.send_header('Content-Length', '0')
+        handler.end_headers()
+        return
+    handler.send_response(200)
+    handler.send_header('Content-Type', 'application/octet-stream')
+    handler.send_header('Content-Length', str(size))
+    handler.send_header('ETag', etag)
+    handler.end_headers()
+    if method == 'HEAD':
+        return
+    remaining = size
+    while remaining > 0:
+        chunk = block[:min(remaining, len(block))]
+        handler.wfile.write(chunk)
+        remaining -= len(chunk)
@@ -0,0 +1,441 @@
+"""
+Load harness replaying NFVO message traces through the worker pool of the plugin SDK into the VIM driver, which runs
+against a local fake OpenStack (see fake_openstack.py).
+
+The messages are published to an in-process queue instead of RabbitMQ. Listener threads consume them with the SDK's
+dispatch logic, the SDK's WorkerPool processes them with one driver instance per message and reply threads take the
+answers from the reply queue, so that the effect of the -w, -l and -r options of the VIM driver can be measured, e.g.:
+
+    python -m benchmarks.load --mix refresh=5,list_server=5,launch=5,delete=5 --bursts 3 --workers 10,100
+
+A trace is a JSON lines file, every line is a message of the NFVO with the additional key offset, the number of
+seconds after the start at which it is published:
+
+    {"offset": 0.0, "methodName": "refresh", "parameters": ["$vim"]}
+
+The placeholder $vim is replaced with the VIM instance of the fake OpenStack and $server with the ID of a VM which
+is created for the trace beforehand.
+"""
+import argparse
+import collections
+import functools
+import itertools
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+
+from benchmarks.fake_openstack import FakeOpenStack, SCALES
+from benchmarks.run import _connection_point, configure_driver, percentile
+
+log = logging.getLogger(__name__)
+
+# the messages of the synthetic traces: name -> (methodName, function returning the parameters for an index)
+SYNTHETIC_MESSAGES = collections.OrderedDict([
+    ('refresh', ('refresh', lambda i: ['$vim'])),
+    ('list_server', ('listServer', lambda i: ['$vim'])),
+    ('list_images', ('listImages', lambda i: ['$vim'])),
+    ('list_networks', ('listNetworks', lambda i: ['$vim'])),
+    ('launch', ('launchInstanceAndWait', lambda i: [
+        '$vim', 'load-vm-{}'.format(i), 'image-0', 'm1.flavor-0', 'key-0',
+        [_connection_point('net-{}'.format(i % 10), i, floating_ip='random' if i % 2 == 0 else None)], ['default'],
+        '', {}, []])),
+    ('delete', ('deleteServerByIdAndWait', lambda i: ['$vim', '$server'])),
+])
+
+# the interval in which the saturation of the threads and queues is sampled (in seconds)
+SAMPLE_INTERVAL = 0.05
+
+_Properties = collections.namedtuple('_Properties', 'reply_to correlation_id')
+_Method = collections.namedtuple('_Method', 'delivery_tag')
+
+
+def synthetic_trace(mix, bursts=1, burst_interval=5.0, seed=0):
+    """
+    Returns a trace consisting of bursts of messages published at the same time.
+
+    :param mix: a dictionary mapping names of SYNTHETIC_MESSAGES to the number of messages per burst
+    :param bursts: the number of bursts
+    :param burst_interval: the seconds between two bursts
+    :param seed: the seed of the shuffling of the messages within a burst
+    :return: a list of messages
+    """
+    rng = random.Random(seed)
+    counter = itertools.count()
+    trace = []
+    for burst in range(bursts):
+        messages = []
+        for name, count in mix.items():
+            if name not in SYNTHETIC_MESSAGES:
+                raise ValueError('Unknown message {}, use one of {}'.format(name, ', '.join(SYNTHETIC_MESSAGES)))
+            method_name, parameters = SYNTHETIC_MESSAGES.get(name)
+            messages.extend({'offset': burst * burst_interval, 'methodName': method_name,
+                             'parameters': parameters(next(counter))} for _ in range(count))
+        rng.shuffle(messages)
+        trace.extend(messages)
+    return trace
+
+
+def load_trace(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip() != '']
+
+
+def save_trace(trace, path):
+    with open(path, 'w') as f:
+        for message in trace:
+            f.write(json.dumps(message) + '\n')
+
+
+def _count_placeholders(value, placeholder):
+    if isinstance(value, list):
+        return sum(_count_placeholders(v, placeholder) for v in value)
+    if isinstance(value, dict):
+        return sum(_count_placeholders(v, placeholder) for v in value.values())
+    return 1 if value == placeholder else 0
+
+
+def _resolve(value, resolvers):
+    if isinstance(value, list):
+        return [_resolve(v, resolvers) for v in value]
+    if isinstance(value, dict):
+        return {k: _resolve(v, resolvers) for k, v in value.items()}
+    if isinstance(value, str) and value in resolvers:
+        return resolvers.get(value)()
+    return value
+
+
+class _Recorder(object):
+    """
+    Thread-safe record of the publish, start, end and reply times of the messages.
+    """
+
+    def __init__(self):
+        self.published = {}
+        self.started = {}
+        self.finished = {}
+        self.replied = {}
+        self.methods = {}
+        self.errors = set()
+        self.lock = threading.Lock()
+
+    def record(self, times, correlation_id):
+        with self.lock:
+            times[correlation_id] = time.monotonic()
+
+
+def _traced_driver_class(driver_class, recorder):
+    """
+    Returns a subclass of the driver class recording when the messages are processed. The correlation ID is passed
+    in the message body, which the SDK ignores apart from methodName and parameters.
+    """
+
+    class TracedDriver(driver_class):
+        def process_message(self, message):
+            correlation_id = json.loads(message).get('correlationId')
+            recorder.record(recorder.started, correlation_id)
+            try:
+                response = super(TracedDriver, self).process_message(message)
+                if response and 'exception' in json.loads(response):
+                    with recorder.lock:
+                        recorder.errors.add(correlation_id)
+                return response
+            except Exception:
+                with recorder.lock:
+                    recorder.errors.add(correlation_id)
+                raise
+            finally:
+                recorder.record(recorder.finished, correlation_id)
+
+    return TracedDriver
+
+
+class _InProcessChannel(object):
+    def basic_ack(self, delivery_tag):
+        pass
+
+
+class _InProcessReplyThread(threading.Thread):
+    """
+    Takes the answers from the reply queue like the SDK's ReplyThread, but instead of publishing them to RabbitMQ
+    waits publish_latency seconds and records the reply.
+    """
+
+    def __init__(self, reply_queue, recorder, publish_latency=0.0):
+        super(_InProcessReplyThread, self).__init__(name='load-reply')
+        self.daemon = True
+        self.reply_queue = reply_queue
+        self.recorder = recorder
+        self.publish_latency = publish_latency
+
+    def run(self):
+        while True:
+            reply_to, correlation_id, response = self.reply_queue.get()
+            try:
+                if reply_to is None:
+                    return
+                if self.publish_latency > 0:
+                    time.sleep(self.publish_latency)
+                self.recorder.record(self.recorder.replied, correlation_id)
+            finally:
+                self.reply_queue.task_done()
+
+
+def _create_listener_class():
+    # imported here so that the module can be loaded without the Open Baton SDK, e.g. for --help
+    from org.openbaton.plugin.sdk.utils import ListenerThread
+
+    class InProcessListenerThread(ListenerThread):
+        """
+        The SDK's listener thread consuming from an in-process queue instead of RabbitMQ.
+        The time spent in dispatch, i.e. waiting for a free worker, is accumulated in blocked_seconds.
+        """
+
+        def __init__(self, broker_queue, worker_pool, vim_driver_type='openstack'):
+            super(InProcessListenerThread, self).__init__(None, worker_pool, None, None, 0, None, None,
+                                                          vim_driver_type)
+            self.daemon = True
+            self.broker_queue = broker_queue
+            self.channel = _InProcessChannel()
+            self.blocked_seconds = 0.0
+            self.stopped = threading.Event()
+
+        def run(self):
+            while not self.stopped.is_set():
+                try:
+                    delivery_tag, props, body = self.broker_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                started = time.monotonic()
+                self.dispatch(self.channel, _Method(delivery_tag), props, body)
+                self.blocked_seconds += time.monotonic() - started
+                self.broker_queue.task_done()
+
+        def stop(self):
+            self.stopped.set()
+
+    return InProcessListenerThread
+
+
+def run_load(trace, workers, listeners, repliers, fake, driver_args=None, speed=1.0, publish_latency=0.0,
+             timeout=600):
+    """
+    Replays a trace through the SDK's worker pool into the driver and returns the results.
+
+    :param trace: a list of messages with offsets
+    :param workers: the maximum number of worker threads (-w), zero or less means unlimited
+    :param listeners: the number of listener threads (-l)
+    :param repliers: the number of reply threads (-r)
+    :param fake: a started FakeOpenStack
+    :param driver_args: keyword arguments for the OpenstackVimDriver and its configure method
+    :param speed: factor by which the trace is replayed faster
+    :param publish_latency: the seconds the reply threads need for publishing an answer
+    :param timeout: the maximum number of seconds to wait for the answers
+    :return: a dictionary with the throughput, the latencies and the saturation
+    """
+    from org.openbaton.plugin.sdk.utils import WorkerPool
+    import openstack_vim_driver.openstack_vim_driver as driver_module
+    from openstack_vim_driver.sessions import get_pool_size
+
+    recorder = _Recorder()
+    vim_instance = fake.vim_instance()
+    # size the connection pools like main() of the VIM driver does
+    driver_args = configure_driver(driver_module, driver_args)
+    driver_module.session_registry.pool_size = get_pool_size(workers, driver_args.get('parallel_requests', 8))
+    # the NFVO passes VIM instances containing the networks known from the last refresh
+    driver_module.OpenstackVimDriver(**driver_args).refresh(vim_instance)
+    network_id = next(n.get('id') for n in fake.networks.values() if n.get('name') == 'net-0')
+    server_ids = collections.deque(
+        fake.create_server_with_ports('load-delete-{}'.format(i), next(iter(fake.images)), next(iter(fake.flavors)),
+                                      [network_id], floating_ip=True).get('id') for i in
+        range(sum(_count_placeholders(m.get('parameters'), '$server') for m in trace)))
+    resolvers = {'$vim': lambda: vim_instance, '$server': server_ids.popleft}
+    fake.reset_call_counts()
+
+    reply_queue = queue.Queue()
+    broker_queue = queue.Queue()
+    driver_class = _traced_driver_class(driver_module.OpenstackVimDriver, recorder)
+    worker_pool = WorkerPool(reply_queue, functools.partial(driver_class, **driver_args), workers)
+    listener_threads = [_create_listener_class()(broker_queue, worker_pool) for _ in range(max(1, listeners))]
+    reply_threads = [_InProcessReplyThread(reply_queue, recorder, publish_latency) for _ in range(max(1, repliers))]
+    for thread in listener_threads + reply_threads:
+        thread.start()
+
+    samples = []
+    sampling = threading.Event()
+
+    def sample():
+        while not sampling.is_set():
+            with worker_pool.lock:
+                active_workers = len(worker_pool.threads)
+            samples.append((active_workers, broker_queue.qsize(), reply_queue.qsize()))
+            time.sleep(SAMPLE_INTERVAL)
+
+    sampler = threading.Thread(target=sample, name='load-sampler')
+    sampler.daemon = True
+    sampler.start()
+
+    started = time.monotonic()
+    for delivery_tag, message in enumerate(sorted(trace, key=lambda m: m.get('offset', 0))):
+        delay = started + message.get('offset', 0) / speed - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        correlation_id = str(delivery_tag)
+        body = {'methodName': message.get('methodName'), 'parameters': _resolve(message.get('parameters'), resolvers),
+                'correlationId': correlation_id}
+        with recorder.lock:
+            recorder.methods[correlation_id] = message.get('methodName')
+        recorder.record(recorder.published, correlation_id)
+        broker_queue.put((delivery_tag, _Properties('load-harness', correlation_id), json.dumps(body)))
+
+    # wait until every message has been processed and its answer, if any, has been taken from the reply queue
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with recorder.lock:
+            done = len(recorder.finished) == len(trace)
+        if done and broker_queue.unfinished_tasks == 0 and reply_queue.unfinished_tasks == 0:
+            break
+        time.sleep(0.01)
+    else:
+        log.error('Not all messages were processed within {} seconds'.format(timeout))
+    wall_time = time.monotonic() - started
+    sampling.set()
+    sampler.join()
+    for thread in listener_threads:
+        thread.stop()
+    for thread in listener_threads:
+        thread.join()
+    worker_pool.shutdown()
+    for _ in reply_threads:
+        reply_queue.put((None, None, None))
+    for thread in reply_threads:
+        thread.join()
+
+    return _summarize(recorder, samples, listener_threads, workers, wall_time, fake.call_counts())
+
+
+def _latency_summary(values):
+    if len(values) == 0:
+        return {'count': 0}
+    return {'count': len(values), 'p50': round(percentile(values, 0.5), 4), 'p99': round(percentile(values, 0.99), 4),
+            'max': round(max(values), 4)}
+
+
+def _summarize(recorder, samples, listener_threads, workers, wall_time, api_calls):
+    with recorder.lock:
+        completed = [c for c in recorder.published if c in recorder.finished]
+        # the answers of methods returning nothing are not replied, for them the end of the processing counts
+        end_to_end = {c: recorder.replied.get(c, recorder.finished.get(c)) - recorder.published.get(c) for c in
+                      completed}
+        queue_wait = [recorder.started.get(c) - recorder.published.get(c) for c in completed]
+        by_method = collections.defaultdict(list)
+        for c in completed:
+            by_method[recorder.methods.get(c)].append(end_to_end.get(c))
+        errors = len(recorder.errors)
+    active_workers = [s[0] for s in samples] or [0]
+    return {'messages': len(recorder.published),
+            'completed': len(completed),
+            'errors': errors,
+            'seconds': round(wall_time, 3),
+            'messages_per_second': round(len(completed) / wall_time, 3) if wall_time > 0 else None,
+            'latency': _latency_summary(list(end_to_end.values())),
+            'queue_wait': _latency_summary(queue_wait),
+            'latency_by_method': collections.OrderedDict(
+                (method, _latency_summary(values)) for method, values in sorted(by_method.items())),
+            'saturation': {
+                'max_active_workers': max(active_workers),
+                'mean_active_workers': round(sum(active_workers) / len(active_workers), 2),
+                'worker_pool_full': round(sum(1 for a in active_workers if 0 < workers <= a) / len(active_workers),
+                                          3),
+                'listener_blocked_seconds': round(sum(t.blocked_seconds for t in listener_threads), 3),
+                'max_broker_queue': max([s[1] for s in samples] or [0]),
+                'max_reply_queue': max([s[2] for s in samples] or [0])},
+            'api_calls': sum(api_calls.values())}
+
+
+def print_report(results, out=sys.stdout):
+    out.write('{:>6} {:>4} {:>4} {:>6} {:>7} {:>8} {:>8} {:>8} {:>9} {:>8} {:>8} {:>9} {:>7}\n'.format(
+        '-w', '-l', '-r', 'msgs', 'errors', 'msg/s', 'p50', 'p99', 'wait p99', 'workers', 'full', 'blocked',
+        'queue'))
+    for (workers, listeners, repliers), result in results:
+        saturation = result.get('saturation')
+        out.write('{:>6} {:>4} {:>4} {:>6} {:>7} {:>8} {:>7.3f}s {:>7.3f}s {:>8.3f}s {:>8} {:>7.0%} {:>8.1f}s {:>7}\n'
+                  .format(workers, listeners, repliers, result.get('completed'), result.get('errors'),
+                          result.get('messages_per_second'), result.get('latency').get('p50', 0),
+                          result.get('latency').get('p99', 0), result.get('queue_wait').get('p99', 0),
+                          saturation.get('max_active_workers'), saturation.get('worker_pool_full'),
+                          saturation.get('listener_blocked_seconds'), saturation.get('max_broker_queue')))
+        for method, latency in result.get('latency_by_method').items():
+            out.write('    {:<28} {:>5} messages, p50 {:.3f}s, p99 {:.3f}s\n'.format(
+                method, latency.get('count'), latency.get('p50'), latency.get('p99')))
+
+
+def _parse_ints(value):
+    return [int(v) for v in value.split(',')]
+
+
+def _parse_mix(value):
+    mix = collections.OrderedDict()
+    for entry in value.split(','):
+        name, _, count = entry.partition('=')
+        mix[name.strip()] = int(count or 1)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replays NFVO message traces through the plugin SDK into the '
+                                                 'VIM driver running against a fake OpenStack')
+    parser.add_argument('--trace', help='a JSON lines trace file, a synthetic trace is generated if not passed')
+    parser.add_argument('--mix', default='refresh=5,list_server=5,launch=5,delete=5',
+                        help='messages per burst of the synthetic trace, names: {}'.format(
+                            ', '.join(SYNTHETIC_MESSAGES)))
+    parser.add_argument('--bursts', type=int, default=3, help='the number of bursts of the synthetic trace')
+    parser.add_argument('--burst-interval', type=float, default=5, help='the seconds between the bursts')
+    parser.add_argument('--save-trace', help='write the replayed trace to this file')
+    parser.add_argument('-w', '--workers', type=_parse_ints, default=[100],
+                        help='comma separated maximum numbers of worker threads to compare (default 100)')
+    parser.add_argument('-l', '--listeners', type=_parse_ints, default=[1],
+                        help='comma separated numbers of listener threads to compare (default 1)')
+    parser.add_argument('-r', '--repliers', type=_parse_ints, default=[1],
+                        help='comma separated numbers of reply threads to compare (default 1)')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay the trace this many times faster')
+    parser.add_argument('--publish-latency', type=float, default=1,
+                        help='the ms the reply threads need for publishing an answer (default 1)')
+    parser.add_argument('-s', '--scale', default='small', choices=list(SCALES),
+                        help='the catalog size of the fake OpenStack')
+    parser.add_argument('--latency', type=float, default=5, help='the latency of every API call in ms (default 5)')
+    parser.add_argument('--server-build-time', type=float, default=0.5,
+                        help='the seconds until a created VM is active (default 0.5)')
+    parser.add_argument('-o', '--output', help='write the results as JSON to this file')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log the progress of the driver')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    log.setLevel(logging.INFO)
+    trace = load_trace(args.trace) if args.trace else synthetic_trace(_parse_mix(args.mix), args.bursts,
+                                                                       args.burst_interval)
+    if args.save_trace:
+        save_trace(trace, args.save_trace)
+
+    results = []
+    for workers, listeners, repliers in itertools.product(args.workers, args.listeners, args.repliers):
+        log.info('Replaying {} messages with -w {} -l {} -r {}'.format(len(trace), workers, listeners, repliers))
+        with FakeOpenStack(latency=args.latency / 1000.0, server_build_time=args.server_build_time) as fake:
+            fake.populate(**SCALES.get(args.scale))
+            result = run_load(trace, workers, listeners, repliers, fake, speed=args.speed,
+                              publish_latency=args.publish_latency / 1000.0)
+        results.append(((workers, listeners, repliers), result))
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump([dict(workers=w, listeners=l, repliers=r, **result) for (w, l, r), result in results], f,
+                      indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,407 @@
+"""
+Benchmarks of the OpenStack VIM driver against a local fake OpenStack (see fake_openstack.py).
+
+Every scenario calls a driver method several times and reports its duration together with the number of OpenStack
+API calls per operation. The results can be compared with a baseline, so that changes which make the driver slower
+or let the number of API calls grow are noticed, e.g.:
+
+    python -m benchmarks.run --scale small --check
+    python -m benchmarks.run --scale small,medium --update-baseline
+"""
+import argparse
+import ast
+import collections
+import concurrent.futures
+import inspect
+import ipaddress
+import json
+import logging
+import os.path
+import sys
+import time
+
+from benchmarks.fake_openstack import FakeOpenStack, SCALES
+
+log = logging.getLogger(__name__)
+
+# the default location of the baseline
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+# the number of VMs handled by one call of the batch scenarios
+BATCH_SIZE = 10
+
+
+class BenchmarkContext(object):
+    """
+    Holds the fake OpenStack, the driver and the VIM instance shared by the scenarios.
+    """
+
+    def __init__(self, fake, driver, driver_module, vim_instance, image_size):
+        self.fake = fake
+        self.driver = driver
+        self.driver_module = driver_module
+        self.vim_instance = vim_instance
+        self.image_size = image_size
+
+    def network(self, name):
+        for network in self.fake.networks.values():
+            if network.get('name') == name:
+                return network
+        raise ValueError('The fixture does not contain network {}'.format(name))
+
+    def reset_caches(self):
+        """
+        Discards everything the driver cached about the VIM instance, so that the scenarios do not depend on
+        each other.
+        """
+        self.driver_module.catalog_cache.invalidate(self.vim_instance)
+        self.driver_module.refresh_snapshots.invalidate(self.vim_instance)
+
+
+def _connection_point(network_name, index, floating_ip=None, fixed_ip=None):
+    connection_point = {'virtual_link_reference': network_name, 'interfaceId': 0,
+                        'id': 'benchmark-cp-{}'.format(index)}
+    if floating_ip is not None:
+        connection_point['floatingIp'] = floating_ip
+    if fixed_ip is not None:
+        connection_point['fixedIp'] = fixed_ip
+    return connection_point
+
+
+def _launch(context, index, connection_point):
+    return context.driver.launch_instance_and_wait(context.vim_instance, 'benchmark-vm-{}'.format(index), 'image-0',
+                                                   'm1.flavor-0', 'key-0', [connection_point], ['default'], '')
+
+
+def _raise_batch_errors(results):
+    errors = [r.get('exception').get('detailMessage') for r in results if 'exception' in r]
+    if len(errors) > 0:
+        raise Exception('{} of {} VMs failed: {}'.format(len(errors), len(results), errors[0]))
+
+
+def setup_launch_instance(context, iterations):
+    return [_connection_point('net-0', i, floating_ip='random') for i in range(iterations)]
+
+
+def run_launch_instance(context, index, connection_point):
+    _launch(context, index, connection_point)
+
+
+def setup_launch_instances(context, iterations):
+    return [[{'instance_name': 'benchmark-batch-vm-{}'.format(i), 'image': 'image-0', 'flavor': 'm1.flavor-0',
+              'key_pair': 'key-0', 'networks': [_connection_point('net-0', i, floating_ip='random')],
+              'security_groups': ['default'], 'user_data': ''} for i in range(j * BATCH_SIZE, (j + 1) * BATCH_SIZE)]
+            for j in range(iterations)]
+
+
+def run_launch_instances(context, index, instances):
+    _raise_batch_errors(context.driver.launch_instances_and_wait(context.vim_instance, instances))
+
+
+def setup_launch_fixed_ip(context, iterations):
+    subnet = context.fake.subnets.get(context.network('net-1').get('subnets')[0])
+    network = ipaddress.ip_network(subnet.get('cidr'))
+    # the fixture allocates the addresses from the beginning of the subnets
+    addresses = [str(network[network.num_addresses - 2 - i]) for i in range(iterations)]
+    return [_connection_point('net-1', i, fixed_ip=address) for i, address in enumerate(addresses)]
+
+
+def run_launch_fixed_ip(context, index, connection_point):
+    _launch(context, index, connection_point)
+
+
+def setup_delete_server(context, iterations):
+    network_id = context.network('net-0').get('id')
+    image_id = next(iter(context.fake.images))
+    flavor_id = next(iter(context.fake.flavors))
+    return [context.fake.create_server_with_ports('benchmark-delete-{}'.format(i), image_id, flavor_id, [network_id],
+                                                  floating_ip=True).get('id') for i in range(iterations)]
+
+
+def run_delete_server(context, index, server_id):
+    context.driver.delete_server_by_id_and_wait(context.vim_instance, server_id)
+
+
+def setup_delete_servers(context, iterations):
+    server_ids = setup_delete_server(context, iterations * BATCH_SIZE)
+    return [server_ids[i:i + BATCH_SIZE] for i in range(0, len(server_ids), BATCH_SIZE)]
+
+
+def run_delete_servers(context, index, server_ids):
+    _raise_batch_errors(context.driver.delete_servers_by_ids_and_wait(context.vim_instance, server_ids))
+
+
+def setup_delete_network(context, iterations):
+    router_id = next(iter(context.fake.routers))
+    network_ids = []
+    for i in range(iterations):
+        network = context.fake.create_network('benchmark-delete-net-{}'.format(i))
+        subnet = context.fake.create_subnet(network.get('id'), 'benchmark-delete-subnet-{}'.format(i),
+                                            '192.168.{}.0/24'.format(i % 256))
+        context.fake.add_router_interface(router_id, subnet_id=subnet.get('id'))
+        network_ids.append(network.get('id'))
+    return network_ids
+
+
+def run_delete_network(context, index, network_id):
+    context.driver.delete_network(context.vim_instance, network_id)
+
+
+def setup_add_image(context, iterations):
+    return [context.fake.image_url('benchmark-image-{}'.format(i), context.image_size) for i in range(iterations)]
+
+
+def run_add_image(context, index, url):
+    context.driver.add_image(context.vim_instance, {'name': 'benchmark-image-{}'.format(index),
+                                                    'containerFormat': 'bare', 'diskFormat': 'qcow2',
+                                                    'isPublic': True, 'minDiskSpace': 0, 'minRam': 0}, url)
+
+
+# the scenarios in execution order: name -> (setup, run, default number of iterations)
+# setup(context, iterations) returns one argument per iteration, run(context, index, argument) is timed
+SCENARIOS = collections.OrderedDict([
+    ('refresh', (lambda context, iterations: [None] * iterations,
+                 lambda context, index, argument: context.driver.refresh(context.vim_instance), 5)),
+    ('list_server', (lambda context, iterations: [None] * iterations,
+                     lambda context, index, argument: context.driver.list_server(context.vim_instance), 5)),
+    ('launch_instance_and_wait', (setup_launch_instance, run_launch_instance, 10)),
+    ('launch_instances_and_wait', (setup_launch_instances, run_launch_instances, 3)),
+    ('launch_instance_fixed_ip', (setup_launch_fixed_ip, run_launch_fixed_ip, 10)),
+    ('delete_server_by_id_and_wait', (setup_delete_server, run_delete_server, 10)),
+    ('delete_servers_by_ids_and_wait', (setup_delete_servers, run_delete_servers, 3)),
+    ('delete_network', (setup_delete_network, run_delete_network, 10)),
+    ('add_image', (setup_add_image, run_add_image, 3)),
+])
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_scenario(context, name, iterations, concurrency=1):
+    """
+    Runs a scenario and returns its results.
+
+    :param context:
+    :param name: the name of the scenario, see SCENARIOS
+    :param iterations: the number of calls of the driver method
+    :param concurrency: the number of calls executed in parallel
+    :return: a dictionary with the durations and the API calls
+    """
+    setup, run, _ = SCENARIOS.get(name)
+    arguments = setup(context, iterations)
+    context.reset_caches()
+    context.fake.reset_call_counts()
+    durations = []
+    errors = []
+
+    def timed(index_and_argument):
+        index, argument = index_and_argument
+        started = time.monotonic()
+        try:
+            run(context, index, argument)
+        except Exception as e:
+            log.error('Iteration {} of scenario {} failed: {}'.format(index, name, e))
+            errors.append(str(e))
+        durations.append(time.monotonic() - started)
+
+    started = time.monotonic()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        list(executor.map(timed, enumerate(arguments)))
+    total = time.monotonic() - started
+    api_calls = context.fake.call_counts()
+    return {'iterations': iterations,
+            'concurrency': concurrency,
+            'errors': len(errors),
+            'seconds': round(total, 4),
+            'operations_per_second': round(iterations / total, 3) if total > 0 else None,
+            'seconds_per_operation': {'mean': round(sum(durations) / len(durations), 4),
+                                      'p50': round(percentile(durations, 0.5), 4),
+                                      'p95': round(percentile(durations, 0.95), 4),
+                                      'max': round(max(durations), 4)},
+            'api_calls_per_operation': round(sum(api_calls.values()) / iterations, 2),
+            'api_calls': collections.OrderedDict(sorted(api_calls.items()))}
+
+
+def configure_driver(driver_module, driver_args=None):
+    """
+    Configures the VIM driver like its main function does: the keyword arguments of OpenstackVimDriver.configure
+    are passed to it, the remaining ones are returned for creating the driver instances.
+
+    :param driver_module: the module openstack_vim_driver.openstack_vim_driver
+    :param driver_args: keyword arguments for OpenstackVimDriver.configure and OpenstackVimDriver
+    :return: the keyword arguments for OpenstackVimDriver
+    """
+    driver_args = driver_args or {}
+    shared_names = inspect.signature(driver_module.OpenstackVimDriver.configure).parameters
+    driver_module.OpenstackVimDriver.configure(**{k: v for k, v in driver_args.items() if k in shared_names})
+    return {k: v for k, v in driver_args.items() if k not in shared_names}
+
+
+def run_benchmarks(scale, scenarios, iterations=None, concurrency=1, latency=0.005, image_size=8388608,
+                   server_build_time=0.5, driver_args=None):
+    """
+    Starts a fake OpenStack with a catalog of the given scale and runs the scenarios against it.
+
+    :param scale: a dictionary with the keys servers, networks, ports and images
+    :param scenarios: the names of the scenarios to run
+    :param iterations: the number of iterations of every scenario or None for their defaults
+    :param concurrency:
+    :param latency: the delay added to every API call in seconds
+    :param image_size: the size of the image files uploaded by add_image in bytes
+    :param server_build_time: the number of seconds until created VMs become active
+    :param driver_args: keyword arguments for the OpenstackVimDriver and its configure method
+    :return: a dictionary mapping the scenario names to their results
+    """
+    # imported here so that the module can be loaded without the Open Baton SDK, e.g. for --help
+    import openstack_vim_driver.openstack_vim_driver as driver_module
+
+    with FakeOpenStack(latency=latency, server_build_time=server_build_time) as fake:
+        log.info('Creating a fixture with {}'.format(', '.join('{} {}'.format(v, k) for k, v in scale.items())))
+        fake.populate(**scale)
+        driver = driver_module.OpenstackVimDriver(**configure_driver(driver_module, driver_args))
+        vim_instance = fake.vim_instance()
+        # the NFVO passes VIM instances containing the networks and images known from the last refresh
+        driver.refresh(vim_instance)
+        context = BenchmarkContext(fake, driver, driver_module, vim_instance, image_size)
+        results = collections.OrderedDict()
+        for name in scenarios:
+            log.info('Running scenario {}'.format(name))
+            results[name] = run_scenario(context, name, iterations or SCENARIOS.get(name)[2], concurrency)
+        return results
+
+
+def compare(results, baseline, call_tolerance=0.1, time_tolerance=0.5):
+    """
+    Compares results with a baseline of the same scale.
+
+    :param results: the results of run_benchmarks
+    :param baseline: results of an earlier run
+    :param call_tolerance: the relative increase of the API calls per operation which is tolerated
+    :param time_tolerance: the relative increase of the mean duration which is tolerated
+    :return: a list of regression messages
+    """
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        calls, expected_calls = result.get('api_calls_per_operation'), expected.get('api_calls_per_operation')
+        if calls > expected_calls * (1 + call_tolerance) + 0.5:
+            regressions.append('{}: {} API calls per operation instead of {}'.format(name, calls, expected_calls))
+        mean = result.get('seconds_per_operation').get('mean')
+        expected_mean = expected.get('seconds_per_operation').get('mean')
+        if mean > expected_mean * (1 + time_tolerance):
+            regressions.append('{}: {:.3f}s per operation instead of {:.3f}s'.format(name, mean, expected_mean))
+        if result.get('errors') > expected.get('errors', 0):
+            regressions.append('{}: {} failed operations instead of {}'.format(name, result.get('errors'),
+                                                                              expected.get('errors', 0)))
+    return regressions
+
+
+def print_report(scale_name, results, out=sys.stdout):
+    out.write('\nScale {}\n'.format(scale_name))
+    out.write('{:<30} {:>6} {:>7} {:>9} {:>9} {:>9} {:>9} {:>11}\n'.format(
+        'scenario', 'iter', 'errors', 'ops/s', 'mean', 'p95', 'max', 'calls/op'))
+    for name, result in results.items():
+        seconds = result.get('seconds_per_operation')
+        out.write('{:<30} {:>6} {:>7} {:>9} {:>8.3f}s {:>8.3f}s {:>8.3f}s {:>11}\n'.format(
+            name, result.get('iterations'), result.get('errors'), result.get('operations_per_second'),
+            seconds.get('mean'), seconds.get('p95'), seconds.get('max'), result.get('api_calls_per_operation')))
+        for operation, count in result.get('api_calls').items():
+            out.write('    {:<60} {:>8}\n'.format(operation, count))
+
+
+def _parse_driver_arg(value):
+    name, _, literal = value.partition('=')
+    try:
+        return name.replace('-', '_'), ast.literal_eval(literal)
+    except (ValueError, SyntaxError):
+        return name.replace('-', '_'), literal
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of the OpenStack VIM driver against a fake OpenStack')
+    parser.add_argument('-s', '--scale', default='small',
+                        help='comma separated list of the scales to run: {} (default small)'.format(
+                            ', '.join(SCALES)))
+    parser.add_argument('--servers', type=int, help='overrides the number of VMs of the scale')
+    parser.add_argument('--networks', type=int, help='overrides the number of networks of the scale')
+    parser.add_argument('--ports', type=int, help='overrides the number of ports of the scale')
+    parser.add_argument('--images', type=int, help='overrides the number of images of the scale')
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS),
+                        help='the scenarios to run (default all), can be passed several times')
+    parser.add_argument('-i', '--iterations', type=int, help='the number of iterations of every scenario')
+    parser.add_argument('--concurrency', type=int, default=1, help='the number of parallel driver calls')
+    parser.add_argument('--latency', type=float, default=5, help='the latency of every API call in ms (default 5)')
+    parser.add_argument('--image-size', type=int, default=8, help='the size of the uploaded images in MB')
+    parser.add_argument('--server-build-time', type=float, default=0.5,
+                        help='the seconds until a created VM is active (default 0.5)')
+    parser.add_argument('--driver-arg', action='append', default=[], metavar='NAME=VALUE',
+                        help='keyword argument of the OpenstackVimDriver, e.g. parallel_requests=16')
+    parser.add_argument('-o', '--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='the baseline file')
+    parser.add_argument('--check', action='store_true',
+                        help='exit with status 1 if the results regressed compared to the baseline')
+    parser.add_argument('--update-baseline', action='store_true', help='store the results as baseline')
+    parser.add_argument('--call-tolerance', type=float, default=0.1,
+                        help='tolerated relative increase of the API calls per operation (default 0.1)')
+    parser.add_argument('--time-tolerance', type=float, default=0.5,
+                        help='tolerated relative increase of the mean duration (default 0.5)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log the progress of the driver')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    log.setLevel(logging.INFO)
+    driver_args = dict(_parse_driver_arg(value) for value in args.driver_arg)
+    scenarios = args.scenario or list(SCENARIOS)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    all_results = collections.OrderedDict()
+    regressions = []
+    for scale_name in args.scale.split(','):
+        scale_name = scale_name.strip()
+        if scale_name not in SCALES:
+            parser.error('Unknown scale {}'.format(scale_name))
+        scale = dict(SCALES.get(scale_name))
+        for key in scale:
+            if getattr(args, key) is not None:
+                scale[key] = getattr(args, key)
+        results = run_benchmarks(scale, scenarios, iterations=args.iterations, concurrency=args.concurrency,
+                                 latency=args.latency / 1000.0, image_size=args.image_size * 1048576,
+                                 server_build_time=args.server_build_time, driver_args=driver_args)
+        all_results[scale_name] = {'scale': scale, 'latency_ms': args.latency, 'scenarios': results}
+        print_report(scale_name, results)
+        expected = baseline.get(scale_name)
+        if expected is not None and (expected.get('scale') != scale or expected.get('latency_ms') != args.latency):
+            log.warning('The baseline of scale {} was recorded with a different catalog or latency, '
+                        'not comparing'.format(scale_name))
+        elif expected is not None:
+            regressions.extend('[{}] {}'.format(scale_name, r) for r in compare(
+                results, expected.get('scenarios'), args.call_tolerance, args.time_tolerance))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(all_results, f, indent=2)
+    if args.update_baseline:
+        baseline.update(all_results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        log.info('Updated the baseline {}'.format(args.baseline))
+    if len(regressions) > 0:
+        sys.stdout.write('\nRegressions compared to the baseline:\n')
+        for regression in regressions:
+            sys.stdout.write('  {}\n'.format(regression))
+        if args.check:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# the collections which can be cached and their default time to live (in seconds)
+DEFAULT_TTLS = {
+    'images': 60,
+    'flavors': 300,
+    'networks': 60,
+    'security_groups': 60,
+    'zones': 300,
+    'keys': 60,
+    'router_topology': 60
+}
+
+
+def get_vim_key(vim_instance):
+    """
+    Returns the key which identifies the resources of a VIM instance in the caches.
+
+    :param vim_instance:
+    :return:
+    """
+    return vim_instance.get('id'), vim_instance.get('authUrl'), vim_instance.get('tenant')
+
+
+class CatalogCache(object):
+    """
+    Thread-safe cache for the resource collections (images, flavors, networks, ...) of each VIM instance.
+    Every collection has its own time to live, a TTL of zero or less disables the caching of that collection.
+    The cached lists are shared between threads and must not be modified in place, use update instead.
+    If a SingleFlight is passed, concurrent misses of the same collection call the loader only once.
+    An entry holds the expiry time, the cached list, its extId index and the extIds known not to exist.
+    """
+
+    def __init__(self, ttls=None, single_flight=None):
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls is not None:
+            self.ttls.update(ttls)
+        self.single_flight = single_flight
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __get_cached(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry
+        return None
+
+    def get(self, vim_instance, collection, loader):
+        """
+        Returns the cached collection of the VIM instance.
+        If it is not cached or expired, loader is called and its result cached.
+
+        :param vim_instance:
+        :param collection: the name of the collection, e.g. 'images'
+        :param loader: function without arguments which fetches the collection from OpenStack
+        :return:
+        """
+        ttl = self.ttls.get(collection, 0)
+        if ttl <= 0:
+            return loader()
+        key = (get_vim_key(vim_instance), collection)
+        entry = self.__get_cached(key)
+        if entry is not None:
+            return entry[1]
+
+        def load():
+            # another thread might have loaded the collection since the lookup above
+            loaded = self.__get_cached(key)
+            if loaded is not None:
+                return loaded[1]
+            value = loader()
+            self.put(vim_instance, collection, value)
+            return value
+
+        return self.single_flight.do(key, load) if self.single_flight is not None else load()
+
+    def get_index(self, vim_instance, collection, loader):
+        """
+        Returns a dictionary mapping the extId of every item of the cached collection to the item.
+        The index is built once per cached value and shared by all the callers until the entry changes.
+
+        :param vim_instance:
+        :param collection: the name of a collection whose items have an extId attribute, e.g. 'images'
+        :param loader: function without arguments which fetches the collection from OpenStack
+        :return:
+        """
+        if self.ttls.get(collection, 0) <= 0:
+            return {item.extId: item for item in loader()}
+        key = (get_vim_key(vim_instance), collection)
+        value = self.get(vim_instance, collection, loader)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] is not value:
+                # the entry has been replaced or removed in the meantime
+                return {item.extId: item for item in value}
+            if entry[2] is None:
+                self._entries[key] = (entry[0], entry[1], {item.extId: item for item in value}, entry[3])
+            return self._entries[key][2]
+
+    def lookup(self, vim_instance, collection, ext_id, loader, item_loader):
+        """
+        Returns the item of the cached collection with the extId. An item missing from the cached collection is
+        fetched on its own with item_loader and added to the collection, an extId which does not exist is remembered
+        until the entry expires. Neither reloads the whole collection.
+
+        :param vim_instance:
+        :param collection: the name of a collection whose items have an extId attribute, e.g. 'images'
+        :param ext_id:
+        :param loader: function without arguments which fetches the collection from OpenStack
+        :param item_loader: function which fetches the item with the passed extId, it returns None if there is none
+        :return: the item or None
+        """
+        item = self.get_index(vim_instance, collection, loader).get(ext_id)
+        if item is not None:
+            return item
+        key = (get_vim_key(vim_instance), collection)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and ext_id in entry[3]:
+                return None
+        item = item_loader(ext_id)
+        if item is not None:
+            self.add(vim_instance, collection, item)
+            return item
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = entry[:3] + (entry[3] | {ext_id},)
+        return None
+
+    def put(self, vim_instance, collection, value):
+        """
+        Stores the collection of the VIM instance in the cache, replacing the previous value.
+
+        :param vim_instance:
+        :param collection:
+        :param value:
+        :return:
+        """
+        ttl = self.ttls.get(collection, 0)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[(get_vim_key(vim_instance), collection)] = (time.monotonic() + ttl, value, None, frozenset())
+
+    def update(self, vim_instance, collection, function):
+        """
+        Replaces the cached collection of the VIM instance with the result of function(cached_collection).
+        Nothing happens if the collection is not cached. The expiry time of the entry stays the same.
+
+        :param vim_instance:
+        :param collection:
+        :param function: function which takes the cached list and returns the new list, it must not modify its argument
+        :return:
+        """
+        key = (get_vim_key(vim_instance), collection)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], function(entry[1]), None, entry[3])
+
+    def add(self, vim_instance, collection, item):
+        """
+        Appends a newly created resource to the cached collection of the VIM instance.
+
+        :param vim_instance:
+        :param collection:
+        :param item:
+        :return:
+        """
+        self.update(vim_instance, collection, lambda items: items + [item])
+
+    def invalidate(self, vim_instance, collection=None):
+        """
+        Removes a collection or, if collection is None, all the collections of the VIM instance from the cache.
+
+        :param vim_instance:
+        :param collection:
+        :return:
+        """
+        vim_key = get_vim_key(vim_instance)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == vim_key and (collection is None or k[1] == collection)]:
+                del self._entries[key]
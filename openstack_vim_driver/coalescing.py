@@ -0,0 +1,75 @@
+import logging
+import threading
+
+from openstack_vim_driver.catalog_cache import get_vim_key
+
+log = logging.getLogger(__name__)
+
+
+def get_request_key(vim_instance, operation, **filters):
+    """
+    Returns the key identifying an OpenStack request for coalescing.
+
+    :param vim_instance:
+    :param operation: the name of the operation, e.g. 'list_networks'
+    :param filters: the filters passed to the operation
+    :return:
+    """
+    return get_vim_key(vim_instance), operation, tuple(
+        sorted((name, tuple(value) if isinstance(value, list) else value) for name, value in filters.items()))
+
+
+class _InFlightCall(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exception = None
+
+
+class SingleFlight(object):
+    """
+    Coalesces identical requests which are executed concurrently: while a request with a certain key is in flight,
+    other threads issuing the same request wait for it and receive its result (or exception) instead of sending the
+    request again. Nothing is cached after the request finished.
+    The result is shared between the threads and must not be modified.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.coalesced_calls = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function):
+        """
+        Calls function unless a call with the same key is in flight already, in which case its result is returned.
+
+        :param key: the key identifying the request, see get_request_key
+        :param function: function without arguments executing the request
+        :return: the result of the function
+        """
+        if not self.enabled:
+            return function()
+        with self._lock:
+            call = self._calls.get(key)
+            in_flight = call is not None
+            if in_flight:
+                self.coalesced_calls += 1
+            else:
+                call = _InFlightCall()
+                self._calls[key] = call
+        if in_flight:
+            call.done.wait()
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+        try:
+            call.result = function()
+            return call.result
+        except Exception as e:
+            call.exception = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
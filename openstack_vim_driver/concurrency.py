@@ -0,0 +1,89 @@
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from openstack_vim_driver.tracing import tracer
+
+log = logging.getLogger(__name__)
+
+
+def run_concurrently(calls: dict, max_workers=8, timeout=None):
+    """
+    Executes the passed functions concurrently on a bounded thread pool and returns their results.
+    If one of the functions raises an exception, it is propagated to the caller.
+    If a function does not finish within timeout seconds after its execution started, an Exception is raised.
+    The time functions spend waiting for a free worker does not count.
+    The functions belong to the current trace span of the calling thread.
+
+    :param calls: a dictionary mapping names to functions without arguments
+    :param max_workers: the maximum number of functions executed at the same time
+    :param timeout: the maximum number of seconds each function may take, None or a value of zero or less means no timeout
+    :return: a dictionary mapping the names to the return values of the functions
+    """
+    if timeout is not None and timeout <= 0:
+        timeout = None
+    # name -> the time the execution of the function started
+    started = {}
+
+    def timed(name, function):
+        def call():
+            started[name] = time.monotonic()
+            return function()
+
+        return call
+
+    workers = max(1, min(max_workers, len(calls)))
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {name: executor.submit(tracer.wrap(timed(name, function))) for name, function in calls.items()}
+        try:
+            pending = set(futures.values())
+            while len(pending) > 0:
+                wait_time = None
+                if timeout is not None:
+                    now = time.monotonic()
+                    deadlines = [started.get(name) + timeout for name, future in futures.items() if
+                                 future in pending and name in started]
+                    for name, future in futures.items():
+                        if future in pending and name in started and started.get(name) + timeout <= now:
+                            raise Exception('Timeout: {} did not finish within {} seconds'.format(name, timeout))
+                    wait_time = min(deadlines) - now if len(deadlines) > 0 else None
+                    if len(deadlines) < min(workers, len(pending)):
+                        # a worker is about to start a function, its start is checked again shortly after
+                        wait_time = 0.01 if wait_time is None else min(wait_time, 0.01)
+                done, pending = wait(pending, timeout=wait_time, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is not None:
+                        raise future.exception()
+            return {name: future.result() for name, future in futures.items()}
+        except Exception:
+            # do not start the functions which are still queued
+            for f in futures.values():
+                f.cancel()
+            raise
+    finally:
+        executor.shutdown(wait=False)
+
+
+def map_concurrently(function, items: list, max_workers=8):
+    """
+    Calls function for every item concurrently on a bounded thread pool and waits until all the calls finished.
+    Exceptions do not stop the other calls but are returned together with the results.
+    The calls belong to the current trace span of the calling thread.
+
+    :param function: function which takes one item as argument
+    :param items: the items to process
+    :param max_workers: the maximum number of items processed at the same time
+    :return: a list containing a (result, exception) tuple for every item in the order of the items
+    """
+    if len(items) == 0:
+        return []
+    outcomes = []
+    function = tracer.wrap(function)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as executor:
+        for future in [executor.submit(function, item) for item in items]:
+            try:
+                outcomes.append((future.result(), None))
+            except Exception as e:
+                outcomes.append((None, e))
+    return outcomes
@@ -0,0 +1,117 @@
+import collections
+import logging
+import threading
+import time
+
+from openstack_vim_driver.catalog_cache import get_vim_key
+
+log = logging.getLogger(__name__)
+
+
+class CollectionSnapshot(object):
+    """
+    The last known state of a resource collection (e.g. the images) of a VIM instance. After a full listing, only the
+    resources changed since the newest update time seen so far have to be fetched and merged into the snapshot.
+    Resources deleted in OpenStack are only noticed by the next full listing.
+    """
+
+    def __init__(self):
+        self.items = None
+        self.since = None
+        self.delta_supported = True
+        self.last_full = None
+        self.lock = threading.Lock()
+
+    def needs_full_listing(self, full_interval):
+        """
+        :param full_interval: the maximum number of seconds between two full listings
+        :return: True if the collection has to be listed completely
+        """
+        return self.items is None or not self.delta_supported or time.monotonic() - self.last_full >= full_interval
+
+    def replace(self, items: [dict]):
+        """
+        Replaces the snapshot with the result of a full listing.
+
+        :param items: the resources as dictionaries containing at least the keys id and updated_at
+        :return:
+        """
+        self.items = collections.OrderedDict((item.get('id'), item) for item in items)
+        self.last_full = time.monotonic()
+        if any(item.get('updated_at') in (None, '') for item in items):
+            # the resources do not have timestamps, e.g. because the timestamp extension of Neutron is not enabled
+            self.delta_supported = False
+        timestamps = [item.get('updated_at') for item in items if item.get('updated_at') not in (None, '')]
+        self.since = max(timestamps) if len(timestamps) > 0 else None
+
+    def merge(self, items: [dict]):
+        """
+        Merges the resources changed since the last listing into the snapshot.
+        If the result contains resources not changed since then, OpenStack ignored the filter and the result is
+        used as a full listing instead.
+
+        :param items: the resources as dictionaries containing at least the keys id and updated_at
+        :return:
+        """
+        if any(item.get('updated_at') in (None, '') or item.get('updated_at') < self.since for item in items):
+            log.debug('The filter for changed resources seems to be ignored, using the result as full listing')
+            self.replace(items)
+            return
+        for item in items:
+            self.items[item.get('id')] = item
+        self.since = max([item.get('updated_at') for item in items] + [self.since])
+
+    def values(self):
+        return list(self.items.values())
+
+
+class RefreshSnapshots(object):
+    """
+    Thread-safe registry holding the CollectionSnapshots of each VIM instance.
+    """
+
+    def __init__(self, full_interval=3600):
+        self.full_interval = full_interval
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    def refresh(self, vim_instance, collection, list_function):
+        """
+        Brings the snapshot of the collection up to date and returns the resources.
+
+        :param vim_instance:
+        :param collection: the name of the collection, e.g. 'images'
+        :param list_function: function taking a timestamp and returning the resources changed since then as
+        dictionaries, or all the resources if the timestamp is None
+        :return: the list of all resources of the collection
+        """
+        with self._lock:
+            snapshot = self._snapshots.setdefault((get_vim_key(vim_instance), collection), CollectionSnapshot())
+        with snapshot.lock:
+            if snapshot.needs_full_listing(self.full_interval) or snapshot.since is None:
+                snapshot.replace(list(list_function(None)))
+            else:
+                try:
+                    changed_items = list(list_function(snapshot.since))
+                except Exception as e:
+                    log.warning('Unable to list the {} changed since {}, falling back to full listings: {}'.format(
+                        collection, snapshot.since, e))
+                    snapshot.replace(list(list_function(None)))
+                    snapshot.delta_supported = False
+                else:
+                    snapshot.merge(changed_items)
+            return snapshot.values()
+
+    def invalidate(self, vim_instance, collection=None):
+        """
+        Forces a full listing of a collection or, if collection is None, all the collections of the VIM instance
+        at the next refresh, e.g. because resources were deleted.
+
+        :param vim_instance:
+        :param collection:
+        :return:
+        """
+        vim_key = get_vim_key(vim_instance)
+        with self._lock:
+            for key in [k for k in self._snapshots if k[0] == vim_key and (collection is None or k[1] == collection)]:
+                del self._snapshots[key]
@@ -0,0 +1,183 @@
+import collections
+import logging
+import threading
+import time
+
+from openstack_vim_driver.catalog_cache import get_vim_key
+
+log = logging.getLogger(__name__)
+
+
+class FloatingIpClaims(object):
+    """
+    Thread-safe record of the floating IPs which are about to be associated by a worker thread.
+    Listings of floating IPs may be outdated while an association is in progress, so a claim is kept for ttl seconds
+    after the association unless it is released because the association failed.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._claims = {}
+        self._lock = threading.Lock()
+
+    def claim(self, fip_id):
+        """
+        Claims a floating IP.
+
+        :param fip_id: the ID of the floating IP
+        :return: True if the floating IP was claimed, False if another thread claimed it already
+        """
+        with self._lock:
+            now = time.monotonic()
+            claimed_at = self._claims.get(fip_id)
+            if claimed_at is not None and now - claimed_at < self.ttl:
+                return False
+            self._claims[fip_id] = now
+            # forget about old claims
+            for expired_id in [i for i, t in self._claims.items() if now - t >= self.ttl]:
+                del self._claims[expired_id]
+            return True
+
+    def release(self, fip_id):
+        """
+        Releases the claim of a floating IP, e.g. because it could not be associated.
+
+        :param fip_id:
+        :return:
+        """
+        with self._lock:
+            self._claims.pop(fip_id, None)
+
+
+class FloatingIpPool(object):
+    """
+    Pool of pre-allocated floating IPs of one external network which are not associated to any port.
+    As soon as the number of floating IPs in the pool drops below the low watermark, a background thread allocates
+    new ones until the high watermark is reached. Every floating IP is handed out only once.
+    """
+
+    def __init__(self, floating_network_id, neutron_client_factory, low_watermark, high_watermark):
+        """
+        :param floating_network_id: the ID of the external network
+        :param neutron_client_factory: function without arguments returning a Neutron client
+        :param low_watermark: the pool is replenished if it contains less floating IPs
+        :param high_watermark: the number of floating IPs the pool is filled up to
+        """
+        self.floating_network_id = floating_network_id
+        self.neutron_client_factory = neutron_client_factory
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self._fips = collections.deque()
+        self._lock = threading.Lock()
+        self._replenishing = False
+
+    def take(self, claims=None):
+        """
+        Removes a floating IP from the pool and starts replenishing the pool if needed.
+        If claims are passed, the floating IP is claimed while it is removed from the pool, so that other threads
+        always see it either reserved or claimed. Floating IPs which are claimed by another thread already are skipped.
+
+        :param claims: the FloatingIpClaims of the floating IPs which are being associated
+        :return: the floating IP as returned by Neutron or None if the pool is empty
+        """
+        fip = None
+        with self._lock:
+            while len(self._fips) > 0:
+                candidate = self._fips.popleft()
+                if claims is None or claims.claim(candidate.get('id')):
+                    fip = candidate
+                    break
+                log.debug('Skipping floating IP {} of the pool which is claimed by another thread'.format(
+                    candidate.get('floating_ip_address')))
+        self.replenish()
+        return fip
+
+    def contains(self, fip_id):
+        """
+        :param fip_id:
+        :return: True if the floating IP is reserved in the pool
+        """
+        with self._lock:
+            return any(fip.get('id') == fip_id for fip in self._fips)
+
+    def replenish(self):
+        """
+        Starts a background thread which fills the pool up to the high watermark if the pool contains less
+        floating IPs than the low watermark and it is not replenished already.
+
+        :return:
+        """
+        with self._lock:
+            if self._replenishing or len(self._fips) >= max(self.low_watermark, 1):
+                return
+            self._replenishing = True
+        thread = threading.Thread(target=self.__fill, name='floating-ip-pool-{}'.format(self.floating_network_id))
+        thread.daemon = True
+        thread.start()
+
+    def __fill(self):
+        try:
+            neutron_client = self.neutron_client_factory()
+            while True:
+                with self._lock:
+                    if len(self._fips) >= self.high_watermark:
+                        return
+                fip = neutron_client.create_floatingip(
+                    {'floatingip': {'floating_network_id': self.floating_network_id}}).get('floatingip')
+                with self._lock:
+                    self._fips.append(fip)
+                log.debug('Allocated floating IP {} for the pool of network {}'.format(fip.get('floating_ip_address'),
+                                                                                       self.floating_network_id))
+        except Exception as e:
+            log.warning('Unable to replenish the floating IP pool of network {}: {}'.format(self.floating_network_id,
+                                                                                            e))
+        finally:
+            with self._lock:
+                self._replenishing = False
+
+
+class FloatingIpPoolRegistry(object):
+    """
+    Thread-safe registry holding one FloatingIpPool per VIM instance and external network.
+    A high watermark of zero or less disables the pools.
+    """
+
+    def __init__(self, low_watermark=0, high_watermark=0):
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def get_pool(self, vim_instance, floating_network_id, neutron_client_factory):
+        """
+        Returns the pool of the external network and creates it if it does not exist yet.
+        A new pool is empty and starts filling up in the background.
+
+        :param vim_instance:
+        :param floating_network_id: the ID of the external network
+        :param neutron_client_factory: function without arguments returning a Neutron client of the VIM instance
+        :return: the FloatingIpPool or None if the pools are disabled
+        """
+        if self.high_watermark <= 0:
+            return None
+        with self._lock:
+            key = (get_vim_key(vim_instance), floating_network_id)
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = FloatingIpPool(floating_network_id, neutron_client_factory, self.low_watermark,
+                                      self.high_watermark)
+                self._pools[key] = pool
+            pool.neutron_client_factory = neutron_client_factory
+            pool.low_watermark = self.low_watermark
+            pool.high_watermark = self.high_watermark
+        pool.replenish()
+        return pool
+
+    def is_reserved(self, fip_id):
+        """
+        :param fip_id:
+        :return: True if the floating IP is kept in one of the pools and must not be associated
+        """
+        with self._lock:
+            pools = list(self._pools.values())
+        return any(pool.contains(fip_id) for pool in pools)
@@ -0,0 +1,300 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from openstack_vim_driver.image_transfer import http_session, get_content_length, get_content_validator
+
+log = logging.getLogger(__name__)
+
+# the prefix of the names of the staged image files
+STAGED_FILE_PREFIX = 'openbaton-image-'
+
+
+class _StagedImage(object):
+    def __init__(self, key, url, path):
+        self.key = key
+        self.url = url
+        self.path = path
+        self.size = 0
+        self.expected_size = None
+        self.validator = None
+        self.headers_received = False
+        self.complete = False
+        self.error = None
+        self.evicted = False
+        self.readers = 0
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.condition = threading.Condition()
+
+
+class StagedImageFile(object):
+    """
+    Reader of an image file in the staging cache. The file can be read while it is still being downloaded,
+    the reader waits for the download to catch up. Must be closed after use, e.g. by using it as a context manager.
+    """
+
+    def __init__(self, staging_cache, entry):
+        self._staging_cache = staging_cache
+        self._entry = entry
+        self._closed = False
+
+    @property
+    def expected_size(self):
+        """
+        The size of the image file in bytes as announced by the image repository or None.
+        """
+        return self._entry.expected_size
+
+    @property
+    def validator(self):
+        """
+        The validator of the image file's URL (see get_content_validator) or None.
+        """
+        return self._entry.validator
+
+    def iter_chunks(self, chunk_size=1048576, stall_timeout=None):
+        """
+        Returns a generator over the content of the image file in chunks of at most chunk_size bytes.
+        The generator raises an Exception if the download fails or no data arrives within stall_timeout seconds.
+
+        :param chunk_size:
+        :param stall_timeout: None or a value of zero or less means no timeout
+        :return:
+        """
+        if stall_timeout is not None and stall_timeout <= 0:
+            stall_timeout = None
+        entry = self._entry
+        with open(entry.path, 'rb') as staged_file:
+            position = 0
+            while True:
+                with entry.condition:
+                    while entry.size <= position and not entry.complete and entry.error is None:
+                        if not entry.condition.wait(stall_timeout):
+                            raise Exception('Timeout: no data of image file {} received within {} seconds'.format(
+                                entry.url, stall_timeout))
+                    if entry.error is not None:
+                        raise Exception('Unable to download image file {}: {}'.format(entry.url, entry.error))
+                    available = entry.size - position
+                if available == 0:
+                    return
+                chunk = staged_file.read(min(chunk_size, available))
+                position += len(chunk)
+                yield chunk
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._staging_cache.release(self._entry)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ImageStagingCache(object):
+    """
+    Thread-safe on-disk cache for image files downloaded from the NFVO's image repository, so that uploading the same
+    image to several VIM instances needs only one download. Uploads can start reading an image file while it is
+    still being downloaded. Completely downloaded files are only reused after a conditional request confirmed that
+    the content did not change, files without ETag and Last-Modified are not reused at all.
+    Files which are not read anymore are removed when they are older than ttl seconds or, least recently used first,
+    when the staged files take more than max_size bytes. Files in use count against max_size as well, if they take
+    max_size bytes already, further images are not staged. A max_size of zero or less disables the staging.
+    """
+
+    def __init__(self, directory=None, max_size=0, ttl=3600):
+        self.directory = directory
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def open(self, url, params=None, timeout=None, chunk_size=1048576):
+        """
+        Returns a reader of the staged image file and starts downloading it if it is not staged yet.
+        Blocks until the response headers of the image repository have been received.
+
+        :param url: the URL of the image file
+        :param params: the query parameters of the request, e.g. a token
+        :param timeout: the timeout passed to requests
+        :param chunk_size: the number of bytes written to the staged file at once
+        :return: a StagedImageFile or None if the staging is disabled or the staged files take max_size bytes already
+        """
+        if self.max_size <= 0:
+            return None
+        key = (url, tuple(sorted((params or {}).items())))
+        with self._lock:
+            entry = self.__get_entry(key)
+            if entry is not None:
+                entry.readers += 1
+        response = None
+        if entry is not None and entry.complete:
+            try:
+                response = self.__revalidate(entry, params, timeout)
+            except Exception:
+                self.release(entry)
+                raise
+            if response is not None:
+                log.debug('Image file {} changed since it was staged'.format(url))
+                with self._lock:
+                    self.__remove(entry)
+                self.release(entry)
+                entry = None
+        if entry is None:
+            with self._lock:
+                # another thread might have started the download in the meantime
+                entry = self.__get_entry(key)
+                if entry is None:
+                    self.__evict()
+                    if sum(max(e.size, e.expected_size or 0) for e in self._entries.values()) >= self.max_size:
+                        log.debug('Not staging image file {}, the staged files take {} bytes already'.format(
+                            url, self.max_size))
+                        if response is not None:
+                            response.close()
+                        return None
+                    entry = _StagedImage(key, url, self.__create_file())
+                    self._entries[key] = entry
+                    thread = threading.Thread(target=self.__download,
+                                              args=(entry, params, timeout, chunk_size, response), name='image-staging')
+                    thread.daemon = True
+                    thread.start()
+                    response = None
+                entry.readers += 1
+            if response is not None:
+                response.close()
+        with self._lock:
+            entry.last_used = time.monotonic()
+        with entry.condition:
+            while not entry.headers_received and entry.error is None:
+                entry.condition.wait()
+            error = entry.error
+        if error is not None:
+            self.release(entry)
+            raise error
+        return StagedImageFile(self, entry)
+
+    def __get_entry(self, key):
+        # must be called while holding the lock, returns the entry of the key if it can still be used
+        entry = self._entries.get(key)
+        if entry is not None and (entry.error is not None or (entry.complete and (
+                entry.validator is None or time.monotonic() - entry.created > self.ttl))):
+            self.__remove(entry)
+            entry = None
+        return entry
+
+    @staticmethod
+    def __revalidate(entry, params, timeout):
+        """
+        Checks with a conditional request whether the content of a staged image file changed.
+
+        :return: None if the content did not change, otherwise the streamed response with the new content
+        """
+        etag, last_modified = entry.validator[0], entry.validator[1]
+        headers = {}
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        if last_modified is not None:
+            headers['If-Modified-Since'] = last_modified
+        response = http_session.get(entry.url, stream=True, params=params, timeout=timeout, headers=headers)
+        try:
+            if response.status_code == 304:
+                response.close()
+                return None
+            response.raise_for_status()
+        except Exception:
+            response.close()
+            raise
+        if get_content_validator(response.headers) == entry.validator:
+            # the image repository ignores conditional requests
+            response.close()
+            return None
+        return response
+
+    def release(self, entry):
+        """
+        Called by the readers of an image file when they are closed.
+
+        :param entry:
+        :return:
+        """
+        with self._lock:
+            entry.readers -= 1
+            entry.last_used = time.monotonic()
+            if entry.evicted and entry.readers == 0:
+                self.__delete_file(entry.path)
+            self.__evict()
+
+    def __create_file(self):
+        directory = self.directory or os.path.join(tempfile.gettempdir(), 'openbaton-image-staging')
+        os.makedirs(directory, exist_ok=True)
+        file_descriptor, path = tempfile.mkstemp(prefix=STAGED_FILE_PREFIX, dir=directory)
+        os.close(file_descriptor)
+        return path
+
+    def __download(self, entry, params, timeout, chunk_size, response=None):
+        try:
+            if response is None:
+                response = http_session.get(entry.url, stream=True, params=params, timeout=timeout)
+            with response:
+                response.raise_for_status()
+                with entry.condition:
+                    entry.expected_size = get_content_length(response.headers)
+                    entry.validator = get_content_validator(response.headers)
+                    entry.headers_received = True
+                    entry.condition.notify_all()
+                with open(entry.path, 'wb') as staged_file:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        staged_file.write(chunk)
+                        staged_file.flush()
+                        with entry.condition:
+                            entry.size += len(chunk)
+                            entry.condition.notify_all()
+            if entry.expected_size is not None and entry.size != entry.expected_size:
+                raise Exception('Received {} bytes but expected {} bytes'.format(entry.size, entry.expected_size))
+            with entry.condition:
+                entry.complete = True
+                entry.condition.notify_all()
+            log.debug('Staged image file {} ({} bytes)'.format(entry.url, entry.size))
+        except Exception as e:
+            log.error('Unable to stage image file {}: {}'.format(entry.url, e))
+            with entry.condition:
+                entry.error = e
+                entry.condition.notify_all()
+        finally:
+            with self._lock:
+                if entry.error is not None:
+                    self.__remove(entry)
+                self.__evict()
+
+    def __evict(self):
+        # must be called while holding the lock
+        now = time.monotonic()
+        unused = sorted([e for e in self._entries.values() if e.readers == 0 and (e.complete or e.error is not None)],
+                        key=lambda e: e.last_used)
+        total_size = sum(max(e.size, e.expected_size or 0) for e in self._entries.values())
+        for entry in unused:
+            if total_size > self.max_size or now - entry.created > self.ttl:
+                total_size -= entry.size
+                self.__remove(entry)
+
+    def __remove(self, entry):
+        # must be called while holding the lock, the file is deleted as soon as the last reader is closed
+        if self._entries.get(entry.key) is entry:
+            del self._entries[entry.key]
+        entry.evicted = True
+        if entry.readers == 0:
+            self.__delete_file(entry.path)
+
+    @staticmethod
+    def __delete_file(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log.warning('Unable to remove staged image file {}: {}'.format(path, e))
@@ -0,0 +1,270 @@
+import base64
+import binascii
+import collections
+import hashlib
+import logging
+import queue
+import threading
+import time
+
+import requests
+
+log = logging.getLogger(__name__)
+
+# shared by all the downloads from the NFVO's image repository so that connections are reused
+http_session = requests.Session()
+
+# marks the end of the image data in the buffer
+_END = object()
+
+
+def get_content_validator(headers):
+    """
+    Returns a value which changes whenever the content behind a URL changes, derived from the HTTP response headers.
+
+    :param headers: the headers of a response
+    :return: a tuple or None if the headers contain neither an ETag nor a Last-Modified header
+    """
+    if headers.get('ETag') is None and headers.get('Last-Modified') is None:
+        return None
+    return headers.get('ETag'), headers.get('Last-Modified'), headers.get('Content-Length')
+
+
+def get_content_length(headers):
+    """
+    Returns the value of the Content-Length header of a response as an int or None.
+
+    :param headers:
+    :return:
+    """
+    content_length = headers.get('Content-Length')
+    return int(content_length) if content_length is not None and content_length.isdigit() else None
+
+
+def get_content_md5(headers):
+    """
+    Returns the hexadecimal MD5 checksum sent in the Content-MD5 header of a response or None.
+
+    :param headers:
+    :return:
+    """
+    content_md5 = headers.get('Content-MD5')
+    if content_md5 is None:
+        return None
+    try:
+        digest = base64.b64decode(content_md5, validate=True)
+    except (binascii.Error, ValueError):
+        digest = None
+    if digest is None or len(digest) != 16:
+        log.debug('Ignoring invalid Content-MD5 header {}'.format(content_md5))
+        return None
+    return binascii.hexlify(digest).decode('ascii')
+
+
+class ImageChecksumRegistry(object):
+    """
+    Thread-safe record of the MD5 checksums of the image files transferred before, so that the checksum of a file
+    which is onboarded again is known without downloading it. An entry is only used as long as the validator of the
+    URL (see get_content_validator) stays the same. At most max_entries URLs are remembered.
+    """
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._checksums = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, url, validator, checksum):
+        """
+        :param url: the URL of the image file
+        :param validator: the validator of the URL, nothing is recorded if it is None
+        :param checksum: the MD5 checksum of the image file
+        :return:
+        """
+        if validator is None:
+            return
+        with self._lock:
+            self._checksums.pop(url, None)
+            self._checksums[url] = (validator, checksum)
+            while len(self._checksums) > self.max_entries:
+                self._checksums.popitem(last=False)
+
+    def lookup(self, url, validator):
+        """
+        :param url: the URL of the image file
+        :param validator: the current validator of the URL
+        :return: the MD5 checksum or None if it is not known
+        """
+        if validator is None:
+            return None
+        with self._lock:
+            entry = self._checksums.get(url)
+        if entry is None or entry[0] != validator:
+            return None
+        return entry[1]
+
+
+# used for deduplicating images which are onboarded several times
+image_checksums = ImageChecksumRegistry()
+
+
+class ImageStream(object):
+    """
+    File-like object streaming the chunks of an image file, e.g. the body of a response of the NFVO's image repository,
+    to a consumer like the Glance client. A background thread fetches the chunks into a buffer holding at most
+    buffer_chunks chunks, so that downloading and uploading overlap while the memory usage stays constant.
+    The MD5 checksum is computed while the data passes through and the progress is logged every progress_interval
+    seconds. If no data arrives within stall_timeout seconds, reading fails.
+    """
+
+    def __init__(self, chunks, name, expected_size=None, validator=None, buffer_chunks=16, stall_timeout=60,
+                 progress_interval=10):
+        """
+        :param chunks: iterator over the chunks of the image file, e.g. response.iter_content(chunk_size)
+        :param name: the name used for logging, e.g. the name of the image
+        :param expected_size: the size of the image file in bytes if known
+        :param validator: the validator of the image file's URL (see get_content_validator) if known
+        """
+        self.chunks = chunks
+        self.name = name
+        self.expected_size = expected_size
+        self.validator = validator
+        self.stall_timeout = stall_timeout if stall_timeout > 0 else None
+        self.progress_interval = progress_interval
+        self.bytes_read = 0
+        self._md5 = hashlib.md5()
+        self._buffer = queue.Queue(maxsize=max(1, buffer_chunks))
+        self._chunk = memoryview(b'')
+        self._offset = 0
+        self._finished = False
+        self._closed = False
+        self._started = None
+        self._last_progress = None
+        self._thread = threading.Thread(target=self.__download, name='image-download-{}'.format(name))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __download(self):
+        try:
+            for chunk in self.chunks:
+                if not self.__put(chunk):
+                    return
+            self.__put(_END)
+        except Exception as e:
+            self.__put(e)
+        finally:
+            if hasattr(self.chunks, 'close'):
+                self.chunks.close()
+
+    def __put(self, item):
+        # wait for the consumer, but stop if the stream has been closed in the meantime
+        waited = 0
+        while not self._closed:
+            try:
+                self._buffer.put(item, timeout=1)
+                return True
+            except queue.Full:
+                waited += 1
+                if self.stall_timeout is not None and waited >= self.stall_timeout:
+                    log.error('The upload of image {} stalled for {} seconds'.format(self.name, waited))
+                    return False
+        return False
+
+    def read(self, size=-1):
+        """
+        Returns up to size bytes, all the remaining bytes if size is negative and an empty bytes object at the end.
+
+        :param size:
+        :return:
+        """
+        data = []
+        remaining = size
+        while remaining != 0:
+            if self._offset >= len(self._chunk):
+                if not self.__next_chunk():
+                    break
+            end = len(self._chunk) if remaining < 0 else min(len(self._chunk), self._offset + remaining)
+            data.append(self._chunk[self._offset:end])
+            if remaining > 0:
+                remaining -= end - self._offset
+            self._offset = end
+        result = b''.join(data)
+        self.__account(result)
+        return result
+
+    def __next_chunk(self):
+        if self._finished:
+            return False
+        if self._started is None:
+            self._started = self._last_progress = time.monotonic()
+        try:
+            item = self._buffer.get(timeout=self.stall_timeout)
+        except queue.Empty:
+            raise Exception('Timeout: no data of image {} received within {} seconds'.format(self.name,
+                                                                                            self.stall_timeout))
+        if item is _END:
+            self._finished = True
+            return False
+        if isinstance(item, Exception):
+            self._finished = True
+            raise item
+        self._chunk = memoryview(item)
+        self._offset = 0
+        return True
+
+    def __account(self, data):
+        self._md5.update(data)
+        self.bytes_read += len(data)
+        now = time.monotonic()
+        if self._last_progress is not None and now - self._last_progress >= self.progress_interval:
+            self._last_progress = now
+            total = ' of {} MB'.format(self.expected_size // 1048576) if self.expected_size is not None else ''
+            log.info('Transferred {} MB{} of image {} ({:.1f} MB/s)'.format(self.bytes_read // 1048576, total,
+                                                                            self.name, self.throughput / 1048576))
+
+    @property
+    def checksum(self):
+        """
+        The MD5 checksum of the data read so far, the same as the checksum computed by Glance.
+        """
+        return self._md5.hexdigest()
+
+    @property
+    def throughput(self):
+        """
+        The average number of bytes read per second.
+        """
+        if self._started is None:
+            return 0.0
+        return self.bytes_read / max(time.monotonic() - self._started, 0.001)
+
+    def verify(self, glance_checksum=None):
+        """
+        Checks that the complete response body has been read and, if passed, that it matches the checksum computed
+        by Glance. An Exception is raised otherwise.
+
+        :param glance_checksum:
+        :return:
+        """
+        if not self._finished:
+            raise Exception('The data of image {} has not been read completely'.format(self.name))
+        if self.expected_size is not None and self.bytes_read != self.expected_size:
+            raise Exception('Received {} bytes of image {} but expected {} bytes'.format(self.bytes_read, self.name,
+                                                                                         self.expected_size))
+        if glance_checksum not in (None, '') and glance_checksum != self.checksum:
+            raise Exception('The checksum of image {} computed by Glance ({}) differs from the checksum of the '
+                            'downloaded data ({})'.format(self.name, glance_checksum, self.checksum))
+        log.info('Transferred {} bytes of image {} with checksum {} ({:.1f} MB/s)'.format(
+            self.bytes_read, self.name, self.checksum, self.throughput / 1048576))
+
+    def close(self):
+        """
+        Stops fetching chunks. The buffered data is discarded.
+
+        :return:
+        """
+        self._closed = True
+        try:
+            while True:
+                self._buffer.get_nowait()
+        except queue.Empty:
+            pass
@@ -0,0 +1,354 @@
+import functools
+import logging
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse
+
+import keystoneauth1.session
+
+from openstack_vim_driver.tracing import tracer
+
+log = logging.getLogger(__name__)
+
+# the upper bounds of the buckets of the latency histograms (in seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# path segments which identify a resource and are replaced by {id} in the operation labels
+_ID_PATTERN = re.compile(r'^([0-9a-fA-F]{32}|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|\d+)$')
+
+
+def get_operation(method, url):
+    """
+    Returns the label of an OpenStack API call, e.g. 'GET /v2.0/networks/{id}'.
+
+    :param method: the HTTP method
+    :param url: the URL or path of the request
+    :return:
+    """
+    path = urlparse(url).path
+    segments = ['{id}' if _ID_PATTERN.match(segment) else segment for segment in path.split('/')]
+    return '{} {}'.format(method.upper(), '/'.join(segments) or '/')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _Histogram(object):
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+
+    def observe(self, duration, error):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if duration <= bound:
+                self.buckets[i] += 1
+        self.count += 1
+        self.sum += duration
+        if error:
+            self.errors += 1
+
+
+class MetricsRegistry(object):
+    """
+    Thread-safe registry of the latency histograms, call counts, error counts and transferred bytes of the OpenStack
+    API calls and of the methods of the VIM driver, labelled by VIM and operation.
+    Nothing is recorded while it is disabled.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._requests = {}
+        self._methods = {}
+        self._bytes = {}
+        self._lock = threading.Lock()
+
+    def observe_request(self, vim, service, operation, duration, error=False, bytes_sent=0, bytes_received=0):
+        """
+        Records an OpenStack API call.
+
+        :param vim: the name of the VIM
+        :param service: the OpenStack service, e.g. 'compute'
+        :param operation: see get_operation
+        :param duration: the duration in seconds
+        :param error: True if the call failed
+        :param bytes_sent: the size of the request body
+        :param bytes_received: the size of the response body
+        :return:
+        """
+        if not self.enabled:
+            return
+        key = (vim, service, operation)
+        with self._lock:
+            self._requests.setdefault(key, _Histogram()).observe(duration, error)
+        self.observe_bytes(vim, service, operation, bytes_sent, bytes_received)
+
+    def observe_bytes(self, vim, service, operation, bytes_sent=0, bytes_received=0):
+        """
+        Records transferred bytes, e.g. of streamed image uploads whose size is not known to the session.
+
+        :param vim:
+        :param service:
+        :param operation:
+        :param bytes_sent:
+        :param bytes_received:
+        :return:
+        """
+        if not self.enabled or (bytes_sent == 0 and bytes_received == 0):
+            return
+        key = (vim, service, operation)
+        with self._lock:
+            sent, received = self._bytes.get(key, (0, 0))
+            self._bytes[key] = (sent + bytes_sent, received + bytes_received)
+
+    def observe_method(self, vim, method, duration, error=False):
+        """
+        Records a call of a method of the VIM driver.
+
+        :param vim: the name of the VIM
+        :param method: the name of the method
+        :param duration: the duration in seconds
+        :param error: True if the method raised an exception
+        :return:
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._methods.setdefault((vim, method), _Histogram()).observe(duration, error)
+
+    def render(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+
+        :return:
+        """
+        with self._lock:
+            requests = {key: self.__copy(histogram) for key, histogram in self._requests.items()}
+            methods = {key: self.__copy(histogram) for key, histogram in self._methods.items()}
+            transferred = dict(self._bytes)
+        lines = []
+        self.__render_histograms(lines, 'openstack_vim_driver_api_request_duration_seconds',
+                                 'Latency of the OpenStack API calls', ('vim', 'service', 'operation'), requests)
+        self.__render_counters(lines, 'openstack_vim_driver_api_request_errors_total',
+                               'Number of failed OpenStack API calls', ('vim', 'service', 'operation'),
+                               {key: histogram.errors for key, histogram in requests.items()})
+        self.__render_counters(lines, 'openstack_vim_driver_api_bytes_sent_total',
+                               'Bytes sent to OpenStack', ('vim', 'service', 'operation'),
+                               {key: value[0] for key, value in transferred.items()})
+        self.__render_counters(lines, 'openstack_vim_driver_api_bytes_received_total',
+                               'Bytes received from OpenStack', ('vim', 'service', 'operation'),
+                               {key: value[1] for key, value in transferred.items()})
+        self.__render_histograms(lines, 'openstack_vim_driver_method_duration_seconds',
+                                 'Duration of the VIM driver methods', ('vim', 'method'), methods)
+        self.__render_counters(lines, 'openstack_vim_driver_method_errors_total',
+                               'Number of VIM driver methods which raised an exception', ('vim', 'method'),
+                               {key: histogram.errors for key, histogram in methods.items()})
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """
+        Returns a short human readable summary of the metrics, one line per VIM and operation.
+
+        :return:
+        """
+        with self._lock:
+            entries = [('api', key, self.__copy(h)) for key, h in self._requests.items()] + [
+                ('method', key, self.__copy(h)) for key, h in self._methods.items()]
+        lines = []
+        for kind, key, histogram in sorted(entries, key=lambda entry: -entry[2].sum):
+            lines.append('{} {}: {} calls, {} errors, {:.3f}s average, {:.1f}s total'.format(
+                kind, ' '.join(str(label) for label in key), histogram.count, histogram.errors,
+                histogram.sum / max(histogram.count, 1), histogram.sum))
+        return '\n'.join(lines)
+
+    @staticmethod
+    def __copy(histogram):
+        copy = _Histogram()
+        copy.buckets = list(histogram.buckets)
+        copy.count = histogram.count
+        copy.sum = histogram.sum
+        copy.errors = histogram.errors
+        return copy
+
+    @staticmethod
+    def __labels(names, values, extra=''):
+        labels = ','.join('{}="{}"'.format(name, _escape(value)) for name, value in zip(names, values))
+        if extra:
+            labels = labels + ',' + extra if labels else extra
+        return '{' + labels + '}'
+
+    def __render_histograms(self, lines, name, help_text, label_names, histograms):
+        lines.append('# HELP {} {}'.format(name, help_text))
+        lines.append('# TYPE {} histogram'.format(name))
+        for key, histogram in sorted(histograms.items()):
+            for bound, count in zip(LATENCY_BUCKETS, histogram.buckets):
+                lines.append('{}_bucket{} {}'.format(name, self.__labels(label_names, key, 'le="{}"'.format(bound)),
+                                                     count))
+            lines.append('{}_bucket{} {}'.format(name, self.__labels(label_names, key, 'le="+Inf"'), histogram.count))
+            lines.append('{}_sum{} {}'.format(name, self.__labels(label_names, key), histogram.sum))
+            lines.append('{}_count{} {}'.format(name, self.__labels(label_names, key), histogram.count))
+
+    def __render_counters(self, lines, name, help_text, label_names, values):
+        lines.append('# HELP {} {}'.format(name, help_text))
+        lines.append('# TYPE {} counter'.format(name))
+        for key, value in sorted(values.items()):
+            lines.append('{}{} {}'.format(name, self.__labels(label_names, key), value))
+
+
+# the metrics of this VIM driver process
+metrics = MetricsRegistry()
+
+
+def get_vim_label(vim_instance):
+    """
+    :param vim_instance:
+    :return: the label identifying the VIM instance in the metrics
+    """
+    if not isinstance(vim_instance, dict):
+        return ''
+    return vim_instance.get('name') or vim_instance.get('id') or ''
+
+
+def instrumented(method):
+    """
+    Decorator recording the duration and the failures of a method of the VIM driver whose first argument
+    is a VIM instance, and a span for it while tracing is enabled.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not metrics.enabled and not tracer.enabled:
+            return method(self, *args, **kwargs)
+        vim_instance = args[0] if len(args) > 0 else kwargs.get('vim_instance')
+        vim = get_vim_label(vim_instance)
+        started = time.monotonic()
+        error = True
+        try:
+            with tracer.span(method.__name__, vim=vim):
+                result = method(self, *args, **kwargs)
+            error = False
+            return result
+        finally:
+            metrics.observe_method(vim, method.__name__, time.monotonic() - started, error)
+
+    return wrapper
+
+
+def _get_resource(path):
+    """
+    :param path: the path of an OpenStack API call
+    :return: the type and the ID of the resource the call refers to, e.g. ('servers', '<id>')
+    """
+    segments = [segment for segment in path.split('/') if segment != '']
+    for i in range(len(segments) - 1, -1, -1):
+        if not _ID_PATTERN.match(segments[i]):
+            resource_id = segments[i + 1] if i + 1 < len(segments) else None
+            return segments[i], resource_id
+    return None, None
+
+
+class InstrumentedSession(keystoneauth1.session.Session):
+    """
+    Keystone session recording every request sent through it, i.e. all the calls of the Nova, Neutron and Glance
+    clients as well as the authentication requests, in the metrics and as spans of the current trace.
+    """
+
+    def __init__(self, vim_name='', **kwargs):
+        super(InstrumentedSession, self).__init__(**kwargs)
+        self.vim_name = vim_name
+
+    def request(self, url, method, **kwargs):
+        if not metrics.enabled and tracer.current_span() is None:
+            return super(InstrumentedSession, self).request(url, method, **kwargs)
+        service = (kwargs.get('endpoint_filter') or {}).get('service_type') or kwargs.get('client_name') or 'identity'
+        operation = get_operation(method, url)
+        started = time.monotonic()
+        response = None
+        # calls of background threads, e.g. polls of the ServerWaiter, do not start traces of their own
+        with tracer.child_span(operation, kind='client', vim=self.vim_name, service=service) as span:
+            try:
+                response = super(InstrumentedSession, self).request(url, method, **kwargs)
+                return response
+            except Exception as e:
+                response = getattr(e, 'response', None)
+                raise
+            finally:
+                duration = time.monotonic() - started
+                bytes_sent = 0
+                bytes_received = 0
+                if response is not None:
+                    if response.request is not None:
+                        bytes_sent = int(response.request.headers.get('Content-Length') or 0)
+                    bytes_received = int(response.headers.get('Content-Length') or 0)
+                error = response is None or response.status_code >= 400
+                metrics.observe_request(self.vim_name, service, operation, duration, error, bytes_sent,
+                                        bytes_received)
+                if span is not None:
+                    resource, resource_id = _get_resource(urlparse(url).path)
+                    span.set_attribute('resource', resource)
+                    span.set_attribute('resource.id', resource_id)
+                    span.set_attribute('http.method', method.upper())
+                    span.set_attribute('http.status_code', response.status_code if response is not None else None)
+                    if error:
+                        span.set_status(True, 'HTTP {}'.format(response.status_code) if response is not None else '')
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug('Metrics request from {}: {}'.format(self.client_address[0], format % args))
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def start_metrics_server(address='127.0.0.1', port=9464):
+    """
+    Starts a background HTTP server exposing the metrics at /metrics in the Prometheus text format.
+
+    :param address:
+    :param port:
+    :return: the server
+    """
+    server = _ThreadingHTTPServer((address, port), _MetricsRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server')
+    thread.daemon = True
+    thread.start()
+    log.info('Exposing metrics on http://{}:{}/metrics'.format(address, server.server_port))
+    return server
+
+
+def start_metrics_dump(interval):
+    """
+    Starts a background thread logging a summary of the metrics every interval seconds.
+
+    :param interval:
+    :return:
+    """
+
+    def dump():
+        while True:
+            time.sleep(interval)
+            summary = metrics.summary()
+            if summary:
+                log.info('Metrics:\n{}'.format(summary))
+
+    thread = threading.Thread(target=dump, name='metrics-dump')
+    thread.daemon = True
+    thread.start()
@@ -0,0 +1,95 @@
+import ipaddress
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class SubnetIndex(object):
+    """
+    Index over the subnets of one network which finds the subnet containing an IP address
+    without enumerating the host addresses of the subnets. IPv4 and IPv6 subnets are supported.
+    """
+
+    def __init__(self, subnets: [dict]):
+        """
+        :param subnets: the subnets as returned by Neutron, each one containing at least the keys id and cidr
+        """
+        self._subnets = {4: [], 6: []}
+        for subnet in subnets:
+            try:
+                cidr = ipaddress.ip_network(subnet.get('cidr'), strict=False)
+            except ValueError:
+                log.warning('Ignoring subnet {} with invalid CIDR {}'.format(subnet.get('id'), subnet.get('cidr')))
+                continue
+            self._subnets[cidr.version].append((cidr, subnet.get('id')))
+        # prefer the most specific subnet if subnets overlap
+        for version in self._subnets:
+            self._subnets[version].sort(key=lambda entry: entry[0].prefixlen, reverse=True)
+
+    @staticmethod
+    def __is_host_address(address, cidr):
+        # the same addresses as the ones returned by ip_network.hosts()
+        if cidr.version == 4 and cidr.prefixlen >= 31:
+            return True
+        if cidr.version == 6 and cidr.prefixlen >= 127:
+            return True
+        if address == cidr.network_address:
+            return False
+        return cidr.version == 6 or address != cidr.broadcast_address
+
+    def find_subnet_id(self, ip):
+        """
+        Returns the ID of the subnet which contains the passed IP address as a host address or None.
+
+        :param ip: the IP address as a string
+        :return:
+        """
+        address = ipaddress.ip_address(ip)
+        for cidr, subnet_id in self._subnets[address.version]:
+            if address in cidr and self.__is_host_address(address, cidr):
+                return subnet_id
+        return None
+
+
+# the device owners of the ports which attach a router to a network
+ROUTER_INTERFACE_DEVICE_OWNERS = ['network:router_interface', 'network:router_interface_distributed',
+                                  'network:ha_router_replicated_interface']
+
+
+class RouterTopology(object):
+    """
+    Adjacency index between networks, the routers they are attached to and the external networks which are the
+    gateways of these routers. It is built once from the routers and the router interface ports so that the external
+    networks reachable from a network can be looked up without iterating over routers and ports.
+    """
+
+    def __init__(self, routers: [dict], router_ports: [dict]):
+        """
+        :param routers: the routers as returned by Neutron, each one containing at least the keys id and
+        external_gateway_info
+        :param router_ports: the ports attaching routers to networks, each one containing at least the keys device_id
+        and network_id
+        """
+        gateways = {}
+        for router in routers:
+            gateway_info = router.get('external_gateway_info') or {}
+            if gateway_info.get('network_id') not in (None, ''):
+                gateways[router.get('id')] = gateway_info.get('network_id')
+        self._external_network_ids = {}
+        for port in router_ports:
+            gateway_network_id = gateways.get(port.get('device_id'))
+            if gateway_network_id is None:
+                # the router is not connected to an external network
+                continue
+            external_network_ids = self._external_network_ids.setdefault(port.get('network_id'), [])
+            if gateway_network_id not in external_network_ids:
+                external_network_ids.append(gateway_network_id)
+
+    def find_external_network_ids(self, network_id):
+        """
+        Returns the IDs of the external networks which are the gateways of the routers attached to the network.
+
+        :param network_id:
+        :return: a list of network IDs which is empty if the network is not connected to an external network
+        """
+        return list(self._external_network_ids.get(network_id, []))
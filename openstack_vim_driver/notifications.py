@@ -0,0 +1,112 @@
+import json
+import logging
+import threading
+import time
+
+import pika
+
+log = logging.getLogger(__name__)
+
+# the seconds to wait before reconnecting to the broker after the connection was lost
+RECONNECT_DELAY = 5
+
+# the notifications which carry the state of a VM and the state they imply if the payload does not contain one
+VM_STATE_EVENTS = {
+    'instance.create.end': None,
+    'instance.update': None,
+    'instance.delete.end': 'deleted',
+    'compute.instance.create.end': None,
+    'compute.instance.update': None,
+    'compute.instance.delete.end': 'deleted'
+}
+
+
+def parse_nova_notification(body):
+    """
+    Extracts the VM ID and its state from a Nova notification as sent by oslo.messaging.
+    Versioned as well as legacy (unversioned) notifications are supported.
+
+    :param body: the body of the AMQP message
+    :return: a (server_id, state) tuple or None if the message does not report the state of a VM
+    """
+    if isinstance(body, bytes):
+        body = body.decode('utf-8')
+    message = json.loads(body)
+    if 'oslo.message' in message:
+        message = json.loads(message.get('oslo.message'))
+    event_type = message.get('event_type')
+    if event_type not in VM_STATE_EVENTS:
+        return None
+    payload = message.get('payload') or {}
+    if 'nova_object.data' in payload:
+        data = payload.get('nova_object.data') or {}
+        server_id = data.get('uuid')
+    else:
+        data = payload
+        server_id = data.get('instance_id')
+    state = VM_STATE_EVENTS.get(event_type) or data.get('state')
+    if server_id is None or state is None:
+        return None
+    return server_id, state.lower()
+
+
+class NovaNotificationListener(threading.Thread):
+    """
+    Consumes Nova's notifications from RabbitMQ and passes the state changes of VMs to a handler.
+    An exclusive queue is bound to the notification exchange so that several VIM Drivers can listen at the same time.
+    If the connection is lost, the listener reconnects after a few seconds.
+    """
+
+    def __init__(self, handler, broker_ip='127.0.0.1', port=5672, username='guest', password='guest',
+                 virtual_host='/', exchange_name='nova', routing_key='versioned_notifications.info', heartbeat=60):
+        """
+        :param handler: function taking a server ID and a state, called for every VM state notification
+        """
+        super(NovaNotificationListener, self).__init__(name='nova-notification-listener')
+        self.daemon = True
+        self.handler = handler
+        self.connection_parameters = pika.ConnectionParameters(host=broker_ip, port=int(port),
+                                                               virtual_host=virtual_host,
+                                                               credentials=pika.PlainCredentials(username, password),
+                                                               heartbeat=heartbeat)
+        self.exchange_name = exchange_name
+        self.routing_keys = [key.strip() for key in routing_key.split(',') if key.strip()]
+        self.stop_running = False
+
+    def run(self):
+        while not self.stop_running:
+            try:
+                self.__consume()
+            except Exception as e:
+                log.warning('Lost connection for receiving Nova notifications, reconnecting: {}'.format(e))
+                time.sleep(RECONNECT_DELAY)
+
+    def __consume(self):
+        connection = pika.BlockingConnection(self.connection_parameters)
+        try:
+            channel = connection.channel()
+            queue_name = channel.queue_declare(queue='', exclusive=True, auto_delete=True).method.queue
+            for routing_key in self.routing_keys:
+                channel.queue_bind(queue=queue_name, exchange=self.exchange_name, routing_key=routing_key)
+            log.info('Listening for Nova notifications on exchange {}'.format(self.exchange_name))
+            for method, properties, body in channel.consume(queue_name, inactivity_timeout=1):
+                if self.stop_running:
+                    break
+                if method is None:
+                    continue
+                channel.basic_ack(method.delivery_tag)
+                try:
+                    vm_state = parse_nova_notification(body)
+                except Exception as e:
+                    log.debug('Ignoring notification which can not be parsed: {}'.format(e))
+                    continue
+                if vm_state is not None:
+                    self.handler(*vm_state)
+        finally:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def stop(self):
+        self.stop_running = True
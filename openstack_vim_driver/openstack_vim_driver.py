@@ -1,7 +1,7 @@
 import argparse
 import configparser
+import contextlib
 import ipaddress
-import time
 
 import sys
 
@@ -15,8 +15,11 @@ import logging
 import logging.config
 import os.path
 import tempfile
+import threading
 
 from glanceclient import Client as Glance
+from glanceclient.exc import NotFound as GlanceNotFoundException
+from neutronclient.common.exceptions import NotFound as NeutronNotFoundException
 from neutronclient.v2_0.client import Client as Neutron
 from novaclient.client import Client as Nova
 from novaclient.exceptions import NotFound as ServerNotFoundException
@@ -24,11 +27,55 @@ import keystoneauth1.loading
 import keystoneauth1.session
 import keystoneauth1
 
+from openstack_vim_driver.catalog_cache import CatalogCache, DEFAULT_TTLS
+from openstack_vim_driver.coalescing import SingleFlight, get_request_key
+from openstack_vim_driver.concurrency import run_concurrently, map_concurrently
+from openstack_vim_driver.delta_refresh import RefreshSnapshots
+from openstack_vim_driver.floating_ips import FloatingIpClaims, FloatingIpPoolRegistry
+from openstack_vim_driver.image_staging import ImageStagingCache
+from openstack_vim_driver.image_transfer import ImageStream, http_session, image_checksums, get_content_length, \
+    get_content_md5, get_content_validator
+from openstack_vim_driver.metrics import InstrumentedSession, instrumented, get_vim_label, metrics, \
+    start_metrics_server, start_metrics_dump
+from openstack_vim_driver.network_index import SubnetIndex, RouterTopology, ROUTER_INTERFACE_DEVICE_OWNERS
+from openstack_vim_driver.notifications import NovaNotificationListener
+from openstack_vim_driver.profiling import profiled, profiler, install_toggle_signal
+from openstack_vim_driver.server_waiter import ServerWaiterRegistry
+from openstack_vim_driver.sessions import SessionRegistry, get_pool_size, mount_http_adapter
+from openstack_vim_driver.tracing import tracer, traced, JsonLinesExporter, OtlpExporter
+
 log = logging.getLogger(__name__)
 
 # used for caching the created pem files
 cert_files = {}
 
+# used for reusing the Keystone sessions and OpenStack clients of a VIM across requests
+session_registry = SessionRegistry()
+
+# used for waiting until VMs reach a certain state by polling all the VMs of a VIM together
+server_waiters = ServerWaiterRegistry()
+
+# used for preventing that several threads associate the same floating IP
+floating_ip_claims = FloatingIpClaims()
+
+# used for keeping pre-allocated floating IPs per external network
+floating_ip_pools = FloatingIpPoolRegistry()
+
+# used for sharing the download of an image file between the uploads to several VIMs
+image_staging = ImageStagingCache()
+
+# used for sending concurrent identical list requests to OpenStack only once
+single_flight = SingleFlight()
+
+# used for caching the images, flavors, networks etc. of a VIM across requests, concurrent misses are coalesced
+catalog_cache = CatalogCache(single_flight=single_flight)
+
+# used for refreshing VIMs by fetching only the resources changed since the last refresh
+refresh_snapshots = RefreshSnapshots()
+
+# the maximum number of values passed in one list filter to Neutron, so that the URLs do not get too long
+FILTER_CHUNK_SIZE = 50
+
 
 def get_identity_api_version(authUrl):
     """
@@ -70,13 +117,71 @@ def create_cert_file(vim_instance):
 
 
 class OpenstackVimDriver(VimDriver):
-    def __init__(self, deallocate_floating_ips=True, connection_timeout=10, wait_for_vm=15):
+    # see configure
+    image_deduplication = 'none'
+    refresh_mode = 'full'
+
+    def __init__(self, deallocate_floating_ips=True, connection_timeout=10, wait_for_vm=15, parallel_requests=8,
+                 parallel_request_timeout=120, server_page_size=500, image_chunk_size=1048576, image_buffer_chunks=16,
+                 image_stall_timeout=60, image_progress_interval=10, wait_for_vm_deletion=15):
         self.deallocate_floating_ips = deallocate_floating_ips
         self.connection_timeout = connection_timeout if connection_timeout > 0 else None
         self.wait_for_vm = wait_for_vm
+        self.parallel_requests = parallel_requests
+        self.parallel_request_timeout = parallel_request_timeout
+        self.server_page_size = server_page_size
+        self.image_chunk_size = image_chunk_size
+        self.image_buffer_chunks = image_buffer_chunks
+        self.image_stall_timeout = image_stall_timeout
+        self.image_progress_interval = image_progress_interval
+        self.wait_for_vm_deletion = wait_for_vm_deletion
+
+    @classmethod
+    def configure(cls, session_idle_timeout=600, cache_ttls=None, wait_poll_interval_min=0.5,
+                  wait_poll_interval_max=5, floating_ip_pool_low_watermark=0, floating_ip_pool_high_watermark=0,
+                  image_deduplication='none', image_staging_directory=None, image_staging_max_size=0,
+                  image_staging_ttl=3600, refresh_mode='full', refresh_full_interval=3600, coalesce_requests=True):
+        """
+        Validates the settings shared by all the instances of the VIM driver and applies them to the caches,
+        registries and pools of this process. The SDK creates a new instance for every message, so this is called
+        once before the VIM driver starts, see main.
+
+        :param session_idle_timeout: the seconds after which unused Keystone sessions are evicted
+        :param cache_ttls: a dictionary overriding the time to live of cached collections, see DEFAULT_TTLS
+        :param wait_poll_interval_min: the minimum seconds between two polls of the VMs of a VIM
+        :param wait_poll_interval_max: the maximum seconds between two polls of the VMs of a VIM
+        :param floating_ip_pool_low_watermark:
+        :param floating_ip_pool_high_watermark: zero or less disables the floating IP pools
+        :param image_deduplication: none, checksum or download
+        :param image_staging_directory:
+        :param image_staging_max_size: the maximum size of the staged image files in MB, zero disables the staging
+        :param image_staging_ttl:
+        :param refresh_mode: full or delta
+        :param refresh_full_interval: the seconds after which a delta refresh lists all the resources again
+        :param coalesce_requests:
+        :return:
+        """
+        if image_deduplication not in ('none', 'checksum', 'download'):
+            raise ValueError('The image deduplication has to be one of none, checksum or download but is {}'.format(
+                image_deduplication))
+        if refresh_mode not in ('full', 'delta'):
+            raise ValueError('The refresh mode has to be full or delta but is {}'.format(refresh_mode))
+        cls.image_deduplication = image_deduplication
+        cls.refresh_mode = refresh_mode
+        session_registry.idle_timeout = session_idle_timeout
+        catalog_cache.ttls = dict(DEFAULT_TTLS, **(cache_ttls or {}))
+        server_waiters.min_interval = wait_poll_interval_min
+        server_waiters.max_interval = wait_poll_interval_max
+        floating_ip_pools.low_watermark = floating_ip_pool_low_watermark
+        floating_ip_pools.high_watermark = floating_ip_pool_high_watermark
+        image_staging.directory = image_staging_directory
+        image_staging.max_size = image_staging_max_size * 1048576
+        image_staging.ttl = image_staging_ttl
+        refresh_snapshots.full_interval = refresh_full_interval
+        single_flight.enabled = coalesce_requests
 
     def get_keystone_session(self, authUrl, username, password, project_id_or_tenant_name, user_domain_name=None,
-                             cert_file_path=None):
+                             cert_file_path=None, vim_name=''):
         loader = keystoneauth1.loading.get_plugin_loader('password')
         cert_file_path = True if cert_file_path is None else cert_file_path
 
@@ -97,59 +202,137 @@ class OpenstackVimDriver(VimDriver):
         auth = loader.load_from_options(auth_url=authUrl, username=username, password=password,
                                         project_id=project_id_or_tenant_name, user_domain_name=user_domain_name)
         # theoretically it should be possible to pass a certificate to the session but it seems not to work
-        sess = keystoneauth1.session.Session(auth=auth, timeout=self.connection_timeout, verify=cert_file_path)
+        http_pool = mount_http_adapter(requests.Session(), session_registry.pool_size,
+                                       keystoneauth1.session.TCPKeepAliveAdapter)
+        sess = InstrumentedSession(vim_name=vim_name, auth=auth, session=http_pool, timeout=self.connection_timeout,
+                                   verify=cert_file_path)
         return sess
 
-    def get_glance_client(self, vim_instance):
+    def __create_keystone_session(self, vim_instance):
         cert_file_path = create_cert_file(vim_instance)
-        glance_client = Glance(version='2',
-                               session=self.get_keystone_session(
-                                   vim_instance.get('authUrl'),
-                                   vim_instance.get('username'),
-                                   vim_instance.get('password'),
-                                   vim_instance.get('tenant'),
-                                   vim_instance.get('domain'),
-                                   cert_file_path)
-                               )
-        return glance_client
+        return self.get_keystone_session(vim_instance.get('authUrl'),
+                                         vim_instance.get('username'),
+                                         vim_instance.get('password'),
+                                         vim_instance.get('tenant'),
+                                         vim_instance.get('domain'),
+                                         cert_file_path,
+                                         get_vim_label(vim_instance))
+
+    def get_glance_client(self, vim_instance):
+        return session_registry.get_client(vim_instance, 'glance', self.__create_keystone_session,
+                                           lambda sess: Glance(version='2', session=sess))
 
     def get_neutron_client(self, vim_instance):
-        cert_file_path = create_cert_file(vim_instance)
-        neutron_client = Neutron(session=self.get_keystone_session(
-            vim_instance.get('authUrl'),
-            vim_instance.get('username'),
-            vim_instance.get('password'),
-            vim_instance.get('tenant'),
-            vim_instance.get('domain'),
-            cert_file_path))
-        return neutron_client
+        return session_registry.get_client(vim_instance, 'neutron', self.__create_keystone_session,
+                                           lambda sess: Neutron(session=sess))
 
     def get_nova_client(self, vim_instance):
-        cert_file_path = create_cert_file(vim_instance)
-        nova_client = Nova(version='2',
-                           session=self.get_keystone_session(
-                               vim_instance.get('authUrl'),
-                               vim_instance.get('username'),
-                               vim_instance.get('password'),
-                               vim_instance.get('tenant'),
-                               vim_instance.get('domain'),
-                               cert_file_path))
-        return nova_client
+        return session_registry.get_client(vim_instance, 'nova', self.__create_keystone_session,
+                                           lambda sess: Nova(version='2', session=sess))
 
+    @instrumented
+    @profiled
     def list_images(self, vim_instance: dict, glance_client=None):
         if glance_client is None:
             glance_client = self.get_glance_client(vim_instance)
-        return [NFVImage(name=i.get('name'),
-                         ext_id=i.get('id'),
-                         min_ram=int(i.get('min_ram')),
-                         min_disk_space=int(i.get('min_disk')),
-                         created=i.get('created_at'),
-                         updated=i.get('updated_at'),
-                         is_public=True if i.get('visibility') == 'public' else False,
-                         disk_format=i.get('disk_format'),
-                         container_format=i.get('container_format'),
-                         status=ImageStatus(i.get('status').upper())) for i in glance_client.images.list()]
+        os_images = single_flight.do(get_request_key(vim_instance, 'list_images'),
+                                     lambda: list(glance_client.images.list()))
+        return [self.__os_image_to_nfv_image(i) for i in os_images]
+
+    def __os_image_to_nfv_image(self, os_image):
+        return NFVImage(name=os_image.get('name'),
+                        ext_id=os_image.get('id'),
+                        min_ram=int(os_image.get('min_ram')),
+                        min_disk_space=int(os_image.get('min_disk')),
+                        created=os_image.get('created_at'),
+                        updated=os_image.get('updated_at'),
+                        is_public=True if os_image.get('visibility') == 'public' else False,
+                        disk_format=os_image.get('disk_format'),
+                        container_format=os_image.get('container_format'),
+                        status=ImageStatus(os_image.get('status').upper()))
+
+    @contextlib.contextmanager
+    def __stream_image_file(self, image_file_or_url, params, image_name):
+        """
+        Context manager providing an ImageStream over the image file. If the staging of image files is enabled, the
+        file is read from the staging cache, so that concurrent and later transfers of the same file share one download.
+
+        :param image_file_or_url: the URL pointing to the image file
+        :param params: the query parameters for the image repository
+        :param image_name: the name used for logging
+        :return:
+        """
+        timeout = (self.connection_timeout, self.image_stall_timeout or None)
+        staged_image = image_staging.open(image_file_or_url, params=params, timeout=timeout,
+                                          chunk_size=self.image_chunk_size)
+        if staged_image is not None:
+            with staged_image:
+                image_stream = ImageStream(staged_image.iter_chunks(self.image_chunk_size, self.image_stall_timeout),
+                                           image_name, expected_size=staged_image.expected_size,
+                                           validator=staged_image.validator, buffer_chunks=self.image_buffer_chunks,
+                                           stall_timeout=self.image_stall_timeout,
+                                           progress_interval=self.image_progress_interval)
+                try:
+                    yield image_stream
+                finally:
+                    image_stream.close()
+        else:
+            with http_session.get(image_file_or_url, stream=True, params=params, timeout=timeout) as image_request:
+                image_request.raise_for_status()
+                image_stream = ImageStream(image_request.iter_content(chunk_size=self.image_chunk_size), image_name,
+                                           expected_size=get_content_length(image_request.headers),
+                                           validator=get_content_validator(image_request.headers),
+                                           buffer_chunks=self.image_buffer_chunks,
+                                           stall_timeout=self.image_stall_timeout,
+                                           progress_interval=self.image_progress_interval)
+                try:
+                    yield image_stream
+                finally:
+                    image_stream.close()
 
+    def __find_duplicate_image(self, image_file_or_url, params, image_name, disk_format, container_format,
+                               glance_client):
+        """
+        Returns an active image in Glance with the same content and formats as the image file or None.
+        The checksum of the image file is taken from the Content-MD5 header of the image repository or from a previous
+        transfer of the same file. If image-deduplication is set to download and the checksum is not known, the file
+        is downloaded for computing it.
+
+        :param image_file_or_url: the URL pointing to the image file
+        :param params: the query parameters for the image repository
+        :param image_name:
+        :param disk_format:
+        :param container_format:
+        :param glance_client:
+        :return: the Glance image or None
+        """
+        checksum = None
+        try:
+            head_request = http_session.head(image_file_or_url, params=params, allow_redirects=True,
+                                             timeout=(self.connection_timeout, self.image_stall_timeout or None))
+            head_request.raise_for_status()
+            checksum = get_content_md5(head_request.headers) or image_checksums.lookup(
+                image_file_or_url, get_content_validator(head_request.headers))
+        except Exception as e:
+            log.debug('Unable to get the headers of image file {}: {}'.format(image_file_or_url, e))
+        if checksum is None and self.image_deduplication == 'download':
+            log.info('Computing the checksum of image {}'.format(image_name))
+            with self.__stream_image_file(image_file_or_url, params, image_name) as image_stream:
+                while len(image_stream.read(self.image_chunk_size)) > 0:
+                    pass
+            image_stream.verify()
+            checksum = image_stream.checksum
+            image_checksums.record(image_file_or_url, image_stream.validator, checksum)
+        if checksum is None:
+            return None
+        for os_image in glance_client.images.list(filters={'checksum': checksum, 'status': 'active'}):
+            if os_image.get('checksum') == checksum and os_image.get('status') == 'active' and os_image.get(
+                    'disk_format') == disk_format and os_image.get('container_format') == container_format:
+                return os_image
+        return None
+
+    @instrumented
+    @profiled
     def add_image(self, vim_instance: dict, image: dict, image_file_or_url, image_repo_token=None,
                   glance_client=None) -> NFVImage:
         """
@@ -186,6 +369,19 @@ class OpenstackVimDriver(VimDriver):
                 'The amount of RAM (in MB) required to boot the image has to be set to a non-negative integer value')
         if glance_client is None:
             glance_client = self.get_glance_client(vim_instance)
+        params = {'token': image_repo_token} if image_repo_token is not None else None
+        if self.image_deduplication in ('checksum', 'download'):
+            try:
+                duplicate_image = self.__find_duplicate_image(image_file_or_url, params, image_name,
+                                                              disk_format.lower(), container_format.lower(),
+                                                              glance_client)
+            except Exception as e:
+                log.warning('Unable to look for a duplicate of image {}: {}'.format(image_name, e))
+                duplicate_image = None
+            if duplicate_image is not None:
+                log.info('Image {} already exists in VIM {} as image {} ({}), skipping the upload'.format(
+                    image_name, vim_instance.get('name'), duplicate_image.get('name'), duplicate_image.get('id')))
+                return self.__os_image_to_nfv_image(duplicate_image)
         log.info('Uploading image {} to VIM {}'.format(image_name, vim_instance.get('name')))
         # create image
         try:
@@ -199,11 +395,15 @@ class OpenstackVimDriver(VimDriver):
             raise
         try:
             exception_occurred = True
-            params = {'token': image_repo_token} if image_repo_token is not None else None
-            with requests.get(image_file_or_url, stream=True, params=params) as image_request:
-                # upload data to image
-                glance_client.images.upload(image_created.id, image_request.raw)
-                log.info('Upload process of image {} finished'.format(image_name))
+            # stream the data through a bounded buffer to the image
+            with self.__stream_image_file(image_file_or_url, params, image_name) as image_stream:
+                glance_client.images.upload(image_created.id, image_stream, image_size=image_stream.expected_size)
+            metrics.observe_bytes(get_vim_label(vim_instance), 'image', 'PUT /v2/images/{id}/file',
+                                  bytes_sent=image_stream.bytes_read)
+            image_created = glance_client.images.get(image_created.id)
+            image_stream.verify(image_created.checksum)
+            image_checksums.record(image_file_or_url, image_stream.validator, image_stream.checksum)
+            log.info('Upload process of image {} finished'.format(image_name))
             exception_occurred = False
         except requests.exceptions.SSLError:
             log.error('Exception while uploading image to VIM {} ({}). The NFVO seems to use HTTPS. '
@@ -222,23 +422,50 @@ class OpenstackVimDriver(VimDriver):
                 except:
                     log.error('Exception while removing image')
 
-        try:
-            image_created = glance_client.images.get(image_created.id)
-        except:
-            pass
         try:
             image_status = ImageStatus(image_created.status.upper() if
                                        image_created.status is not None and type(image_created.status) == str else None)
         except ValueError:
             log.warning('Image status ' + image_created.status + ' of the created image seems to be invalid')
             image_status = ImageStatus('UNRECOGNIZED')
-        return NFVImage(ext_id=image_created.id, name=image_created.name, min_ram=image_created.min_ram,
-                        min_disk_space=image_created.min_disk,
-                        is_public=(True if image_created.visibility == 'public' else False),
-                        disk_format=image_created.disk_format,
-                        container_format=image_created.container_format, created=image_created.created_at,
-                        updated=image_created.updated_at, status=image_status)
+        nfv_image = NFVImage(ext_id=image_created.id, name=image_created.name, min_ram=image_created.min_ram,
+                             min_disk_space=image_created.min_disk,
+                             is_public=(True if image_created.visibility == 'public' else False),
+                             disk_format=image_created.disk_format,
+                             container_format=image_created.container_format, created=image_created.created_at,
+                             updated=image_created.updated_at, status=image_status)
+        catalog_cache.add(vim_instance, 'images', nfv_image)
+        return nfv_image
+
+    def add_image_to_vims(self, vim_instances: [dict], image: dict, image_file_or_url, image_repo_token=None):
+        """
+        Add an image to several VIM instances in parallel. If the staging of image files is enabled,
+        the image file is downloaded only once and the uploads read it while it is downloaded.
 
+        :param vim_instances:
+        :param image: a dictionary containing the keys: name, containerFormat, isPublic, diskFormat, minDiskSpace and minRam
+        :param image_file_or_url: the URL pointing to the image file
+        :param image_repo_token:
+        :return: a list with one dictionary per VIM instance (in the same order) containing the vimInstanceId and either
+        the created image under the key 'image' or the error under the key 'exception'
+        """
+        outcomes = map_concurrently(lambda vim_instance: self.add_image(vim_instance, image, image_file_or_url,
+                                                                        image_repo_token),
+                                    vim_instances, max_workers=self.parallel_requests)
+        results = []
+        for vim_instance, (nfv_image, exception) in zip(vim_instances, outcomes):
+            result = {'vimInstanceId': vim_instance.get('id')}
+            if exception is None:
+                result['image'] = nfv_image.get_dict()
+            else:
+                log.error('Unable to add image {} to VIM {}: {}'.format(image.get('name'), vim_instance.get('name'),
+                                                                       exception))
+                result['exception'] = {'detailMessage': str(exception)}
+            results.append(result)
+        return results
+
+    @instrumented
+    @profiled
     def add_flavor(self, vim_instance: dict, deployment_flavour: dict, nova_client=None):
         """
         Add a flavor to OpenStack.
@@ -268,7 +495,9 @@ class OpenstackVimDriver(VimDriver):
         except Exception as e:
             log.error('Unable to create flavor {}: {}'.format(name, e))
             raise
-        return DeploymentFlavour(flavour_key=flav.name, ext_id=flav.id, ram=flav.ram, disk=flav.disk, vcpu=flav.vcpus)
+        flavour = DeploymentFlavour(flavour_key=flav.name, ext_id=flav.id, ram=flav.ram, disk=flav.disk, vcpu=flav.vcpus)
+        catalog_cache.add(vim_instance, 'flavors', flavour)
+        return flavour
 
     def __get_subnet(self, subnet_id, neutron_client=None, vim_instance=None):
         if neutron_client is None:
@@ -281,18 +510,23 @@ class OpenstackVimDriver(VimDriver):
                       network_id=subnet.get('network_id'), cidr=subnet.get('cidr'), gateway_ip=subnet.get('gateway_ip'),
                       dns=subnet.get('dns_nameservers'))
 
-    def __list_subnets(self, neutron_client=None, vim_instance=None):
+    def __list_subnets(self, vim_instance: dict, neutron_client=None):
         if neutron_client is None:
             neutron_client = self.get_neutron_client(vim_instance)
-        return [Subnet(name=subnet.get('name'), ext_id=subnet.get('id'),
-                       network_id=subnet.get('network_id'), cidr=subnet.get('cidr'),
-                       gateway_ip=subnet.get('gateway_ip'), dns=subnet.get('dns_nameservers'))
-                for subnet in neutron_client.list_subnets().get('subnets')]
+        subnets = single_flight.do(get_request_key(vim_instance, 'list_subnets'),
+                                   lambda: neutron_client.list_subnets().get('subnets'))
+        return [self.__to_subnet(subnet) for subnet in subnets]
+
+    def __to_subnet(self, subnet: dict):
+        return Subnet(name=subnet.get('name'), ext_id=subnet.get('id'), network_id=subnet.get('network_id'),
+                      cidr=subnet.get('cidr'), gateway_ip=subnet.get('gateway_ip'), dns=subnet.get('dns_nameservers'))
 
+    @traced
     def __list_network_dicts(self, vim_instance: dict, neutron_client=None):
         if neutron_client is None:
             neutron_client = self.get_neutron_client(vim_instance)
-        return neutron_client.list_networks().get('networks')
+        return single_flight.do(get_request_key(vim_instance, 'list_networks'),
+                                lambda: neutron_client.list_networks().get('networks'))
 
     def __list_routers(self, vim_instance, neutron_client=None):
         """
@@ -304,68 +538,150 @@ class OpenstackVimDriver(VimDriver):
         """
         if neutron_client is None:
             neutron_client = self.get_neutron_client(vim_instance)
-        routers = neutron_client.list_routers().get('routers')
+        routers = single_flight.do(get_request_key(vim_instance, 'list_routers'),
+                                   lambda: neutron_client.list_routers().get('routers'))
         return routers
 
-    def __list_ports(self, vim_instance, neutron_client=None):
-        if neutron_client is None:
-            neutron_client = self.get_neutron_client(vim_instance)
-        ports = neutron_client.list_ports().get('ports')
-        return ports
+    def __get_router_topology(self, vim_instance, neutron_client=None):
+        """
+        Returns the cached RouterTopology of the VIM instance, built from the routers and the router interface ports.
 
-    def list_networks(self, vim_instance: dict, neutron_client=None):
+        :param vim_instance:
+        :param neutron_client:
+        :return:
+        """
         if neutron_client is None:
             neutron_client = self.get_neutron_client(vim_instance)
-        subnets = self.__list_subnets(neutron_client)
+
+        def load_router_topology():
+            listings = run_concurrently({
+                'routers': lambda: neutron_client.list_routers(fields=['id', 'external_gateway_info']).get('routers'),
+                'ports': lambda: neutron_client.list_ports(device_owner=ROUTER_INTERFACE_DEVICE_OWNERS,
+                                                           fields=['device_id', 'network_id']).get('ports')
+            }, max_workers=self.parallel_requests, timeout=self.parallel_request_timeout)
+            return RouterTopology(listings.get('routers'), listings.get('ports'))
+
+        return catalog_cache.get(vim_instance, 'router_topology',
+                                 lambda: single_flight.do(get_request_key(vim_instance, 'router_topology'),
+                                                          load_router_topology))
+
+    def __to_networks(self, network_dicts: [dict], subnets: [Subnet]):
+        subnets_by_id = {sn.extId: sn for sn in subnets}
         return [Network(name=n.get('name'),
                         ext_id=n.get('id'),
                         external=n.get('router:external'),
-                        subnets=list(filter(lambda sn: sn.extId in n.get('subnets'), subnets))) for n in
-                neutron_client.list_networks().get('networks')]
+                        subnets=[subnets_by_id[sn_id] for sn_id in n.get('subnets') if sn_id in subnets_by_id]) for n
+                in network_dicts]
+
+    @instrumented
+    @profiled
+    def list_networks(self, vim_instance: dict, neutron_client=None):
+        if neutron_client is None:
+            neutron_client = self.get_neutron_client(vim_instance)
+        subnets = self.__list_subnets(vim_instance, neutron_client)
+        return self.__to_networks(self.__list_network_dicts(vim_instance, neutron_client), subnets)
 
+    @instrumented
+    @profiled
     def list_flavors(self, vim_instance: dict, nova_client=None):
         if nova_client is None:
             nova_client = self.get_nova_client(vim_instance)
-        flavors = nova_client.flavors.list()
+        flavors = single_flight.do(get_request_key(vim_instance, 'list_flavors'), lambda: nova_client.flavors.list())
         return [DeploymentFlavour(flavour_key=f.name, ext_id=f.id, ram=f.ram,
                                   disk=f.disk, vcpu=f.vcpus) for f in flavors]
 
+    @instrumented
+    @profiled
     def list_availability_zones(self, vim_instance: dict, nova_client=None):
         if nova_client is None:
             nova_client = self.get_nova_client(vim_instance)
-        zones = nova_client.availability_zones.list()
+        zones = single_flight.do(get_request_key(vim_instance, 'list_availability_zones'),
+                                 lambda: nova_client.availability_zones.list())
         # TODO hosts seems not to be used and therefore the empty dict is passed for now.
         # It is populated in the openstack4j version of the vim driver but there it seems to be done incorrectly.
         return [AvailabilityZone(name=z.zoneName, available=z.zoneState.get('available'), hosts={}) for z in zones]
 
+    @instrumented
+    @profiled
     def list_keys(self, vim_instance: dict, nova_client=None):
         if nova_client is None:
             nova_client = self.get_nova_client(vim_instance)
-        keys = nova_client.keypairs.list()
+        keys = single_flight.do(get_request_key(vim_instance, 'list_keys'), lambda: nova_client.keypairs.list())
         return [PopKeypair(name=k.name, public_key=k.public_key, fingerprint=k.fingerprint) for k in keys]
 
+    @instrumented
+    @profiled
     def refresh(self, vim_instance):
-        # TODO parallel execution?
         nova_client = self.get_nova_client(vim_instance)
-        images = self.list_images(vim_instance)
-        networks = self.list_networks(vim_instance)
-        flavors = self.list_flavors(vim_instance, nova_client)
-        zones = self.list_availability_zones(vim_instance, nova_client)
-        keys = self.list_keys(vim_instance, nova_client)
-        vim_instance['images'] = [i.get_dict() for i in images]
+        neutron_client = self.get_neutron_client(vim_instance)
+        glance_client = self.get_glance_client(vim_instance)
+        calls = {
+            'list_images': lambda: self.list_images(vim_instance, glance_client),
+            'list_network_dicts': lambda: self.__list_network_dicts(vim_instance, neutron_client),
+            'list_subnets': lambda: self.__list_subnets(vim_instance, neutron_client),
+            'list_flavors': lambda: self.list_flavors(vim_instance, nova_client),
+            'list_availability_zones': lambda: self.list_availability_zones(vim_instance, nova_client),
+            'list_keys': lambda: self.list_keys(vim_instance, nova_client)
+        }
+        if self.refresh_mode == 'delta':
+            # only fetch the images, networks and subnets changed since the last refresh
+            calls['list_images'] = lambda: [self.__os_image_to_nfv_image(i) for i in refresh_snapshots.refresh(
+                vim_instance, 'images',
+                lambda since: glance_client.images.list() if since is None else glance_client.images.list(
+                    filters={'updated_at': 'gte:{}'.format(since)}))]
+            calls['list_network_dicts'] = lambda: refresh_snapshots.refresh(
+                vim_instance, 'networks',
+                lambda since: neutron_client.list_networks().get('networks') if since is None else
+                neutron_client.list_networks(changed_since=since).get('networks'))
+            calls['list_subnets'] = lambda: [self.__to_subnet(sn) for sn in refresh_snapshots.refresh(
+                vim_instance, 'subnets',
+                lambda since: neutron_client.list_subnets().get('subnets') if since is None else
+                neutron_client.list_subnets(changed_since=since).get('subnets'))]
+        results = run_concurrently(calls, max_workers=self.parallel_requests, timeout=self.parallel_request_timeout)
+        catalog_cache.put(vim_instance, 'images', results.get('list_images'))
+        catalog_cache.put(vim_instance, 'networks', results.get('list_network_dicts'))
+        catalog_cache.put(vim_instance, 'flavors', results.get('list_flavors'))
+        catalog_cache.put(vim_instance, 'zones', results.get('list_availability_zones'))
+        catalog_cache.put(vim_instance, 'keys', results.get('list_keys'))
+        networks = self.__to_networks(results.get('list_network_dicts'), results.get('list_subnets'))
+        vim_instance['images'] = [i.get_dict() for i in results.get('list_images')]
         vim_instance['networks'] = [n.get_dict() for n in networks]
-        vim_instance['flavours'] = [f.get_dict() for f in flavors]
-        vim_instance['zones'] = [z.get_dict() for z in zones]
-        vim_instance['keys'] = [k.get_dict() for k in keys]
+        vim_instance['flavours'] = [f.get_dict() for f in results.get('list_flavors')]
+        vim_instance['zones'] = [z.get_dict() for z in results.get('list_availability_zones')]
+        vim_instance['keys'] = [k.get_dict() for k in results.get('list_keys')]
         return vim_instance
 
+    def __find_in_catalog(self, vim_instance: dict, collection: str, loader, predicate):
+        """
+        Returns the first item of the cached collection for which predicate returns True.
+        If no item matches, the collection is fetched again from OpenStack once before None is returned,
+        so that resources created after the collection was cached are found as well.
+
+        :param vim_instance:
+        :param collection: the name of the collection in the catalog cache
+        :param loader: function without arguments which fetches the collection from OpenStack
+        :param predicate:
+        :return:
+        """
+        for item in catalog_cache.get(vim_instance, collection, loader):
+            if predicate(item):
+                return item
+        catalog_cache.invalidate(vim_instance, collection)
+        for item in catalog_cache.get(vim_instance, collection, loader):
+            if predicate(item):
+                return item
+        return None
+
+    @instrumented
+    @profiled
     def list_security_groups(self, vim_instance: dict, neutron_client=None):
         if neutron_client is None:
             neutron_client = self.get_neutron_client(vim_instance)
-        security_groups = neutron_client.list_security_groups().get('security_groups')
+        security_groups = single_flight.do(get_request_key(vim_instance, 'list_security_groups'),
+                                           lambda: neutron_client.list_security_groups().get('security_groups'))
         return security_groups
 
-    def __os_server_to_ob_server(self, os_server, images, flavors):
+    def __os_server_to_ob_server(self, os_server, image, flavor):
         status, extendedStatus = None, None
         if os_server.status is not None:
             if os_server.status == 'ERROR':
@@ -387,18 +703,6 @@ class OpenstackVimDriver(VimDriver):
                     ips[address] = addrs
                 if floating_addrs is not None:
                     floating_ips[address] = floating_addrs
-        image = None
-        if os_server.image is not None:
-            for i in images:
-                if i.extId == os_server.image.get('id'):
-                    image = i
-                    break
-        flavor = None
-        if os_server.flavor is not None:
-            for f in flavors:
-                if f.extId == os_server.flavor.get('id'):
-                    flavor = f
-                    break
         server = Server(name=os_server.name, ext_id=os_server.id, created=os_server.created, updated=os_server.updated,
                         hostname=os_server.name, instance_name=os_server._info.get('OS-EXT-SRV-ATTR:instance_name'),
                         status=status, extended_status=extendedStatus, ips=ips, floating_ips=floating_ips,
@@ -406,35 +710,110 @@ class OpenstackVimDriver(VimDriver):
                         image=image, flavor=flavor)
         return server
 
-    def list_server(self, vim_instance: dict):
-        nova_client = self.get_nova_client(vim_instance)
-        images = self.list_images(vim_instance)
-        flavors = self.list_flavors(vim_instance, nova_client=nova_client)
-        ob_servers = []
-        os_servers = nova_client.servers.list()
+    def __os_servers_to_ob_servers(self, vim_instance: dict, os_servers, nova_client=None):
+        """
+        Converts OpenStack servers to Server objects. Images and flavors are looked up in the extId indexes of the
+        catalog cache, one which is missing from them (e.g. created or deleted since the listing) is fetched on its
+        own and remembered by the cache, so that it does not cause a reload of the whole collection.
+
+        :param vim_instance:
+        :param os_servers: an iterable of OpenStack servers
+        :param nova_client:
+        :return: a generator of Server objects
+        """
+        if nova_client is None:
+            nova_client = self.get_nova_client(vim_instance)
+        list_images = lambda: self.list_images(vim_instance)
+        list_flavors = lambda: self.list_flavors(vim_instance, nova_client)
+        get_image = lambda image_id: self.__get_image_or_none(vim_instance, image_id)
+        get_flavor = lambda flavor_id: self.__get_flavor_or_none(nova_client, flavor_id)
+        images_by_id = catalog_cache.get_index(vim_instance, 'images', list_images)
+        flavors_by_id = catalog_cache.get_index(vim_instance, 'flavors', list_flavors)
         for os_server in os_servers:
-            if os_server.tenant_id == vim_instance.get('tenant'):
-                ob_server = self.__os_server_to_ob_server(os_server, images, flavors)
-                ob_servers.append(ob_server)
-        return ob_servers
+            image, flavor = None, None
+            if os_server.image:
+                image_id = os_server.image.get('id')
+                image = images_by_id.get(image_id) or catalog_cache.lookup(vim_instance, 'images', image_id,
+                                                                           list_images, get_image)
+            if os_server.flavor:
+                flavor_id = os_server.flavor.get('id')
+                flavor = flavors_by_id.get(flavor_id) or catalog_cache.lookup(vim_instance, 'flavors', flavor_id,
+                                                                              list_flavors, get_flavor)
+            yield self.__os_server_to_ob_server(os_server, image, flavor)
+
+    def __get_image_or_none(self, vim_instance: dict, image_id):
+        try:
+            return self.__os_image_to_nfv_image(self.get_glance_client(vim_instance).images.get(image_id))
+        except GlanceNotFoundException:
+            return None
+
+    @staticmethod
+    def __get_flavor_or_none(nova_client, flavor_id):
+        try:
+            f = nova_client.flavors.get(flavor_id)
+        except ServerNotFoundException:
+            return None
+        return DeploymentFlavour(flavour_key=f.name, ext_id=f.id, ram=f.ram, disk=f.disk, vcpu=f.vcpus)
+
+    def __iter_os_servers(self, vim_instance: dict, nova_client, search_opts: dict = None):
+        """
+        Returns a generator of the OpenStack servers in the VIM instance's tenant.
+        The tenant filter is applied by Nova and the servers are fetched page by page
+        using the marker of the previous page, so only one page is held in memory at a time.
+
+        :param vim_instance:
+        :param nova_client:
+        :param search_opts: additional filters which are passed to Nova
+        :return:
+        """
+        tenant = vim_instance.get('tenant')
+        search_opts = dict(search_opts or {}, project_id=tenant)
+        marker = None
+        while True:
+            page = nova_client.servers.list(search_opts=search_opts, marker=marker, limit=self.server_page_size)
+            if len(page) == 0:
+                break
+            for os_server in page:
+                # Nova ignores the project_id filter for non-admin users, but then it lists the token's project anyway
+                if os_server.tenant_id == tenant:
+                    yield os_server
+            marker = page[-1].id
 
-    def __create_port(self, port_name, network_id, security_groups, subnet_ids, neutron_client, fixed_ip=None):
+    def iter_servers(self, vim_instance: dict, nova_client=None):
+        """
+        Returns a generator of the servers in the VIM instance's tenant as Server objects.
+        The servers are fetched from Nova and converted page by page.
+
+        :param vim_instance:
+        :param nova_client:
+        :return:
+        """
+        if nova_client is None:
+            nova_client = self.get_nova_client(vim_instance)
+        return self.__os_servers_to_ob_servers(vim_instance, self.__iter_os_servers(vim_instance, nova_client),
+                                               nova_client)
+
+    @instrumented
+    @profiled
+    def list_server(self, vim_instance: dict):
+        return list(self.iter_servers(vim_instance))
+
+    @traced
+    def __create_port(self, port_name, network_id, security_groups, neutron_client, fixed_ip=None):
         create_port_body = {'port': {'network_id': network_id,
                                      'name': port_name}}
-        # find a subnet that fits the fixed IP address if provided
-        fitting_subnet_id = None
+        # find a subnet that fits the fixed IP address if provided, the subnets listed by Neutron are authoritative
+        # since the cached network might not know subnets created recently
         if fixed_ip not in (None, ''):
-            subnets = self.__list_subnets(neutron_client=neutron_client)
-            for subnet_id in subnet_ids:
-                for subnet in subnets:
-                    if ipaddress.ip_address(fixed_ip) in list(
-                            ipaddress.ip_network(subnet.cidr).hosts()):
-                        fitting_subnet_id = subnet_id
-                        break
-                else:
-                    raise Exception(
-                        'The fixed IP {} is not in the range of any of the subnets associated with the network {}'.format(
-                            fixed_ip, network_id))
+            subnet_index = SubnetIndex(neutron_client.list_subnets(network_id=network_id).get('subnets'))
+            try:
+                fitting_subnet_id = subnet_index.find_subnet_id(fixed_ip)
+            except ValueError:
+                raise Exception('The fixed IP {} is not a valid IP address'.format(fixed_ip))
+            if fitting_subnet_id is None:
+                raise Exception(
+                    'The fixed IP {} is not in the range of any of the subnets associated with the network {}'.format(
+                        fixed_ip, network_id))
             create_port_body.get('port')['fixed_ips'] = [{'ip_address': fixed_ip, 'subnet_id': fitting_subnet_id}]
 
         if len(security_groups) > 0:
@@ -442,25 +821,45 @@ class OpenstackVimDriver(VimDriver):
 
         return neutron_client.create_port(create_port_body)
 
-    def __associate_floating_ip_to_port(self, port, floating_network_id, neutron_client, floating_ip_address):
+    @traced
+    def __associate_floating_ip_to_port(self, vim_instance, port, floating_network_id, neutron_client,
+                                        floating_ip_address, fips=None):
         """
         Associate a floating IP address to the given port. If the floating_ip_address parameter
-        is equal to 'random' or the empty string the first available floating IP will be associated or
-        a new one created with a random address.
+        is equal to 'random' or the empty string a floating IP from the pool of the external network, the first
+        available floating IP will be associated or a new one created with a random address.
 
+        :param vim_instance:
         :param port:
         :param floating_network_id:
         :param neutron_client:
         :param floating_ip_address:
-        :return:
+        :param fips: the floating IPs of the project, they are fetched from OpenStack if not passed
+        :return: a tuple of the associated floating IP and whether it was created by this call
         """
-        fips = neutron_client.list_floatingips().get('floatingips')
+        if floating_ip_address in ('random', ''):
+            pool = floating_ip_pools.get_pool(vim_instance, floating_network_id,
+                                              lambda: self.get_neutron_client(vim_instance))
+            # the floating IP is claimed by take, since it might still be listed as free by other threads
+            fip = pool.take(floating_ip_claims) if pool is not None else None
+            if fip is not None:
+                try:
+                    neutron_client.update_floatingip(fip.get('id'), {'floatingip': {'port_id': port.get('port').get(
+                        'id')}})
+                    return fip, False
+                except Exception as e:
+                    floating_ip_claims.release(fip.get('id'))
+                    log.warning('Not able to associate floating IP {} from the pool to port {}: {}'.format(
+                        fip.get('floating_ip_address'), port.get('port').get('id'), e))
+        if fips is None:
+            fips = neutron_client.list_floatingips().get('floatingips')
         # check if the floating IP exists already
         for fip in fips:
             if (fip.get('floating_ip_address') == floating_ip_address or floating_ip_address in (
                     'random', '')) and fip.get(
                 'floating_network_id') == floating_network_id:
-                if fip.get('status').lower() == 'active':
+                # floating IPs associated to ports of VMs which are not yet running are not active but in use as well
+                if fip.get('status').lower() == 'active' or fip.get('port_id') is not None:
                     if fip.get('port_id') == port.get('port').get('id'):
                         log.debug('Floating IP {} is already associated to port {}'.format(floating_ip_address,
                                                                                            port.get('port').get(
@@ -470,6 +869,11 @@ class OpenstackVimDriver(VimDriver):
                             raise Exception('Floating IP {} is already in use'.format(floating_ip_address))
                         continue
                 else:
+                    # make sure that no other thread associates the same floating IP at the same time
+                    if floating_ip_pools.is_reserved(fip.get('id')) or not floating_ip_claims.claim(fip.get('id')):
+                        if floating_ip_address not in ('random', ''):
+                            raise Exception('Floating IP {} is already in use'.format(floating_ip_address))
+                        continue
                     # associate the already existing floating IP to the port
                     body = {'floatingip':
                                 {'port_id': port.get('port').get('id')}
@@ -477,6 +881,7 @@ class OpenstackVimDriver(VimDriver):
                     try:
                         neutron_client.update_floatingip(fip.get('id'), body)
                     except Exception as e:
+                        floating_ip_claims.release(fip.get('id'))
                         if floating_ip_address not in ('random', ''):
                             raise Exception(
                                 'Unable to associate floating IP {} to port {}: {}'.format(floating_ip_address,
@@ -486,7 +891,7 @@ class OpenstackVimDriver(VimDriver):
                             'Not able to associate floating IP {} to port {}: {}'.format(fip.get('floating_ip_address'),
                                                                                          port.get('port').get('id'), e))
                         continue
-                break
+                return fip, False
         else:
             # create a new floating IP address
             body = {'port_id': port.get('port').get('id'),
@@ -494,10 +899,81 @@ class OpenstackVimDriver(VimDriver):
             if floating_ip_address not in ('random', ''):
                 body['floating_ip_address'] = floating_ip_address
             try:
-                neutron_client.create_floatingip({'floatingip': body})
+                return neutron_client.create_floatingip({'floatingip': body}).get('floatingip'), True
             except Exception as e:
                 raise Exception('Unable to create floating IP address {}: {}'.format(floating_ip_address, e))
 
+    def __resolve_launch_catalog(self, vim_instance: dict, image_name: str, flavor: str, keypair: str,
+                                 security_groups: [str], nova_client, neutron_client):
+        """
+        Looks up the image, flavor, availability zone, key pair and security groups needed for launching a VM.
+        The result can be shared between several VMs launched with the same parameters.
+
+        :param vim_instance:
+        :param image_name: the name or ID of the image
+        :param flavor: the name or ID of the flavor
+        :param keypair: the name of the key pair
+        :param security_groups: the names of the security groups
+        :param nova_client:
+        :param neutron_client:
+        :return: a dictionary containing the keys image, flavor_id, zone_name and security_groups
+        """
+        s_groups = [g.get('name') for g in catalog_cache.get(vim_instance, 'security_groups',
+                                                              lambda: self.list_security_groups(vim_instance,
+                                                                                                neutron_client))]
+        if any(g not in s_groups for g in security_groups):
+            # the security groups might have been created after they were cached
+            catalog_cache.invalidate(vim_instance, 'security_groups')
+            s_groups = [g.get('name') for g in catalog_cache.get(vim_instance, 'security_groups',
+                                                                  lambda: self.list_security_groups(vim_instance,
+                                                                                                    neutron_client))]
+        security_groups = [g for g in security_groups if g in s_groups]
+
+        # find correct image
+        list_images = lambda: self.list_images(vim_instance)
+        image = self.__find_in_catalog(vim_instance, 'images', list_images,
+                                       lambda i: i.name == image_name or i.extId == image_name)
+        if image is not None and image.status != ImageStatus.ACTIVE:
+            # the cached status might be outdated
+            catalog_cache.invalidate(vim_instance, 'images')
+            image = self.__find_in_catalog(vim_instance, 'images', list_images,
+                                           lambda i: i.extId == image.extId)
+        if image is None:
+            raise Exception('Not found image {} in VIM instance {}'.format(image_name, vim_instance.get('name')))
+        # check image status
+        if image.status is None or image.status != ImageStatus.ACTIVE:
+            raise Exception(
+                'Image {} ({}) is not yet in active state. Try again later...'.format(image.name, image.extId))
+        # find correct flavor ID
+        used_flavor = self.__find_in_catalog(vim_instance, 'flavors',
+                                             lambda: self.list_flavors(vim_instance, nova_client),
+                                             lambda f: f.flavour_key == flavor or f.extId == flavor)
+        if used_flavor is None:
+            raise Exception('Not found flavor {} in VIM instance {}'.format(flavor, vim_instance.get('name')))
+        flavor_id = used_flavor.extId
+        # find correct availability zone
+        zone_name = None
+        try:
+            zone_name = vim_instance.get('metadata').get('az')
+        except AttributeError:
+            pass
+        if zone_name is not None:
+            zone = self.__find_in_catalog(vim_instance, 'zones',
+                                          lambda: self.list_availability_zones(vim_instance, nova_client),
+                                          lambda z: z.name == zone_name)
+            if zone is None:
+                zone_name = None
+        # check key pair
+        if keypair is not None and keypair != '':
+            key = self.__find_in_catalog(vim_instance, 'keys', lambda: self.list_keys(vim_instance, nova_client),
+                                         lambda k: k.name == keypair)
+            if key is None:
+                raise Exception('Keypair {} not found in VIM instance {}'.format(keypair, vim_instance.get('name')))
+
+
+        return {'image': image, 'flavor_id': flavor_id, 'zone_name': zone_name, 'security_groups': security_groups}
+
+    @traced
     def __create_server(self,
                         vim_instance: dict,
                         name: str,
@@ -508,7 +984,8 @@ class OpenstackVimDriver(VimDriver):
                         security_groups: [str],
                         user_data: str,
                         nova_client=None,
-                        neutron_client=None):
+                        neutron_client=None,
+                        launch_catalog: dict = None):
         if nova_client is None:
             nova_client = self.get_nova_client(vim_instance)
         if neutron_client is None:
@@ -516,117 +993,116 @@ class OpenstackVimDriver(VimDriver):
         # [{'virtual_link_reference': 'private', 'floatingIp': 'random', 'interfaceId': 0, 'id': 'ba201de1-d525-4a4b-8e70-c42e7ab7ece8', 'hbVersion': 2, 'shared': False}]
 
         vnfd_connection_points = sorted(vnfd_connection_points, key=lambda net: net.get('interfaceId'))
-        networks = self.__list_network_dicts(vim_instance,
-                                             neutron_client=neutron_client)  # TODO maybe use networks from vim instead
-        s_groups = [g.get('name') for g in self.list_security_groups(vim_instance)]
-        security_groups = [g for g in security_groups if g in s_groups]
-        images = self.list_images(vim_instance)
-        nics = []
+        if launch_catalog is None:
+            launch_catalog = self.__resolve_launch_catalog(vim_instance, image_name, flavor, keypair, security_groups,
+                                                           nova_client, neutron_client)
+        security_groups = launch_catalog.get('security_groups')
+
+        list_network_dicts = lambda: self.__list_network_dicts(vim_instance, neutron_client=neutron_client)
+        # find the OpenStack networks
+        networks = []
+        for vnfdcp in vnfd_connection_points:
+            network_id = vnfdcp.get('virtual_link_reference_id')
+            if network_id in (None, ''):
+                network_name = vnfdcp.get('virtual_link_reference')
+                network = self.__find_in_catalog(
+                    vim_instance, 'networks', list_network_dicts,
+                    lambda net: net.get('name') == network_name and (
+                        net.get('tenant_id') == vim_instance.get('tenant') or net.get('shared')))
+                if network is None:
+                    raise Exception('Unable to find network with name {} in tenant with ID {}'.format(
+                        network_name, vim_instance.get('tenant')))
+            else:
+                network = self.__find_in_catalog(vim_instance, 'networks', list_network_dicts,
+                                                 lambda net: net.get('id') == network_id)
+                if network is None:
+                    raise Exception('Unable to find network with ID {} in tenant with ID {}'.format(network_id,
+                                                                                                    vim_instance.get(
+                                                                                                        'tenant')))
+            networks.append(network)
+
+        # fetch the router topology and floating IPs needed for associating floating IPs once for all the ports
+        floating_ip_cps = [cp for cp in vnfd_connection_points if cp.get('floatingIp') is not None]
+        neutron_listings = {}
+        if len(floating_ip_cps) > 0:
+            # with floating IP pools random floating IPs are usually taken from the pools without listing them
+            if floating_ip_pools.high_watermark <= 0 or any(
+                    cp.get('floatingIp') not in ('random', '') for cp in floating_ip_cps):
+                neutron_listings['floatingips'] = lambda: neutron_client.list_floatingips().get('floatingips')
+            if any(cp.get('chosenPool') in (None, '') for cp in floating_ip_cps):
+                neutron_listings['router_topology'] = lambda: self.__get_router_topology(vim_instance, neutron_client)
+            neutron_listings = run_concurrently(neutron_listings, max_workers=self.parallel_requests,
+                                                timeout=self.parallel_request_timeout)
+
         ports = []
-        try:
-            for vnfdcp in vnfd_connection_points:
-                # find the OpenStack network
-                network_id = vnfdcp.get('virtual_link_reference_id')
-                if network_id in (None, ''):
-                    for available_net in networks:
-                        if vnfdcp.get('virtual_link_reference') == available_net.get('name') and (
-                                        available_net.get('tenant_id') == vim_instance.get(
-                                        'tenant') or available_net.get('shared')):
-                            network = available_net
-                            network_id = network.get('id')
-                            break
-                    else:
-                        raise Exception('Unable to find network with name {} in tenant with ID {}'.format(
-                            vnfdcp.get('virtual_link_reference'),
-                            vim_instance.get(
-                                'tenant')))
-                else:
-                    try:
-                        network = next(net for net in networks if net.get('id') == network_id)
-                    except StopIteration:
-                        raise Exception('Unable to find network with ID {} in tenant with ID {}'.format(network_id,
-                                                                                                        vim_instance.get(
-                                                                                                            'tenant')))
-
-                # create a port
-                fixed_ip = vnfdcp.get('fixedIp')
-                port = self.__create_port('VNFD-{}'.format(vnfdcp.get('id')), network_id, security_groups,
-                                          network.get('subnets'), neutron_client, fixed_ip=fixed_ip)
+        floating_ips = []
+        ports_lock = threading.Lock()
+
+        def provision_connection_point(vnfdcp_and_network):
+            vnfdcp, network = vnfdcp_and_network
+            network_id = network.get('id')
+            # create a port
+            fixed_ip = vnfdcp.get('fixedIp')
+            port = self.__create_port('VNFD-{}'.format(vnfdcp.get('id')), network_id, security_groups, neutron_client,
+                                      fixed_ip=fixed_ip)
+            with ports_lock:
                 ports.append(port)
 
-                # associate a floating IP address to the port if needed
-                if vnfdcp.get('floatingIp') is not None:
-                    if vnfdcp.get('chosenPool') not in (None, ''):
-                        pool_name = vnfdcp.get('chosenPool')
-                        for net in vim_instance.get('networks'):
-                            if net.get('name') == pool_name:
-                                ext_net_id = net.get('extId')
-                        else:
-                            raise Exception(
-                                'Unable to find the network {} that shall be used as a floating IP pool (specified in the connection point\'s chosenPool field)')
+            # associate a floating IP address to the port if needed
+            if vnfdcp.get('floatingIp') is not None:
+                if vnfdcp.get('chosenPool') not in (None, ''):
+                    pool_name = vnfdcp.get('chosenPool')
+                    for net in vim_instance.get('networks'):
+                        if net.get('name') == pool_name:
+                            ext_net_id = net.get('extId')
+                            break
                     else:
-                        # find the external network
-                        ext_net_id = self.__find_connected_external_network(network_id, vim_instance.get('networks'),
-                                                                            self.__list_routers(vim_instance,
-                                                                                                neutron_client),
-                                                                            self.__list_ports(vim_instance,
-                                                                                              neutron_client))
-                    self.__associate_floating_ip_to_port(port, ext_net_id, neutron_client, vnfdcp.get('floatingIp'))
-
-                nic = {'net-id': network.get('id'), 'port-id': port.get('port').get('id')}
-                if fixed_ip not in (None, ''):
-                    nic['v4-fixed-ip'] = fixed_ip
-                nics.append(nic)
-
-            # find correct image
-            for i in images:
-                if i.name == image_name or i.extId == image_name:
-                    image = i
-                    break
-            else:
-                raise Exception('Not found image {} in VIM instance {}'.format(image_name, vim_instance.get('name')))
-            # check image status
-            if image.status is None or image.status != ImageStatus.ACTIVE:
-                raise Exception(
-                    'Image {} ({}) is not yet in active state. Try again later...'.format(image.name, image.extId))
-            # find correct flavor ID
-            flavors = self.list_flavors(vim_instance, nova_client)
-            for f in flavors:
-                if f.flavour_key == flavor or f.extId == flavor:
-                    flavor_id = f.extId
-                    used_flavor = f
-                    break
-            else:
-                raise Exception('Not found flavor {} in VIM instance {}'.format(flavor, vim_instance.get('name')))
-            # find correct availability zone
-            zone_name = None
-            try:
-                zone_name = vim_instance.get('metadata').get('az')
-            except AttributeError:
-                pass
-            if zone_name is not None:
-                zones = self.list_availability_zones(vim_instance, nova_client)
-                for z in zones:
-                    if z.name == zone_name:
-                        zone = z
-                        break
-                else:
-                    zone_name = None
-            # check key pair
-            if keypair is not None and keypair != '':
-                keys = self.list_keys(vim_instance, nova_client)
-                for key in keys:
-                    if key.name == keypair:
-                        break
+                        raise Exception(
+                            'Unable to find the network {} that shall be used as a floating IP pool (specified in the connection point\'s chosenPool field)'.format(
+                                pool_name))
                 else:
-                    raise Exception('Keypair {} not found in VIM instance {}'.format(keypair, vim_instance.get('name')))
+                    # find the external network
+                    ext_net_id = self.__find_connected_external_network(vim_instance, network_id,
+                                                                        neutron_listings.get('router_topology'),
+                                                                        neutron_client)
+                floating_ip = self.__associate_floating_ip_to_port(vim_instance, port, ext_net_id, neutron_client,
+                                                                   vnfdcp.get('floatingIp'),
+                                                                   fips=neutron_listings.get('floatingips'))
+                with ports_lock:
+                    floating_ips.append(floating_ip)
+
+            nic = {'net-id': network_id, 'port-id': port.get('port').get('id')}
+            if fixed_ip not in (None, ''):
+                nic['v{}-fixed-ip'.format(ipaddress.ip_address(fixed_ip).version)] = fixed_ip
+            return nic
+
+        try:
+            # provision the connection points in parallel
+            outcomes = map_concurrently(provision_connection_point, list(zip(vnfd_connection_points, networks)),
+                                        max_workers=self.parallel_requests)
+            for nic, exception in outcomes:
+                if exception is not None:
+                    raise exception
+            nics = [nic for nic, exception in outcomes]
+
             # create server
-            server = nova_client.servers.create(name=name, image=image.extId, flavor=flavor_id, key_name=keypair,
-                                                availability_zone=zone_name, security_groups=security_groups,
-                                                nics=nics, userdata=user_data)
+            server = nova_client.servers.create(name=name, image=launch_catalog.get('image').extId,
+                                                flavor=launch_catalog.get('flavor_id'), key_name=keypair,
+                                                availability_zone=launch_catalog.get('zone_name'),
+                                                security_groups=security_groups, nics=nics, userdata=user_data)
             return server
 
         except:
+            # floating IPs allocated for this VM are released, existing ones are disassociated with their ports
+            for fip, created in floating_ips:
+                if not created:
+                    floating_ip_claims.release(fip.get('id'))
+                    continue
+                try:
+                    neutron_client.delete_floatingip(fip.get('id'))
+                except Exception as e:
+                    log.error('Unable to delete the created floating IP {}: {}'.format(fip.get('floating_ip_address'),
+                                                                                       e))
             for port in ports:
                 try:
                     neutron_client.delete_port(port.get('port').get('id'))
@@ -634,6 +1110,8 @@ class OpenstackVimDriver(VimDriver):
                     log.error('Unable to delete the created port: {}'.format(e))
             raise
 
+    @instrumented
+    @profiled
     def launch_instance_and_wait(self,
                                  vim_instance: dict,
                                  instance_name: str,
@@ -646,73 +1124,242 @@ class OpenstackVimDriver(VimDriver):
                                  floating_ips: dict = None,
                                  keys: [dict] = None):
 
-        user_data = '' if user_data is None else user_data
-        if keys is not None and len(keys) > 0:
-            user_data += '\nfor x in `find /home/ -name authorized_keys`; do\n\techo \"' + \
-                         '\" >> $x\n\techo \"'.join([keys.get(k).get('publicKey') for k in keys]) + \
-                         '\" >> $x\ndone\n'
+        user_data = self.__build_user_data(user_data, keys)
         nova_client = self.get_nova_client(vim_instance)
         server = self.__create_server(vim_instance, instance_name, image, flavor, key_pair, networks, security_groups,
                                       user_data,
                                       nova_client=nova_client)
 
         # wait until the server is active
-        i = 0
-        while i < self.wait_for_vm or self.wait_for_vm < 0:
-            if self.__server_is_active(server):
-                break
-            time.sleep(1)
-            server = nova_client.servers.get(server.id)
-        else:
-            if not self.__server_is_active(server):
-                raise Exception(
-                    'Timeout: after {} seconds the VM {} is still not active'.format(self.wait_for_vm, server.name))
+        server, exception = self.__wait_for_servers(vim_instance, [server]).get(server.id)
+        if exception is not None:
+            raise exception
 
-        return self.__os_server_to_ob_server(server, self.list_images(vim_instance), self.list_flavors(vim_instance))
+        return next(self.__os_servers_to_ob_servers(vim_instance, [server], nova_client))
+
+    def __build_user_data(self, user_data: str, keys: dict):
+        user_data = '' if user_data is None else user_data
+        if keys is not None and len(keys) > 0:
+            user_data += '\nfor x in `find /home/ -name authorized_keys`; do\n\techo \"' + \
+                         '\" >> $x\n\techo \"'.join([keys.get(k).get('publicKey') for k in keys]) + \
+                         '\" >> $x\ndone\n'
+        return user_data
 
-    def __server_is_active(self, server):
-        if server.status.lower() == 'active':
-            logging.info('VM {} is now active'.format(server.name))
-            return True
-        elif server.status.lower() == 'error':
-            error_message = 'VM {} is in error state'.format(server.name)
-            log.error(error_message)
-            raise Exception(error_message)
-        return False
+    @instrumented
+    @profiled
+    def launch_instances_and_wait(self, vim_instance: dict, instances: [dict]):
+        """
+        Launches several VMs concurrently and waits until all of them are active.
+        The catalog lookups are done once for all the VMs sharing the same image, flavor, key pair and security
+        groups, then the ports and servers of all the VMs are created in parallel and polled together.
 
-    def delete_server_by_id_and_wait(self, vim_instance: dict, ext_id: str):
+        :param vim_instance:
+        :param instances: a list of dictionaries containing the parameters of launch_instance_and_wait, i.e. the keys
+        instance_name, image, flavor, key_pair, networks, security_groups, user_data, floating_ips and keys
+        :return: a list with one dictionary per instance (in the same order) containing the instanceName and either
+        the created server under the key 'server' or the error under the key 'exception'
+        """
         nova_client = self.get_nova_client(vim_instance)
         neutron_client = self.get_neutron_client(vim_instance)
-        server = nova_client.servers.get(ext_id)
-        fips_to_delete = []
-        if self.deallocate_floating_ips:
-            log.info('Deallocating floating IP of VM {}'.format(ext_id))
-            for network in server.addresses:
-                for entry in server.addresses.get(network):
-                    if entry.get('OS-EXT-IPS:type') == 'floating':
-                        fips = neutron_client.list_floatingips().get('floatingips')
-                        for fip in fips:
-                            if entry.get('addr') == fip.get('floating_ip_address'):
-                                try:
-                                    neutron_client.delete_floatingip(fip.get('id'))
-                                except Exception as e:
-                                    log.error(
-                                        'Exception while deallocating floating IP {}: {}'.format(entry.get('addr'), e))
-                                break
-
-        log.info('Deleting ports associated to VM {}'.format(ext_id))
-        ports = neutron_client.list_ports().get('ports')
-        for port in ports:
-            if port.get('device_id') == ext_id:
+        launch_catalogs = {}
+        instance_catalogs = []
+        for instance in instances:
+            catalog_key = (instance.get('image'), instance.get('flavor'), instance.get('key_pair'),
+                           tuple(instance.get('security_groups') or []))
+            if catalog_key not in launch_catalogs:
                 try:
-                    neutron_client.delete_port(port.get('id'))
+                    launch_catalogs[catalog_key] = (self.__resolve_launch_catalog(
+                        vim_instance, instance.get('image'), instance.get('flavor'), instance.get('key_pair'),
+                        instance.get('security_groups') or [], nova_client, neutron_client), None)
                 except Exception as e:
-                    log.error('Exception while removing port {}:{}'.format(port.get('id'), e))
-        try:
-            nova_client.servers.delete(server)
-            log.info('Removed VM {} ({})'.format(server.name, server.id))
-        except Exception as e:
-            log.error('Exception while removing VM {} ({}): {}'.format(server.name, server.id, e))
+                    launch_catalogs[catalog_key] = (None, e)
+            instance_catalogs.append(launch_catalogs[catalog_key])
+        # load the networks and, if floating IPs without a chosen pool are requested, the router topology once
+        # before the VMs look them up concurrently
+        catalog_cache.get(vim_instance, 'networks', lambda: self.__list_network_dicts(vim_instance, neutron_client))
+        if any(cp.get('floatingIp') is not None and cp.get('chosenPool') in (None, '') for instance in instances for
+               cp in instance.get('networks') or []):
+            self.__get_router_topology(vim_instance, neutron_client)
+
+        def create_server(instance_and_catalog):
+            instance, (launch_catalog, exception) = instance_and_catalog
+            if exception is not None:
+                raise exception
+            return self.__create_server(vim_instance, instance.get('instance_name'), instance.get('image'),
+                                        instance.get('flavor'), instance.get('key_pair'), instance.get('networks'),
+                                        instance.get('security_groups') or [],
+                                        self.__build_user_data(instance.get('user_data'), instance.get('keys')),
+                                        nova_client=nova_client, neutron_client=neutron_client,
+                                        launch_catalog=launch_catalog)
+
+        outcomes = map_concurrently(create_server, list(zip(instances, instance_catalogs)),
+                                    max_workers=self.parallel_requests)
+        waited = self.__wait_for_servers(vim_instance, [server for server, e in outcomes if server is not None])
+        results = []
+        for instance, (server, exception) in zip(instances, outcomes):
+            result = {'instanceName': instance.get('instance_name')}
+            if exception is None:
+                server, exception = waited.get(server.id)
+            if exception is None:
+                result['server'] = next(self.__os_servers_to_ob_servers(vim_instance, [server], nova_client)).get_dict()
+            else:
+                log.error('Unable to launch VM {}: {}'.format(instance.get('instance_name'), exception))
+                result['exception'] = {'detailMessage': str(exception)}
+            results.append(result)
+        return results
+
+    @traced
+    def __wait_for_servers(self, vim_instance: dict, servers: list, target_status='active', timeout=None):
+        """
+        Waits until all the passed servers reached the target status or the timeout expired.
+        The servers are polled together with the other servers of the VIM by its ServerWaiter.
+
+        :param vim_instance:
+        :param servers: the OpenStack servers to wait for
+        :param target_status: 'active' or 'deleted'
+        :param timeout: the maximum number of seconds to wait, by default wait-for-vm
+        :return: a dictionary mapping the server IDs to (server, exception) tuples
+        """
+        if timeout is None:
+            timeout = self.wait_for_vm
+        waiter = server_waiters.get_waiter(vim_instance)
+        nova_client_factory = lambda: self.get_nova_client(vim_instance)
+        futures = [(server, waiter.wait(server, nova_client_factory, timeout, target_status)) for server in servers]
+        outcomes = {}
+        for server, future in futures:
+            try:
+                outcomes[server.id] = (future.result(), None)
+            except Exception as e:
+                outcomes[server.id] = (server, e)
+        return outcomes
+
+    def __list_filtered(self, list_function, collection, filter_name, values):
+        """
+        Lists Neutron resources filtered by a list of values. The values are split into chunks so that the URLs
+        do not get too long and the chunks are fetched in parallel.
+
+        :param list_function: a list function of the Neutron client, e.g. neutron_client.list_ports
+        :param collection: the key of the list in the response, e.g. 'ports'
+        :param filter_name: the name of the filter, e.g. 'device_id'
+        :param values: the values of the filter
+        :return: the list of resources matching any of the values
+        """
+        chunks = [values[i:i + FILTER_CHUNK_SIZE] for i in range(0, len(values), FILTER_CHUNK_SIZE)]
+        listings = run_concurrently(
+            {i: (lambda chunk=chunk: list_function(**{filter_name: chunk}).get(collection)) for i, chunk in
+             enumerate(chunks)}, max_workers=self.parallel_requests, timeout=self.parallel_request_timeout)
+        return [resource for i in range(len(chunks)) for resource in listings.get(i)]
+
+    def __delete_servers(self, vim_instance: dict, ext_ids: [str]):
+        """
+        Deletes VMs together with their ports and, if deallocate-floating-ip is enabled, their floating IPs
+        and waits until the VMs do not exist anymore or wait-for-vm-deletion seconds passed.
+        The ports and floating IPs of all the VMs are listed once and everything is deleted in parallel waves.
+        A VM which still exists when the wait ends is only logged, Nova accepted its deletion.
+
+        :param vim_instance:
+        :param ext_ids: the IDs of the VMs
+        :return: a dictionary mapping the IDs of the VMs to None or the exception which prevented their deletion
+        """
+        nova_client = self.get_nova_client(vim_instance)
+        neutron_client = self.get_neutron_client(vim_instance)
+        outcomes = {}
+        servers = []
+        for ext_id, (server, exception) in zip(ext_ids, map_concurrently(nova_client.servers.get, ext_ids,
+                                                                          max_workers=self.parallel_requests)):
+            outcomes[ext_id] = exception
+            if exception is None:
+                servers.append(server)
+        if len(servers) == 0:
+            return outcomes
+
+        ports = self.__list_filtered(neutron_client.list_ports, 'ports', 'device_id',
+                                     [server.id for server in servers])
+        fips = []
+        if self.deallocate_floating_ips and len(ports) > 0:
+            log.info('Deallocating floating IPs of {} VMs'.format(len(servers)))
+            fips = self.__list_filtered(neutron_client.list_floatingips, 'floatingips', 'port_id',
+                                        [port.get('id') for port in ports])
+
+        log.info('Deleting ports associated to {} VMs'.format(len(servers)))
+
+        def delete_port_or_floating_ip(resource):
+            resource_type, resource_dict = resource
+            try:
+                if resource_type == 'floatingip':
+                    neutron_client.delete_floatingip(resource_dict.get('id'))
+                else:
+                    neutron_client.delete_port(resource_dict.get('id'))
+            except Exception as e:
+                if resource_type == 'floatingip':
+                    log.error('Exception while deallocating floating IP {}: {}'.format(
+                        resource_dict.get('floating_ip_address'), e))
+                else:
+                    log.error('Exception while removing port {}:{}'.format(resource_dict.get('id'), e))
+
+        # the floating IPs and ports are deleted in parallel
+        map_concurrently(delete_port_or_floating_ip,
+                         [('floatingip', fip) for fip in fips] + [('port', port) for port in ports],
+                         max_workers=self.parallel_requests)
+
+        deleted_servers = []
+        for server, (result, exception) in zip(servers, map_concurrently(nova_client.servers.delete, servers,
+                                                                         max_workers=self.parallel_requests)):
+            if exception is None:
+                deleted_servers.append(server)
+            else:
+                log.error('Exception while removing VM {} ({}): {}'.format(server.name, server.id, exception))
+                outcomes[server.id] = exception
+
+        waited = self.__wait_for_servers(vim_instance, deleted_servers, target_status='deleted',
+                                         timeout=self.wait_for_vm_deletion)
+        for server in deleted_servers:
+            deleted_server, exception = waited.get(server.id)
+            if exception is None:
+                log.info('Removed VM {} ({})'.format(server.name, server.id))
+            else:
+                log.warning('Deletion of VM {} ({}) requested but not finished: {}'.format(server.name, server.id,
+                                                                                          exception))
+        return outcomes
+
+    @instrumented
+    @profiled
+    def delete_server_by_id_and_wait(self, vim_instance: dict, ext_id: str):
+        """
+        Deletes a VM together with its ports and, if deallocate-floating-ip is enabled, its floating IPs
+        and waits until the VM does not exist anymore or wait-for-vm-deletion seconds passed.
+        Raises an exception if the VM cannot be found or Nova refuses to delete it, but not if the wait times out.
+
+        :param vim_instance:
+        :param ext_id: the ID of the VM
+        :return:
+        """
+        exception = self.__delete_servers(vim_instance, [ext_id]).get(ext_id)
+        if exception is not None:
+            raise exception
+
+    @instrumented
+    @profiled
+    def delete_servers_by_ids_and_wait(self, vim_instance: dict, ext_ids: [str]):
+        """
+        Deletes several VMs like delete_server_by_id_and_wait. Ports and floating IPs are listed once for all the VMs
+        and the VMs are deleted in parallel.
+
+        :param vim_instance:
+        :param ext_ids: the IDs of the VMs
+        :return: a list with one dictionary per VM (in the same order) containing the extId and, if the VM could not
+        be deleted, the error under the key 'exception'
+        """
+        outcomes = self.__delete_servers(vim_instance, ext_ids)
+        results = []
+        for ext_id in ext_ids:
+            result = {'extId': ext_id}
+            exception = outcomes.get(ext_id)
+            if exception is not None:
+                log.error('Unable to delete VM {}: {}'.format(ext_id, exception))
+                result['exception'] = {'detailMessage': str(exception)}
+            results.append(result)
+        return results
 
     def __get_compute_quota(self, vim_instance, nova_client=None):
         if nova_client is None:
@@ -728,6 +1375,8 @@ class OpenstackVimDriver(VimDriver):
         quota = neutron_client.show_quota(tenant_id)
         return quota
 
+    @instrumented
+    @profiled
     def get_quota(self, vim_instance: dict):
         compute_quota = self.__get_compute_quota(vim_instance)
         net_quota = self.__get_network_quota(vim_instance).get('quota')
@@ -740,26 +1389,38 @@ class OpenstackVimDriver(VimDriver):
         quota['ram'] = compute_quota.ram
         return quota
 
-    def __find_connected_external_network(self, network_id, networks: [dict], routers: [dict], ports: [dict]):
+    def __find_connected_external_network(self, vim_instance, network_id, router_topology=None, neutron_client=None):
         """
         Returns the ID of an external network that is connected to the network with the passed network_id.
         If no external network is found an Exception is raised.
-        We assume that the network is directly attached to a router which is connected to an external network.
+        We assume that the network is directly attached to a router whose gateway is an external network.
+        External networks known to the VIM instance are preferred if the network is attached to several routers.
 
+        :param vim_instance:
         :param network_id: the ID of the network for which a connected external network is searched
-        :param networks: list of available networks in OpenStack
-        :param routers: list of OpenStack routers
-        :param ports: list of OpenStack ports
+        :param router_topology: the RouterTopology of the VIM instance, fetched from the cache if not passed
+        :param neutron_client:
         :return: the ID of the connected external network
         """
-        external_networks = [net for net in networks if net.get('external') is True]
-        for ext_net in external_networks:
-            connected_networks = [port.get('network_id') for port in ports if
-                                  port.get('device_id') in [r.get('id') for r in routers]]
-            if network_id in connected_networks:
-                return ext_net.get('extId')
+        if router_topology is None:
+            router_topology = self.__get_router_topology(vim_instance, neutron_client)
+        ext_net_ids = router_topology.find_external_network_ids(network_id)
+        if len(ext_net_ids) == 0:
+            # the network might have been attached to a router after the topology was cached
+            catalog_cache.invalidate(vim_instance, 'router_topology')
+            ext_net_ids = self.__get_router_topology(vim_instance, neutron_client).find_external_network_ids(
+                network_id)
+        known_ext_net_ids = [net.get('extId') for net in vim_instance.get('networks') or [] if
+                             net.get('external') is True]
+        for ext_net_id in ext_net_ids:
+            if ext_net_id in known_ext_net_ids:
+                return ext_net_id
+        if len(ext_net_ids) > 0:
+            return ext_net_ids[0]
         raise Exception('No external network found connected to network {}'.format(network_id))
 
+    @instrumented
+    @profiled
     def rebuild_server(self, vim_instance: dict, server_id: str, image_id: str, nova_client=None):
         """
         Rebuild a VM with a certain image.
@@ -780,9 +1441,10 @@ class OpenstackVimDriver(VimDriver):
             server = server.rebuild(image_id)
         except Exception as e:
             raise Exception('Exception while rebuilding VM with ID {}: {}'.format(server_id, e))
-        return self.__os_server_to_ob_server(server, self.list_images(vim_instance),
-                                             self.list_flavors(vim_instance, nova_client))
+        return next(self.__os_servers_to_ob_servers(vim_instance, [server], nova_client))
 
+    @instrumented
+    @profiled
     def create_network(self, vim_instance: dict, network: dict, neutron_client=None):
         """
         Creates a new network on OpenStack.
@@ -805,9 +1467,12 @@ class OpenstackVimDriver(VimDriver):
             assert net is not None and type(net) is dict
         except Exception as e:
             raise Exception('Exception while creating the network {}: {}'.format(network.get('name'), e))
+        catalog_cache.add(vim_instance, 'networks', net)
         return Network(name=net.get('name'), ext_id=net.get('id'), external=net.get('router:external'),
                        shared=net.get('shared'), subnets=[])
 
+    @instrumented
+    @profiled
     def get_network_by_id(self, vim_instance: dict, ext_id: str, neutron_client=None):
         """
         Returns the network with the given OpenStack ID. Returns None if no network was found.
@@ -819,9 +1484,13 @@ class OpenstackVimDriver(VimDriver):
         """
         if neutron_client is None:
             neutron_client = self.get_neutron_client(vim_instance)
-        for net in self.list_networks(vim_instance, neutron_client):
-            if net.extId == ext_id:
-                return net
+        # not coalesced with list_networks, a listing which started before the network was created would miss it
+        try:
+            network = neutron_client.show_network(ext_id).get('network')
+        except NeutronNotFoundException:
+            return None
+        subnets = neutron_client.list_subnets(network_id=ext_id).get('subnets')
+        return self.__to_networks([network], [self.__to_subnet(subnet) for subnet in subnets])[0]
 
     # def __delete_port(self, vim_instance: dict, port_id: str, neutron_client=None):
     #     if neutron_client is None:
@@ -836,22 +1505,30 @@ class OpenstackVimDriver(VimDriver):
     #         neutron_client = self.get_neutron_client(vim_instance)
     #     neutron_client.rou
 
+    @instrumented
+    @profiled
     def delete_network(self, vim_instance: dict, ext_id: str, neutron_client=None):
         if neutron_client is None:
             neutron_client = self.get_neutron_client(vim_instance)
 
-        for port in self.__list_ports(vim_instance, neutron_client):
-            if port.get('network_id') == ext_id and port.get('device_owner') == 'network:router_interface':
-                # TODO this port is not only connected to the network but also to a router
-                # we have to call remove_interface_router before deleting the port
-                for router in self.__list_routers(vim_instance, neutron_client):
-                    if router.get('id') == port.get('device_id'):
-                        neutron_client.remove_interface_router(router.get('id'), {'port_id': port.get('id')})
-                        break
+        # the router interfaces have to be removed before the network can be deleted
+        router_ports = neutron_client.list_ports(network_id=ext_id,
+                                                 device_owner=ROUTER_INTERFACE_DEVICE_OWNERS).get('ports')
+        outcomes = map_concurrently(
+            lambda port: neutron_client.remove_interface_router(port.get('device_id'), {'port_id': port.get('id')}),
+            router_ports, max_workers=self.parallel_requests)
+        for result, exception in outcomes:
+            if exception is not None:
+                raise exception
         try:
             neutron_client.delete_network(ext_id)
         except Exception as e:
             raise Exception('Unable to remove network with ID {}: {}'.format(ext_id, e))
+        catalog_cache.update(vim_instance, 'networks', lambda nets: [n for n in nets if n.get('id') != ext_id])
+        catalog_cache.invalidate(vim_instance, 'router_topology')
+        # deleted resources are only noticed by full listings
+        refresh_snapshots.invalidate(vim_instance, 'networks')
+        refresh_snapshots.invalidate(vim_instance, 'subnets')
         return True
 
     def __get_external_network_dict(self, vim_instance: dict, neutron_client=None):
@@ -869,6 +1546,8 @@ class OpenstackVimDriver(VimDriver):
             if net.get('router:external') == True:
                 return net
 
+    @instrumented
+    @profiled
     def create_subnet(self, vim_instance: dict, created_network: dict, subnet: dict, neutron_client=None):
         """
         Creates a new subnet and attaches it to a router.
@@ -908,6 +1587,11 @@ class OpenstackVimDriver(VimDriver):
                                                                                               created_network.get(
                                                                                                   'extId'), e))
 
+        catalog_cache.update(vim_instance, 'networks',
+                             lambda nets: [dict(n, subnets=n.get('subnets', []) + [snet.get('id')]) if n.get(
+                                 'id') == snet.get('network_id') and snet.get('id') not in n.get('subnets', []) else n
+                                           for n in nets])
+
         try:
             self.__attach_subnet_to_router(vim_instance, snet.get('id'))
         except Exception as e:
@@ -969,6 +1653,8 @@ class OpenstackVimDriver(VimDriver):
             raise Exception(
                 'Unable to attach subnet {} to router {}({}): {}'.format(subnet_id, router.get('name'),
                                                                          router.get('id'), e))
+        finally:
+            catalog_cache.invalidate(vim_instance, 'router_topology')
 
 
 def main():
@@ -996,6 +1682,9 @@ def main():
                         help='the name of the VIM driver, default is the VIM driver\'s <type>', default="")
     parser.add_argument('-c', '--conf-file', type=str, default="",
                         help='configuration_file location, default is /etc/openbaton/<type>_vim_driver.ini')
+    parser.add_argument('-p', '--profile', type=str, default="",
+                        help='enable profiling and write the profiles to this directory, overrides the [profiling] '
+                             'section of the configuration file')
 
     args = parser.parse_args()
     plugin_type = args.type
@@ -1007,6 +1696,10 @@ def main():
     if not name:
         name = plugin_type
     conf_map = {}
+    notification_conf_map = {}
+    metrics_conf_map = {}
+    profiling_conf_map = {}
+    tracing_conf_map = {}
     if not config_file_location:
         config_file_location = '/etc/openbaton/{}_vim_driver.ini'.format(plugin_type)
     if not os.path.exists(config_file_location):
@@ -1023,16 +1716,100 @@ def main():
         try:
             cp.read(config_file_location)
             conf_map = get_map('general', cp)
+            notification_conf_map = get_map('nova-notifications', cp)
+            metrics_conf_map = get_map('metrics', cp)
+            profiling_conf_map = get_map('profiling', cp)
+            tracing_conf_map = get_map('tracing', cp)
         except Exception as e:
             log.exception('Not able to read config file {}: {}'.format(config_file_location, e))
 
     vim_driver_args = (bool(conf_map.get('deallocate-floating-ip', True)),
                        int(conf_map.get('connection-timeout', 10)),
-                       int(conf_map.get('wait-for-vm', 15)))
+                       int(conf_map.get('wait-for-vm', 15)),
+                       int(conf_map.get('parallel-requests', 8)),
+                       int(conf_map.get('parallel-request-timeout', 120)),
+                       int(conf_map.get('server-page-size', 500)),
+                       int(conf_map.get('image-chunk-size', 1048576)),
+                       int(conf_map.get('image-buffer-chunks', 16)),
+                       int(conf_map.get('image-stall-timeout', 60)),
+                       int(conf_map.get('image-progress-interval', 10)),
+                       int(conf_map.get('wait-for-vm-deletion', 15)))
     log.debug(
-        'vim_driver_args: deallocate-floating-ip={}, connection-timeout={}, wait-for-vm={}'.format(vim_driver_args[0],
-                                                                                                   vim_driver_args[1],
-                                                                                                   vim_driver_args[2]))
+        'vim_driver_args: deallocate-floating-ip={}, connection-timeout={}, wait-for-vm={}, parallel-requests={}, '
+        'parallel-request-timeout={}, server-page-size={}, image-chunk-size={}, image-buffer-chunks={}, '
+        'image-stall-timeout={}, image-progress-interval={}, wait-for-vm-deletion={}'.format(*vim_driver_args))
+    shared_settings = {'session_idle_timeout': int(conf_map.get('session-idle-timeout', 600)),
+                       'cache_ttls': {key[len('cache-ttl-'):].replace('-', '_'): int(value) for key, value in
+                                      conf_map.items() if key.startswith('cache-ttl-')},
+                       'wait_poll_interval_min': float(conf_map.get('wait-poll-interval-min', 0.5)),
+                       'wait_poll_interval_max': float(conf_map.get('wait-poll-interval-max', 5)),
+                       'floating_ip_pool_low_watermark': int(conf_map.get('floating-ip-pool-low-watermark', 0)),
+                       'floating_ip_pool_high_watermark': int(conf_map.get('floating-ip-pool-high-watermark', 0)),
+                       'image_deduplication': conf_map.get('image-deduplication', 'none').lower(),
+                       'image_staging_directory': conf_map.get('image-staging-directory'),
+                       'image_staging_max_size': int(conf_map.get('image-staging-max-size', 0)),
+                       'image_staging_ttl': int(conf_map.get('image-staging-ttl', 3600)),
+                       'refresh_mode': conf_map.get('refresh-mode', 'full').lower(),
+                       'refresh_full_interval': int(conf_map.get('refresh-full-interval', 3600)),
+                       'coalesce_requests': conf_map.get('coalesce-requests', 'true').lower() == 'true'}
+    log.debug('shared settings: {}'.format(shared_settings))
+    OpenstackVimDriver.configure(**shared_settings)
+
+    # every worker thread may send parallel-requests requests to the same OpenStack at once
+    pool_size = get_pool_size(maximum_worker_threads, vim_driver_args[3])
+    session_registry.pool_size = pool_size
+    mount_http_adapter(http_session, pool_size)
+
+    if notification_conf_map.get('enabled', 'false').lower() == 'true':
+        # VMs are polled only if no notification about them arrives within fallback-timeout seconds
+        server_waiters.poll_delay = float(notification_conf_map.get('fallback-timeout', 10))
+        NovaNotificationListener(server_waiters.notify,
+                                 broker_ip=notification_conf_map.get('broker_ip', '127.0.0.1'),
+                                 port=int(notification_conf_map.get('port', 5672)),
+                                 username=notification_conf_map.get('username', 'guest'),
+                                 password=notification_conf_map.get('password', 'guest'),
+                                 virtual_host=notification_conf_map.get('virtual-host', '/'),
+                                 exchange_name=notification_conf_map.get('exchange-name', 'nova'),
+                                 routing_key=notification_conf_map.get('routing-key', 'versioned_notifications.info'),
+                                 heartbeat=int(notification_conf_map.get('heartbeat', 60))).start()
+        log.debug('Listening for Nova notifications, polling VMs after {} seconds without notification'.format(
+            server_waiters.poll_delay))
+
+    if metrics_conf_map.get('enabled', 'false').lower() == 'true':
+        metrics.enabled = True
+        port = int(metrics_conf_map.get('port', 9464))
+        if port > 0:
+            start_metrics_server(metrics_conf_map.get('address', '127.0.0.1'), port)
+        dump_interval = int(metrics_conf_map.get('dump-interval', 0))
+        if dump_interval > 0:
+            start_metrics_dump(dump_interval)
+
+    profiling_directory = args.profile or profiling_conf_map.get('directory', '/tmp/openstack-vim-driver-profiles')
+    profiler.configure(profiling_directory,
+                       mode=profiling_conf_map.get('mode', 'sample').lower(),
+                       methods=[m.strip() for m in profiling_conf_map.get('methods', '').split(',') if m.strip()],
+                       sample_interval=float(profiling_conf_map.get('sample-interval', 20)) / 1000,
+                       cprofile_rate=float(profiling_conf_map.get('cprofile-rate', 0.01)),
+                       max_files=int(profiling_conf_map.get('max-files', 100)),
+                       flush_interval=int(profiling_conf_map.get('flush-interval', 60)))
+    install_toggle_signal(profiling_conf_map.get('toggle-signal', 'SIGUSR2').upper())
+    if args.profile or profiling_conf_map.get('enabled', 'false').lower() == 'true':
+        profiler.toggle()
+
+    if tracing_conf_map.get('enabled', 'false').lower() == 'true':
+        exporter_name = tracing_conf_map.get('exporter', 'jsonl').lower()
+        if exporter_name == 'otlp':
+            tracer.exporter = OtlpExporter(tracing_conf_map.get('otlp-endpoint', 'http://127.0.0.1:4318/v1/traces'),
+                                           tracing_conf_map.get('service-name', 'openstack-vim-driver'))
+        elif exporter_name == 'jsonl':
+            tracer.exporter = JsonLinesExporter(tracing_conf_map.get('file', '/tmp/openstack-vim-driver-spans.jsonl'))
+        else:
+            raise ValueError('Unknown tracing exporter {}, use jsonl or otlp'.format(exporter_name))
+        tracer.sample_rate = float(tracing_conf_map.get('sample-rate', 0.1))
+        tracer.export_interval = int(tracing_conf_map.get('export-interval', 5))
+        tracer.enabled = True
+        tracer.start()
+        log.debug('Tracing {:.0%} of the requests with the {} exporter'.format(tracer.sample_rate, exporter_name))
 
     log.info('Starting the OpenStack Python VIM Driver')
     start_vim_driver(OpenstackVimDriver, config_file_location, maximum_worker_threads, number_listener_threads,
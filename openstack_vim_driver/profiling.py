@@ -0,0 +1,269 @@
+import cProfile
+import collections
+import functools
+import itertools
+import logging
+import os
+import random
+import signal
+import sys
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# the stacks of a method which are kept until the next flush, further stacks are counted as truncated
+MAX_STACKS_PER_METHOD = 10000
+
+# the profiling modes: sample records the stacks of the threads running a profiled method every sample-interval,
+# cprofile runs a deterministic profiler for a fraction of the calls
+PROFILING_MODES = ('sample', 'cprofile')
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return '{}.{}'.format(frame.f_globals.get('__name__', '?'), getattr(code, 'co_qualname', code.co_name))
+
+
+class Profiler(object):
+    """
+    Profiles the methods of the VIM driver decorated with profiled and writes the results to a directory:
+
+    * in the mode sample a background thread records the stacks of the threads running a profiled method every
+      sample_interval seconds. The stacks are aggregated per method and written every flush_interval seconds to
+      <method>-<time>.folded files in the collapsed format of flamegraph.pl and speedscope.
+    * in the mode cprofile a fraction of the calls, one at a time, is profiled with cProfile and written to
+      <method>-<time>.prof files, which can be read with pstats or snakeviz.
+
+    Only the newest max_files files are kept. Nothing is recorded while it is disabled.
+    """
+
+    def __init__(self, enabled=False, directory=None, mode='sample', methods=None, sample_interval=0.02,
+                 cprofile_rate=0.01, max_files=100, flush_interval=60):
+        self.enabled = enabled
+        self.configure(directory, mode, methods, sample_interval, cprofile_rate, max_files, flush_interval)
+        # thread ID -> (method name, frame calling the profiled method)
+        self._active = {}
+        # method name -> Counter of the collapsed stacks
+        self._stacks = {}
+        self._cprofile_running = False
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._sampler = None
+        self._file_counter = itertools.count()
+
+    def configure(self, directory, mode='sample', methods=None, sample_interval=0.02, cprofile_rate=0.01,
+                  max_files=100, flush_interval=60):
+        """
+        Changes the settings of the profiler.
+
+        :param directory: the directory the profiles are written to
+        :param mode: sample or cprofile
+        :param methods: the names of the methods to profile, None profiles all decorated methods
+        :param sample_interval: the seconds between two samples of the stacks, at least one millisecond
+        :param cprofile_rate: the fraction of the calls profiled with cProfile
+        :param max_files: the number of profile files which are kept, zero or less keeps all
+        :param flush_interval: the seconds after which the sampled stacks are written
+        :return:
+        """
+        if mode not in PROFILING_MODES:
+            raise ValueError('Unknown profiling mode {}, use one of {}'.format(mode, ', '.join(PROFILING_MODES)))
+        self.directory = directory
+        self.mode = mode
+        self.methods = set(methods) if methods else None
+        self.sample_interval = max(sample_interval, 0.001)
+        self.cprofile_rate = min(max(cprofile_rate, 0.0), 1.0)
+        self.max_files = max_files
+        self.flush_interval = flush_interval
+
+    def is_profiled(self, method_name):
+        return self.enabled and self.directory is not None and (self.methods is None or method_name in self.methods)
+
+    def toggle(self):
+        """
+        Enables the profiler if it is disabled and vice versa. The samples recorded so far are written when it is
+        disabled.
+
+        :return:
+        """
+        if self.directory is None:
+            log.warning('Profiling cannot be enabled without a directory')
+            return
+        self.enabled = not self.enabled
+        log.info('Profiling {}'.format('enabled, writing to {}'.format(self.directory) if self.enabled else 'disabled'))
+        if self.enabled:
+            self.start()
+        else:
+            self.flush()
+
+    def start(self):
+        """
+        Starts the background thread sampling the stacks and flushing them, if it is not running yet.
+
+        :return:
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            if self.mode != 'sample' or (self._sampler is not None and self._sampler.is_alive()):
+                return
+            self._sampler = threading.Thread(target=self.__sample_loop, name='profiling-sampler')
+            self._sampler.daemon = True
+            self._sampler.start()
+
+    def call(self, method_name, function, *args, **kwargs):
+        """
+        Calls the function and profiles it if the method is selected.
+
+        :param method_name: the name of the method used in the files
+        :param function:
+        :return: the result of the function
+        """
+        if not self.is_profiled(method_name):
+            return function(*args, **kwargs)
+        if self.mode == 'cprofile':
+            return self.__call_cprofile(method_name, function, *args, **kwargs)
+        thread_id = threading.get_ident()
+        with self._lock:
+            # calls of profiled methods inside a profiled method belong to the outer one
+            outermost = thread_id not in self._active
+            if outermost:
+                self._active[thread_id] = (method_name, sys._getframe())
+        try:
+            return function(*args, **kwargs)
+        finally:
+            if outermost:
+                with self._lock:
+                    self._active.pop(thread_id, None)
+
+    def __call_cprofile(self, method_name, function, *args, **kwargs):
+        with self._lock:
+            # only one call is profiled at a time, which bounds the overhead and is required by cProfile since
+            # Python 3.12
+            profile = not self._cprofile_running and random.random() < self.cprofile_rate
+            if profile:
+                self._cprofile_running = True
+        if not profile:
+            return function(*args, **kwargs)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.disable()
+                self.__write(method_name, 'prof', profiler.dump_stats)
+        finally:
+            with self._lock:
+                self._cprofile_running = False
+
+    def __sample_loop(self):
+        last_flush = time.monotonic()
+        while True:
+            time.sleep(self.sample_interval)
+            if self.enabled and self.mode == 'sample':
+                self.sample()
+            if self.flush_interval > 0 and time.monotonic() - last_flush >= self.flush_interval:
+                self.flush()
+                last_flush = time.monotonic()
+
+    def sample(self):
+        """
+        Records the current stacks of the threads running a profiled method.
+
+        :return:
+        """
+        frames = sys._current_frames()
+        with self._lock:
+            active = list(self._active.items())
+        for thread_id, (method_name, method_frame) in active:
+            frame = frames.get(thread_id)
+            labels = []
+            while frame is not None and frame is not method_frame:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            if frame is None:
+                # the method returned in the meantime
+                continue
+            stack = ';'.join(reversed(labels))
+            with self._lock:
+                stacks = self._stacks.setdefault(method_name, collections.Counter())
+                if stack not in stacks and len(stacks) >= MAX_STACKS_PER_METHOD:
+                    stack = '{};[truncated]'.format(method_name)
+                stacks[stack] += 1
+
+    def flush(self):
+        """
+        Writes the recorded stacks to one file per method and clears them.
+
+        :return:
+        """
+        with self._lock:
+            stacks = self._stacks
+            self._stacks = {}
+        for method_name, counter in stacks.items():
+            def write(path, counter=counter):
+                with open(path, 'w') as f:
+                    for stack, count in counter.most_common():
+                        f.write('{} {}\n'.format(stack, count))
+
+            self.__write(method_name, 'folded', write)
+
+    def __write(self, method_name, extension, write_function):
+        with self._file_lock:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                path = os.path.join(self.directory, '{}-{}-{}.{}'.format(
+                    method_name, time.strftime('%Y%m%dT%H%M%S'), next(self._file_counter), extension))
+                write_function(path)
+                log.debug('Wrote profile {}'.format(path))
+                self.__remove_old_files()
+            except Exception as e:
+                log.warning('Not able to write the profile of {}: {}'.format(method_name, e))
+
+    def __remove_old_files(self):
+        if self.max_files <= 0:
+            return
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if
+                 name.endswith('.prof') or name.endswith('.folded')]
+        if len(paths) <= self.max_files:
+            return
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:len(paths) - self.max_files]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+# the profiler of this VIM driver process
+profiler = Profiler()
+
+
+def profiled(method):
+    """
+    Decorator profiling a method of the VIM driver while the profiler is enabled and the method is selected.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not profiler.enabled:
+            return method(self, *args, **kwargs)
+        return profiler.call(method.__name__, method, self, *args, **kwargs)
+
+    return wrapper
+
+
+def install_toggle_signal(signal_name='SIGUSR2'):
+    """
+    Installs a handler toggling the profiler when the process receives the signal, e.g. kill -USR2 <pid>.
+    Has to be called from the main thread.
+
+    :param signal_name:
+    :return:
+    """
+    signal_number = getattr(signal, signal_name, None)
+    if signal_number is None:
+        log.warning('Signal {} is not available, profiling cannot be toggled at runtime'.format(signal_name))
+        return
+    signal.signal(signal_number, lambda signum, frame: profiler.toggle())
+    log.debug('Profiling can be toggled with {}'.format(signal_name))
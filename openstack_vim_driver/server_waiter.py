@@ -0,0 +1,257 @@
+import datetime
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from novaclient.exceptions import NotFound as ServerNotFoundException
+
+from openstack_vim_driver.catalog_cache import get_vim_key
+
+log = logging.getLogger(__name__)
+
+# the number of polls which may miss a pending server before it is fetched individually
+MAX_MISSED_POLLS = 5
+# servers changed this many seconds before they were registered are included in the polls to tolerate clock skew
+CHANGES_SINCE_MARGIN = 60
+
+
+class _PendingServer(object):
+    def __init__(self, server_id, server_name, target_status, deadline, timeout, poll_after):
+        self.server_id = server_id
+        self.server_name = server_name
+        self.target_status = target_status
+        self.deadline = deadline
+        self.timeout = timeout
+        self.poll_after = poll_after
+        self.registered = datetime.datetime.utcnow()
+        self.missed_polls = 0
+        self.notified = False
+        self.future = Future()
+
+
+class ServerWaiter(object):
+    """
+    Waits for the servers of one VIM instance to reach a target status. Instead of polling every server on its own,
+    a background thread fetches all the servers which changed since the oldest pending one was registered with a single
+    servers.list call. The polling interval starts at min_interval and grows up to max_interval as long as no pending
+    server changes its status. The background thread stops as soon as no server is pending anymore.
+    If notifications about state changes are received (see notify), servers are only polled if no notification arrived
+    within poll_delay seconds after they were registered.
+    """
+
+    def __init__(self, vim_instance, min_interval=0.5, max_interval=5, poll_delay=0):
+        self.tenant = vim_instance.get('tenant')
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.poll_delay = poll_delay
+        self.nova_client_factory = None
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._registered = False
+
+    def wait(self, server, nova_client_factory, timeout=None, target_status='active'):
+        """
+        Registers a server and returns a Future which is resolved with the OpenStack server as soon as it reaches
+        the target status. The Future fails if the timeout expires or, if the target status is 'active', the server
+        goes into error state. Servers which are deleted are waited for until they do not exist anymore.
+
+        :param server: the OpenStack server
+        :param nova_client_factory: function without arguments returning a Nova client of the VIM instance
+        :param timeout: the maximum number of seconds to wait, None or a negative value means no timeout
+        :param target_status: 'active' or 'deleted'
+        :return: a concurrent.futures.Future
+        """
+        now = time.monotonic()
+        deadline = None if timeout is None or timeout < 0 else now + timeout
+        pending = _PendingServer(server.id, server.name, target_status, deadline, timeout, now + self.poll_delay)
+        with self._condition:
+            self.nova_client_factory = nova_client_factory
+            already_pending = self._pending.get(server.id)
+            if already_pending is not None and already_pending.target_status == target_status:
+                return already_pending.future
+            self._pending[server.id] = pending
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.__run, name='server-waiter-{}'.format(self.tenant))
+                self._thread.daemon = True
+                self._thread.start()
+            self._registered = True
+            self._condition.notify()
+        return pending.future
+
+    def notify(self, server_id, status):
+        """
+        Reports a state change of a server, e.g. received as a Nova notification.
+        If the server is pending and reached its target status or failed while it should become active, it is fetched
+        and resolved right away.
+
+        :param server_id:
+        :param status: the new status of the server
+        :return: True if the server is pending in this waiter
+        """
+        with self._condition:
+            pending = self._pending.get(server_id)
+            if pending is None:
+                return False
+            # only servers which are expected to become active fail on errors, servers in error state can be deleted
+            if status == pending.target_status or (status == 'error' and pending.target_status == 'active'):
+                pending.notified = True
+                self._condition.notify()
+            return True
+
+    def __run(self):
+        interval = self.min_interval
+        last_poll = time.monotonic()
+        while True:
+            with self._condition:
+                while True:
+                    if len(self._pending) == 0:
+                        self._thread = None
+                        return
+                    if self._registered:
+                        # poll new servers soon, but at most once per min_interval
+                        self._registered = False
+                        interval = self.min_interval
+                    now = time.monotonic()
+                    pending = list(self._pending.values())
+                    poll_due = last_poll + interval <= now and any(p.poll_after <= now for p in pending)
+                    if poll_due or any(p.notified or (p.deadline is not None and p.deadline <= now) for p in pending):
+                        break
+                    wake_up = [last_poll + interval] + [p.poll_after for p in pending if p.poll_after > now] + [
+                        p.deadline for p in pending if p.deadline is not None]
+                    self._condition.wait(max(0, min(t for t in wake_up if t > now) - now))
+                notified = [p for p in pending if p.notified]
+                for p in notified:
+                    p.notified = False
+                pollable = {p.server_id: p for p in pending if p.poll_after <= now}
+                nova_client_factory = self.nova_client_factory
+            try:
+                nova_client = nova_client_factory()
+                for p in notified:
+                    self.__fetch(p, nova_client)
+                if poll_due:
+                    last_poll = now
+                    changed = self.__poll(pollable, nova_client)
+                    interval = self.min_interval if changed else min(interval * 1.5, self.max_interval)
+            except Exception as e:
+                log.warning('Unable to poll the status of the VMs in tenant {}: {}'.format(self.tenant, e))
+                if poll_due:
+                    last_poll = now
+                    interval = min(interval * 1.5, self.max_interval)
+            self.__expire(pending)
+
+    def __poll(self, pending, nova_client):
+        changes_since = min(p.registered for p in pending.values()) - datetime.timedelta(seconds=CHANGES_SINCE_MARGIN)
+        servers = nova_client.servers.list(search_opts={'project_id': self.tenant,
+                                                        'changes-since': changes_since.replace(
+                                                            microsecond=0).isoformat()}, limit=-1)
+        servers_by_id = {server.id: server for server in servers}
+        changed = False
+        for server_id, p in pending.items():
+            if p.future.done():
+                continue
+            server = servers_by_id.get(server_id)
+            if server is None:
+                p.missed_polls += 1
+                # a server which is being deleted and not listed anymore has most probably been deleted already
+                if p.target_status != 'deleted' and p.missed_polls < MAX_MISSED_POLLS:
+                    continue
+                p.missed_polls = 0
+                changed = self.__fetch(p, nova_client) or changed
+                continue
+            changed = self.__check(p, server) or changed
+        return changed
+
+    def __fetch(self, pending, nova_client):
+        try:
+            server = nova_client.servers.get(pending.server_id)
+        except ServerNotFoundException:
+            if pending.target_status == 'deleted':
+                self.__resolve(pending, None)
+            else:
+                self.__fail(pending, Exception('VM {} does not exist anymore'.format(pending.server_name)))
+            return True
+        return self.__check(pending, server)
+
+    def __check(self, pending, server):
+        status = (server.status or '').lower()
+        if status == pending.target_status:
+            if pending.target_status == 'active':
+                log.info('VM {} is now active'.format(server.name))
+            self.__resolve(pending, server)
+            return True
+        if status == 'error' and pending.target_status == 'active':
+            error_message = 'VM {} is in error state'.format(server.name)
+            log.error(error_message)
+            self.__fail(pending, Exception(error_message))
+            return True
+        return False
+
+    def __expire(self, pending):
+        now = time.monotonic()
+        for p in pending:
+            if p.deadline is not None and p.deadline <= now and not p.future.done():
+                state = 'still not active' if p.target_status == 'active' else 'not yet deleted'
+                self.__fail(p, Exception(
+                    'Timeout: after {} seconds the VM {} is {}'.format(p.timeout, p.server_name, state)))
+
+    def __resolve(self, pending, server):
+        with self._condition:
+            if self._pending.get(pending.server_id) is pending:
+                del self._pending[pending.server_id]
+        if not pending.future.done():
+            pending.future.set_result(server)
+
+    def __fail(self, pending, exception):
+        with self._condition:
+            if self._pending.get(pending.server_id) is pending:
+                del self._pending[pending.server_id]
+        if not pending.future.done():
+            pending.future.set_exception(exception)
+
+
+class ServerWaiterRegistry(object):
+    """
+    Thread-safe registry holding one ServerWaiter per VIM instance.
+    """
+
+    def __init__(self, min_interval=0.5, max_interval=5, poll_delay=0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.poll_delay = poll_delay
+        self._waiters = {}
+        self._lock = threading.Lock()
+
+    def get_waiter(self, vim_instance):
+        """
+        Returns the ServerWaiter of the VIM instance and creates it if it does not exist yet.
+
+        :param vim_instance:
+        :return:
+        """
+        with self._lock:
+            key = get_vim_key(vim_instance)
+            waiter = self._waiters.get(key)
+            if waiter is None:
+                waiter = ServerWaiter(vim_instance, self.min_interval, self.max_interval, self.poll_delay)
+                self._waiters[key] = waiter
+            waiter.min_interval = self.min_interval
+            waiter.max_interval = self.max_interval
+            waiter.poll_delay = self.poll_delay
+            return waiter
+
+    def notify(self, server_id, status):
+        """
+        Passes a state change of a server to the waiter which is waiting for it, if any.
+        Can be used as handler of a NovaNotificationListener.
+
+        :param server_id:
+        :param status:
+        :return:
+        """
+        with self._lock:
+            waiters = list(self._waiters.values())
+        for waiter in waiters:
+            if waiter.notify(server_id, status):
+                break
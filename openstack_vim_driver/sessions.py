@@ -0,0 +1,154 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import requests.adapters
+
+log = logging.getLogger(__name__)
+
+# the maximum number of connections per host kept by the HTTP connection pools
+MAX_POOL_SIZE = 256
+
+# the number of hosts (Keystone, Nova, Neutron, Glance, ...) whose connection pools are kept by an HTTP session
+POOL_CONNECTIONS = 10
+
+
+def get_pool_size(worker_threads, parallel_requests):
+    """
+    Returns the number of connections per host the HTTP connection pools need, so that every worker thread can
+    send parallel_requests requests at the same time without discarding connections.
+
+    :param worker_threads: the maximum number of worker threads, zero or less means unlimited
+    :param parallel_requests: the maximum number of concurrent requests per worker thread
+    :return:
+    """
+    if worker_threads <= 0:
+        return MAX_POOL_SIZE
+    return max(10, min(worker_threads * max(parallel_requests, 1), MAX_POOL_SIZE))
+
+
+def mount_http_adapter(http_session, pool_size, adapter_class=requests.adapters.HTTPAdapter):
+    """
+    Replaces the adapters of a requests session with ones keeping up to pool_size connections per host.
+
+    :param http_session: the requests.Session
+    :param pool_size:
+    :param adapter_class: a subclass of requests' HTTPAdapter
+    :return: the session
+    """
+    adapter = adapter_class(pool_connections=POOL_CONNECTIONS, pool_maxsize=pool_size)
+    http_session.mount('http://', adapter)
+    http_session.mount('https://', adapter)
+    return http_session
+
+
+def get_session_fingerprint(vim_instance):
+    """
+    Returns a tuple of all the VIM instance fields which influence the authentication against OpenStack.
+    If one of them changes, a cached session of the VIM instance can not be used anymore.
+
+    :param vim_instance:
+    :return:
+    """
+    return (vim_instance.get('authUrl'),
+            vim_instance.get('username'),
+            vim_instance.get('password'),
+            vim_instance.get('tenant'),
+            vim_instance.get('domain'),
+            vim_instance.get('openstackSslCertificate'))
+
+
+class _SessionEntry(object):
+    def __init__(self, fingerprint, session):
+        self.fingerprint = fingerprint
+        self.session = session
+        self.clients = {}
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+
+class SessionRegistry(object):
+    """
+    Thread-safe registry which caches one authenticated Keystone session per VIM instance together with the
+    OpenStack clients created on top of it. Entries are keyed by the VIM instance's ID and are replaced as soon as
+    the auth URL, the credentials or the certificate of the VIM instance change. Entries which have not been used
+    for idle_timeout seconds are evicted in least recently used order. An idle_timeout of zero or less disables
+    the caching and a new session is created for every request.
+    The HTTP connection pools of the sessions keep up to pool_size connections per host.
+    """
+
+    def __init__(self, idle_timeout=600, pool_size=10):
+        self.idle_timeout = idle_timeout
+        self.pool_size = pool_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __evict_idle_entries(self, now):
+        while len(self._entries) > 0:
+            vim_id, entry = next(iter(self._entries.items()))
+            if now - entry.last_used < self.idle_timeout:
+                break
+            log.debug('Evicting idle OpenStack session of VIM {}'.format(vim_id))
+            del self._entries[vim_id]
+
+    def __get_entry(self, vim_instance, session_factory):
+        vim_id = vim_instance.get('id')
+        fingerprint = get_session_fingerprint(vim_instance)
+        with self._lock:
+            now = time.monotonic()
+            self.__evict_idle_entries(now)
+            entry = self._entries.get(vim_id)
+            if entry is not None and entry.fingerprint != fingerprint:
+                log.debug('Credentials of VIM {} changed, invalidating its OpenStack session'.format(vim_id))
+                entry = None
+            if entry is None:
+                entry = _SessionEntry(fingerprint, session_factory(vim_instance))
+                self._entries[vim_id] = entry
+            else:
+                self._entries.move_to_end(vim_id)
+            entry.last_used = now
+            return entry
+
+    def get_session(self, vim_instance, session_factory):
+        """
+        Returns the cached session of the VIM instance or creates a new one by calling session_factory.
+
+        :param vim_instance:
+        :param session_factory: function which takes the VIM instance and returns a new Keystone session
+        :return:
+        """
+        if self.idle_timeout <= 0:
+            return session_factory(vim_instance)
+        return self.__get_entry(vim_instance, session_factory).session
+
+    def get_client(self, vim_instance, client_name, session_factory, client_factory):
+        """
+        Returns the cached client called client_name of the VIM instance.
+        If it does not exist yet, it is created by passing the VIM instance's session to client_factory.
+
+        :param vim_instance:
+        :param client_name: the name under which the client is cached, e.g. 'nova'
+        :param session_factory: function which takes the VIM instance and returns a new Keystone session
+        :param client_factory: function which takes a Keystone session and returns a new client
+        :return:
+        """
+        if self.idle_timeout <= 0:
+            return client_factory(session_factory(vim_instance))
+        entry = self.__get_entry(vim_instance, session_factory)
+        with entry.lock:
+            client = entry.clients.get(client_name)
+            if client is None:
+                client = client_factory(entry.session)
+                entry.clients[client_name] = client
+            return client
+
+    def invalidate(self, vim_instance):
+        """
+        Removes the cached session and clients of the VIM instance.
+
+        :param vim_instance:
+        :return:
+        """
+        with self._lock:
+            self._entries.pop(vim_instance.get('id'), None)
@@ -0,0 +1,303 @@
+import binascii
+import contextlib
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+import requests
+
+log = logging.getLogger(__name__)
+
+# the status codes of the spans in the OTLP format
+_OTLP_STATUS_CODES = {'unset': 0, 'ok': 1, 'error': 2}
+
+# the span kinds in the OTLP format
+_OTLP_SPAN_KINDS = {'internal': 1, 'client': 3}
+
+# marks the spans of a thread whose trace is not sampled, so that no child spans are recorded either
+_NOT_SAMPLED = object()
+
+
+@contextlib.contextmanager
+def _no_span():
+    yield None
+
+
+def _random_id(size):
+    return binascii.hexlify(os.urandom(size)).decode('ascii')
+
+
+class Span(object):
+    """
+    A timed operation of a trace, e.g. a request of the NFVO or an OpenStack API call.
+    """
+
+    def __init__(self, name, trace_id, parent_id=None, kind='internal', attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _random_id(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start_time = time.time()
+        self.end_time = None
+        self.status = 'unset'
+        self.status_message = ''
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_status(self, error, message=''):
+        self.status = 'error' if error else 'ok'
+        self.status_message = message
+
+    def end(self):
+        self.end_time = time.time()
+
+    def to_dict(self):
+        return {'name': self.name, 'trace_id': self.trace_id, 'span_id': self.span_id, 'parent_id': self.parent_id,
+                'kind': self.kind, 'start_time': self.start_time, 'end_time': self.end_time,
+                'duration': None if self.end_time is None else round(self.end_time - self.start_time, 6),
+                'status': self.status, 'status_message': self.status_message, 'attributes': self.attributes}
+
+
+class JsonLinesExporter(object):
+    """
+    Appends the spans as JSON objects, one per line, to a file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, spans):
+        with open(self.path, 'a') as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), default=str) + '\n')
+
+
+class OtlpExporter(object):
+    """
+    Sends the spans to an OpenTelemetry collector using the OTLP/HTTP JSON encoding.
+    """
+
+    def __init__(self, endpoint='http://127.0.0.1:4318/v1/traces', service_name='openstack-vim-driver', timeout=10):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    @staticmethod
+    def __attribute(key, value):
+        if isinstance(value, bool):
+            encoded = {'boolValue': value}
+        elif isinstance(value, int):
+            encoded = {'intValue': str(value)}
+        elif isinstance(value, float):
+            encoded = {'doubleValue': value}
+        else:
+            encoded = {'stringValue': str(value)}
+        return {'key': key, 'value': encoded}
+
+    def __to_otlp(self, span):
+        otlp_span = {'traceId': span.trace_id, 'spanId': span.span_id, 'name': span.name,
+                     'kind': _OTLP_SPAN_KINDS.get(span.kind, 1),
+                     'startTimeUnixNano': str(int(span.start_time * 1e9)),
+                     'endTimeUnixNano': str(int(span.end_time * 1e9)),
+                     'attributes': [self.__attribute(k, v) for k, v in span.attributes.items() if v is not None],
+                     'status': {'code': _OTLP_STATUS_CODES.get(span.status), 'message': span.status_message}}
+        if span.parent_id is not None:
+            otlp_span['parentSpanId'] = span.parent_id
+        return otlp_span
+
+    def export(self, spans):
+        body = {'resourceSpans': [{
+            'resource': {'attributes': [self.__attribute('service.name', self.service_name)]},
+            'scopeSpans': [{'scope': {'name': 'openstack_vim_driver'},
+                            'spans': [self.__to_otlp(span) for span in spans]}]}]}
+        response = requests.post(self.endpoint, data=json.dumps(body), timeout=self.timeout,
+                                 headers={'Content-Type': 'application/json'})
+        response.raise_for_status()
+
+
+class Tracer(object):
+    """
+    Records spans of the requests of the NFVO and of the OpenStack API calls made while processing them.
+
+    The current span is kept per thread, functions executed on other threads have to be wrapped with wrap to
+    belong to the same trace. A fraction sample_rate of the traces is recorded, the decision is made when the root
+    span starts. Finished spans are queued and exported in batches by a background thread, if the queue is full
+    they are dropped. Nothing is recorded while it is disabled.
+    """
+
+    def __init__(self, enabled=False, sample_rate=1.0, exporter=None, export_interval=5, max_queue_size=2048,
+                 max_batch_size=512):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+        self.export_interval = export_interval
+        self.max_batch_size = max_batch_size
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._local = threading.local()
+        self._exporter_thread = None
+
+    def __stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current_span(self):
+        """
+        :return: the span of the current thread, None if there is none or its trace is not sampled
+        """
+        stack = self.__stack()
+        return stack[-1] if len(stack) > 0 and stack[-1] is not _NOT_SAMPLED else None
+
+    @contextlib.contextmanager
+    def span(self, name, kind='internal', **attributes):
+        """
+        Context manager recording a span, which is a child of the current span of the thread or the root of a new
+        trace. The span is passed to the with block, None if it is not recorded. Exceptions raised in the block
+        mark the span as failed.
+
+        :param name:
+        :param kind: internal or client
+        :param attributes:
+        :return:
+        """
+        stack = self.__stack()
+        parent = stack[-1] if len(stack) > 0 else None
+        if not self.enabled or parent is _NOT_SAMPLED:
+            yield None
+            return
+        if parent is None and random.random() >= self.sample_rate:
+            stack.append(_NOT_SAMPLED)
+            try:
+                yield None
+            finally:
+                stack.pop()
+            return
+        span = Span(name, parent.trace_id if parent is not None else _random_id(16),
+                    parent.span_id if parent is not None else None, kind, attributes)
+        stack.append(span)
+        try:
+            yield span
+            if span.status == 'unset':
+                span.set_status(False)
+        except Exception as e:
+            span.set_status(True, str(e))
+            raise
+        finally:
+            stack.pop()
+            span.end()
+            self.__enqueue(span)
+
+    def child_span(self, name, kind='internal', **attributes):
+        """
+        Like span, but records a span only if the current thread has one, i.e. it never starts a new trace.
+        Used for calls which are also made by background threads, e.g. OpenStack API calls.
+
+        :param name:
+        :param kind:
+        :param attributes:
+        :return:
+        """
+        if self.current_span() is None:
+            return _no_span()
+        return self.span(name, kind, **attributes)
+
+    def wrap(self, function):
+        """
+        Returns a function calling the passed one in the context of the current span of this thread, so that it can
+        be executed on another thread, e.g. by a ThreadPoolExecutor.
+
+        :param function:
+        :return:
+        """
+        stack = self.__stack()
+        if not self.enabled or len(stack) == 0:
+            return function
+        parent = stack[-1]
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            previous = getattr(self._local, 'stack', None)
+            self._local.stack = [parent]
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._local.stack = previous
+
+        return wrapper
+
+    def __enqueue(self, span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                log.warning('The span queue is full, dropped {} spans so far'.format(self.dropped))
+
+    def start(self):
+        """
+        Starts the background thread exporting the spans, if it is not running yet.
+
+        :return:
+        """
+        if self._exporter_thread is not None and self._exporter_thread.is_alive():
+            return
+        self._exporter_thread = threading.Thread(target=self.__export_loop, name='tracing-exporter')
+        self._exporter_thread.daemon = True
+        self._exporter_thread.start()
+
+    def __export_loop(self):
+        while True:
+            time.sleep(self.export_interval)
+            self.flush()
+
+    def flush(self):
+        """
+        Exports the queued spans.
+
+        :return:
+        """
+        while True:
+            spans = []
+            while len(spans) < self.max_batch_size:
+                try:
+                    spans.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if len(spans) == 0 or self.exporter is None:
+                return
+            try:
+                self.exporter.export(spans)
+            except Exception as e:
+                log.warning('Not able to export {} spans: {}'.format(len(spans), e))
+            if len(spans) < self.max_batch_size:
+                return
+
+
+# the tracer of this VIM driver process
+tracer = Tracer()
+
+
+def traced(method):
+    """
+    Decorator recording a span for a method of the VIM driver while a span of the current thread is recorded,
+    e.g. for the steps of launching a VM.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not tracer.enabled or tracer.current_span() is None:
+            return method(self, *args, **kwargs)
+        with tracer.child_span(method.__name__):
+            return method(self, *args, **kwargs)
+
+    return wrapper
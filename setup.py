@@ -14,7 +14,7 @@ setup(
     author="Open Baton",
     author_email="dev@openbaton.org",
     license='Apache 2',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*', 'tests', 'tests.*']),
     install_requires=[
         'python-plugin-sdk',
         'python-glanceclient',
@@ -23,6 +23,7 @@ setup(
         'requests'
     ],
     scripts=['openstack-vim-driver'],
+    test_suite='tests',
     include_package_data=True,
     classifiers=[
         'Development Status :: 4 - Beta',
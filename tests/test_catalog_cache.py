@@ -0,0 +1,95 @@
+from collections import namedtuple
+import threading
+import time
+import unittest
+
+from openstack_vim_driver.catalog_cache import CatalogCache
+from openstack_vim_driver.coalescing import SingleFlight
+
+VIM_INSTANCE = {'id': 'vim', 'authUrl': 'http://keystone', 'tenant': 'tenant'}
+
+
+class CatalogCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = CatalogCache(ttls={'images': 60, 'flavors': 0}, single_flight=SingleFlight())
+        self.calls = 0
+
+    def loader(self):
+        self.calls += 1
+        return ['image-{}'.format(self.calls)]
+
+    def test_cached_until_invalidated(self):
+        self.assertEqual(self.cache.get(VIM_INSTANCE, 'images', self.loader), ['image-1'])
+        self.assertEqual(self.cache.get(VIM_INSTANCE, 'images', self.loader), ['image-1'])
+        self.cache.invalidate(VIM_INSTANCE, 'images')
+        self.assertEqual(self.cache.get(VIM_INSTANCE, 'images', self.loader), ['image-2'])
+
+    def test_zero_ttl_disables_caching(self):
+        self.cache.get(VIM_INSTANCE, 'flavors', self.loader)
+        self.cache.get(VIM_INSTANCE, 'flavors', self.loader)
+        self.assertEqual(self.calls, 2)
+
+    def test_expired_entry_is_loaded_again(self):
+        self.cache.ttls['images'] = 0.01
+        self.cache.get(VIM_INSTANCE, 'images', self.loader)
+        time.sleep(0.02)
+        self.assertEqual(self.cache.get(VIM_INSTANCE, 'images', self.loader), ['image-2'])
+
+    def test_concurrent_misses_load_once(self):
+        release = threading.Event()
+        results = []
+
+        def slow_loader():
+            release.wait(5)
+            return self.loader()
+
+        threads = [threading.Thread(target=lambda: results.append(self.cache.get(VIM_INSTANCE, 'images', slow_loader)))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while self.cache.single_flight.coalesced_calls < 3 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [['image-1']] * 4)
+
+    def test_failed_load_is_not_cached(self):
+        def failing_loader():
+            raise Exception('Glance is not available')
+
+        with self.assertRaises(Exception):
+            self.cache.get(VIM_INSTANCE, 'images', failing_loader)
+        self.assertEqual(self.cache.get(VIM_INSTANCE, 'images', self.loader), ['image-1'])
+
+    def test_lookup_fetches_missing_items_on_their_own(self):
+        Item = namedtuple('Item', 'extId')
+        fetched = []
+
+        def item_loader(ext_id):
+            fetched.append(ext_id)
+            return Item(ext_id) if ext_id == 'new' else None
+
+        loader = lambda: [Item('old')]
+        self.assertEqual(self.cache.lookup(VIM_INSTANCE, 'images', 'old', loader, item_loader), Item('old'))
+        self.assertEqual(self.cache.lookup(VIM_INSTANCE, 'images', 'new', loader, item_loader), Item('new'))
+        self.assertIsNone(self.cache.lookup(VIM_INSTANCE, 'images', 'deleted', loader, item_loader))
+        self.assertIsNone(self.cache.lookup(VIM_INSTANCE, 'images', 'deleted', loader, item_loader))
+        self.assertEqual(self.cache.get_index(VIM_INSTANCE, 'images', loader), {'old': Item('old'), 'new': Item('new')})
+        self.assertEqual(fetched, ['new', 'deleted'])
+
+    def test_missing_items_are_forgotten_when_the_entry_expires(self):
+        Item = namedtuple('Item', 'extId')
+        fetched = []
+        item_loader = lambda ext_id: fetched.append(ext_id)
+        self.cache.ttls['images'] = 0.05
+        self.cache.lookup(VIM_INSTANCE, 'images', 'deleted', lambda: [Item('old')], item_loader)
+        time.sleep(0.06)
+        self.cache.lookup(VIM_INSTANCE, 'images', 'deleted', lambda: [Item('old')], item_loader)
+        self.assertEqual(fetched, ['deleted', 'deleted'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import threading
+import time
+import unittest
+
+from openstack_vim_driver.coalescing import SingleFlight, get_request_key
+
+VIM_INSTANCE = {'id': 'vim', 'authUrl': 'http://keystone', 'tenant': 'tenant'}
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Condition not met within {} seconds'.format(timeout))
+        time.sleep(0.005)
+
+
+class SingleFlightTest(unittest.TestCase):
+    def setUp(self):
+        self.single_flight = SingleFlight()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def run_concurrently(self, function, count=2):
+        """
+        Calls single_flight.do with function from count threads, releases function once all but the first call
+        are coalesced and returns the results, the raised exceptions respectively.
+        """
+        results = [None] * count
+
+        def call(index):
+            try:
+                results[index] = self.single_flight.do('key', function)
+            except Exception as e:
+                results[index] = e
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+        threads[0].start()
+        wait_until(lambda: self.calls == 1)
+        for thread in threads[1:]:
+            thread.start()
+        wait_until(lambda: self.single_flight.coalesced_calls == count - 1)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def slow_call(self):
+        self.calls += 1
+        self.release.wait(5)
+        return ['result']
+
+    def test_concurrent_calls_are_coalesced(self):
+        results = self.run_concurrently(self.slow_call, 3)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [['result']] * 3)
+        self.assertIs(results[0], results[1])
+
+    def test_exception_is_raised_in_all_callers(self):
+        def failing_call():
+            self.slow_call()
+            raise ValueError('failed')
+
+        results = self.run_concurrently(failing_call)
+        self.assertEqual(self.calls, 1)
+        for result in results:
+            self.assertIsInstance(result, ValueError)
+
+    def test_result_is_not_cached(self):
+        self.release.set()
+        self.single_flight.do('key', self.slow_call)
+        self.single_flight.do('key', self.slow_call)
+        self.assertEqual(self.calls, 2)
+
+    def test_failed_call_is_not_cached(self):
+        with self.assertRaises(ValueError):
+            self.single_flight.do('key', lambda: int('x'))
+        self.assertEqual(self.single_flight.do('key', lambda: 1), 1)
+
+    def test_disabled(self):
+        self.single_flight.enabled = False
+        self.release.set()
+        self.single_flight.do('key', self.slow_call)
+        self.assertEqual(self.single_flight.coalesced_calls, 0)
+
+
+class RequestKeyTest(unittest.TestCase):
+    def test_filters_are_part_of_the_key(self):
+        self.assertEqual(get_request_key(VIM_INSTANCE, 'list_ports', network_id='a', fields=['id', 'name']),
+                         get_request_key(VIM_INSTANCE, 'list_ports', fields=['id', 'name'], network_id='a'))
+        self.assertNotEqual(get_request_key(VIM_INSTANCE, 'list_ports', network_id='a'),
+                            get_request_key(VIM_INSTANCE, 'list_ports', network_id='b'))
+        self.assertNotEqual(get_request_key(VIM_INSTANCE, 'list_ports'),
+                            get_request_key(dict(VIM_INSTANCE, tenant='other'), 'list_ports'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import threading
+import time
+import unittest
+
+from openstack_vim_driver.concurrency import map_concurrently, run_concurrently
+
+
+class RunConcurrentlyTest(unittest.TestCase):
+    def test_results(self):
+        self.assertEqual(run_concurrently({'a': lambda: 1, 'b': lambda: 2}), {'a': 1, 'b': 2})
+
+    def test_exception_is_propagated(self):
+        def fail():
+            raise ValueError('failed')
+
+        with self.assertRaisesRegex(ValueError, 'failed'):
+            run_concurrently({'a': lambda: time.sleep(0.5), 'b': fail})
+
+    def test_timeout(self):
+        release = threading.Event()
+        try:
+            with self.assertRaisesRegex(Exception, 'Timeout: slow'):
+                run_concurrently({'slow': lambda: release.wait(5), 'fast': lambda: 1}, timeout=0.2)
+        finally:
+            release.set()
+
+    def test_queued_calls_get_their_own_timeout(self):
+        # with one worker the calls run one after the other, together they take longer than the timeout
+        calls = {i: (lambda i=i: time.sleep(0.15) or i) for i in range(4)}
+        self.assertEqual(run_concurrently(calls, max_workers=1, timeout=0.4), {0: 0, 1: 1, 2: 2, 3: 3})
+
+    def test_calls_run_in_parallel(self):
+        barrier = threading.Barrier(3, timeout=5)
+        self.assertEqual(len(run_concurrently({i: barrier.wait for i in range(3)}, max_workers=3)), 3)
+
+
+class MapConcurrentlyTest(unittest.TestCase):
+    def test_exceptions_are_returned(self):
+        outcomes = map_concurrently(lambda x: 10 // x, [1, 0, 5])
+        self.assertEqual(outcomes[0], (10, None))
+        self.assertIsInstance(outcomes[1][1], ZeroDivisionError)
+        self.assertEqual(outcomes[2], (2, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+
+from openstack_vim_driver.delta_refresh import CollectionSnapshot, RefreshSnapshots
+
+VIM_INSTANCE = {'id': 'vim', 'authUrl': 'http://keystone', 'tenant': 'tenant'}
+
+
+def item(item_id, updated_at, name=None):
+    return {'id': item_id, 'updated_at': updated_at, 'name': name or item_id}
+
+
+class CollectionSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.snapshot = CollectionSnapshot()
+        self.snapshot.replace([item('a', '2020-01-01T00:00:00Z'), item('b', '2020-01-02T00:00:00Z')])
+
+    def test_replace(self):
+        self.assertEqual(self.snapshot.since, '2020-01-02T00:00:00Z')
+        self.assertTrue(self.snapshot.delta_supported)
+        self.assertFalse(self.snapshot.needs_full_listing(3600))
+        self.assertTrue(self.snapshot.needs_full_listing(0))
+
+    def test_merge(self):
+        self.snapshot.merge([item('a', '2020-01-03T00:00:00Z', 'renamed'), item('c', '2020-01-02T12:00:00Z')])
+        self.assertEqual([(i['id'], i['name']) for i in self.snapshot.values()], [('a', 'renamed'), ('b', 'b'),
+                                                                                   ('c', 'c')])
+        self.assertEqual(self.snapshot.since, '2020-01-03T00:00:00Z')
+
+    def test_merge_nothing_changed(self):
+        self.snapshot.merge([])
+        self.assertEqual(len(self.snapshot.values()), 2)
+        self.assertEqual(self.snapshot.since, '2020-01-02T00:00:00Z')
+
+    def test_merge_ignored_filter_replaces_snapshot(self):
+        # the result contains a resource which did not change since the last listing, so it is a full listing
+        self.snapshot.merge([item('b', '2020-01-02T00:00:00Z'), item('a', '2019-12-31T00:00:00Z')])
+        self.assertEqual(sorted(i['id'] for i in self.snapshot.values()), ['a', 'b'])
+        self.assertEqual(self.snapshot.values()[0]['id'], 'b')
+
+    def test_merge_without_timestamps_disables_delta(self):
+        self.snapshot.merge([{'id': 'c'}])
+        self.assertEqual([i['id'] for i in self.snapshot.values()], ['c'])
+        self.assertFalse(self.snapshot.delta_supported)
+        self.assertTrue(self.snapshot.needs_full_listing(3600))
+
+
+class RefreshSnapshotsTest(unittest.TestCase):
+    def setUp(self):
+        self.snapshots = RefreshSnapshots()
+        self.calls = []
+        self.items = [item('a', '2020-01-01T00:00:00Z')]
+
+    def list_items(self, since):
+        self.calls.append(since)
+        return [i for i in self.items if since is None or i['updated_at'] >= since]
+
+    def test_refresh_lists_changes_only(self):
+        self.snapshots.refresh(VIM_INSTANCE, 'images', self.list_items)
+        self.items.append(item('b', '2020-01-02T00:00:00Z'))
+        result = self.snapshots.refresh(VIM_INSTANCE, 'images', self.list_items)
+        self.assertEqual([i['id'] for i in result], ['a', 'b'])
+        self.assertEqual(self.calls, [None, '2020-01-01T00:00:00Z'])
+
+    def test_failing_delta_listing_falls_back_to_full_listings(self):
+        self.snapshots.refresh(VIM_INSTANCE, 'images', self.list_items)
+
+        def list_items(since):
+            if since is not None:
+                raise Exception('changes-since is not supported')
+            return self.list_items(since)
+
+        self.assertEqual(len(self.snapshots.refresh(VIM_INSTANCE, 'images', list_items)), 1)
+        self.snapshots.refresh(VIM_INSTANCE, 'images', self.list_items)
+        self.assertEqual(self.calls, [None, None, None])
+
+    def test_invalidate_forces_full_listing(self):
+        self.snapshots.refresh(VIM_INSTANCE, 'images', self.list_items)
+        self.snapshots.invalidate(VIM_INSTANCE)
+        self.snapshots.refresh(VIM_INSTANCE, 'images', self.list_items)
+        self.assertEqual(self.calls, [None, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import threading
+import time
+import unittest
+
+from openstack_vim_driver.floating_ips import FloatingIpClaims, FloatingIpPool, FloatingIpPoolRegistry
+
+VIM_INSTANCE = {'id': 'vim', 'authUrl': 'http://keystone', 'tenant': 'tenant'}
+
+
+class FakeNeutronClient(object):
+    def __init__(self):
+        self.created = []
+        self.lock = threading.Lock()
+
+    def create_floatingip(self, body):
+        with self.lock:
+            fip = {'id': 'fip-{}'.format(len(self.created)),
+                   'floating_network_id': body.get('floatingip').get('floating_network_id'),
+                   'floating_ip_address': '172.16.0.{}'.format(len(self.created))}
+            self.created.append(fip)
+        return {'floatingip': fip}
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Condition not met within {} seconds'.format(timeout))
+        time.sleep(0.005)
+
+
+class FloatingIpClaimsTest(unittest.TestCase):
+    def test_claim_is_exclusive_until_released(self):
+        claims = FloatingIpClaims()
+        self.assertTrue(claims.claim('fip-0'))
+        self.assertFalse(claims.claim('fip-0'))
+        claims.release('fip-0')
+        self.assertTrue(claims.claim('fip-0'))
+
+    def test_claim_expires_after_ttl(self):
+        claims = FloatingIpClaims(ttl=0.05)
+        self.assertTrue(claims.claim('fip-0'))
+        self.assertFalse(claims.claim('fip-0'))
+        time.sleep(0.06)
+        self.assertTrue(claims.claim('fip-0'))
+
+
+class FloatingIpPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.neutron = FakeNeutronClient()
+
+    def filled_pool(self, low_watermark, high_watermark):
+        pool = FloatingIpPool('public', lambda: self.neutron, low_watermark, high_watermark)
+        pool.replenish()
+        wait_for(lambda: len(self.neutron.created) >= high_watermark and pool.contains(
+            self.neutron.created[-1].get('id')))
+        return pool
+
+    def test_refill_respects_watermarks(self):
+        pool = self.filled_pool(2, 5)
+        self.assertEqual(len(self.neutron.created), 5)
+        for _ in range(3):
+            self.assertIsNotNone(pool.take())
+        # two floating IPs are left, which is not below the low watermark
+        time.sleep(0.05)
+        self.assertEqual(len(self.neutron.created), 5)
+        pool.take()
+        wait_for(lambda: len(self.neutron.created) == 9 and pool.contains('fip-8'))
+        time.sleep(0.05)
+        self.assertEqual(len(self.neutron.created), 9)
+
+    def test_take_skips_claimed_floating_ips(self):
+        pool = self.filled_pool(0, 2)
+        claims = FloatingIpClaims()
+        claims.claim('fip-0')
+        self.assertEqual(pool.take(claims).get('id'), 'fip-1')
+        self.assertFalse(pool.contains('fip-0'))
+        self.assertFalse(claims.claim('fip-1'))
+
+    def test_concurrent_take_hands_out_every_floating_ip_once(self):
+        pool = self.filled_pool(10, 40)
+        claims = FloatingIpClaims()
+        taken = []
+        taken_lock = threading.Lock()
+        start = threading.Event()
+
+        def take_many():
+            start.wait(5)
+            for _ in range(20):
+                fip = pool.take(claims)
+                if fip is not None:
+                    with taken_lock:
+                        taken.append(fip.get('id'))
+
+        threads = [threading.Thread(target=take_many) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertGreaterEqual(len(taken), 40)
+        self.assertEqual(len(taken), len(set(taken)))
+        self.assertTrue(set(taken) <= {fip.get('id') for fip in self.neutron.created})
+
+
+class FloatingIpPoolRegistryTest(unittest.TestCase):
+    def test_disabled_without_high_watermark(self):
+        registry = FloatingIpPoolRegistry()
+        self.assertIsNone(registry.get_pool(VIM_INSTANCE, 'public', FakeNeutronClient))
+
+    def test_reserved_floating_ips(self):
+        neutron = FakeNeutronClient()
+        registry = FloatingIpPoolRegistry(low_watermark=1, high_watermark=2)
+        pool = registry.get_pool(VIM_INSTANCE, 'public', lambda: neutron)
+        self.assertIs(registry.get_pool(VIM_INSTANCE, 'public', lambda: neutron), pool)
+        wait_for(lambda: len(neutron.created) == 2 and pool.contains('fip-1'))
+        self.assertTrue(registry.is_reserved('fip-0'))
+        pool.take()
+        self.assertFalse(registry.is_reserved('fip-0'))
+
+
+if __name__ == '__main__':
+    unittest.main()
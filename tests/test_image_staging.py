@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from openstack_vim_driver.image_staging import ImageStagingCache
+
+
+class FakeImageRepository(ThreadingMixIn, HTTPServer):
+    """
+    Serves the image files of a dictionary mapping the paths to their content and ETag and counts the requests.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), _ImageRepositoryHandler)
+        self.files = {}
+        self.requests = []
+        self.thread = threading.Thread(target=self.serve_forever, args=(0.05,))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def url(self, path):
+        return 'http://127.0.0.1:{}{}'.format(self.server_address[1], path)
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _ImageRepositoryHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        self.server.requests.append((self.path, self.headers.get('If-None-Match')))
+        if path not in self.server.files:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        content, etag = self.server.files[path]
+        if etag is not None and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(content)))
+        if etag is not None:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ImageStagingCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.repository = FakeImageRepository()
+        self.directory = tempfile.mkdtemp()
+        self.staging = ImageStagingCache(self.directory, max_size=10, ttl=3600)
+
+    def tearDown(self):
+        self.repository.stop()
+        shutil.rmtree(self.directory)
+
+    def read(self, path, params=None):
+        staged_file = self.staging.open(self.repository.url(path), params, timeout=5)
+        self.assertIsNotNone(staged_file)
+        with staged_file:
+            return b''.join(staged_file.iter_chunks(chunk_size=4, stall_timeout=5)), staged_file._entry.path
+
+    def test_staged_file_is_reused_after_revalidation(self):
+        self.repository.files['/a'] = (b'123456', '"a1"')
+        content, path = self.read('/a')
+        self.assertEqual(content, b'123456')
+        content, reused_path = self.read('/a')
+        self.assertEqual(content, b'123456')
+        self.assertEqual(reused_path, path)
+        self.assertEqual(self.repository.requests, [('/a', None), ('/a', '"a1"')])
+
+    def test_changed_file_is_downloaded_again(self):
+        self.repository.files['/a'] = (b'123456', '"a1"')
+        self.read('/a')
+        self.repository.files['/a'] = (b'654321', '"a2"')
+        content, _ = self.read('/a')
+        self.assertEqual(content, b'654321')
+
+    def test_file_without_validator_is_not_reused(self):
+        self.repository.files['/a'] = (b'123456', None)
+        _, path = self.read('/a')
+        _, other_path = self.read('/a')
+        self.assertNotEqual(other_path, path)
+        self.assertEqual(len(self.repository.requests), 2)
+
+    def test_params_are_part_of_the_key(self):
+        self.repository.files['/a'] = (b'123', '"a1"')
+        self.read('/a', {'token': 'x'})
+        self.read('/a', {'token': 'y'})
+        self.assertEqual([request[1] for request in self.repository.requests], [None, None])
+
+    def test_least_recently_used_file_is_evicted(self):
+        self.repository.files['/a'] = (b'123456', '"a1"')
+        self.repository.files['/b'] = (b'abcdef', '"b1"')
+        _, path_a = self.read('/a')
+        _, path_b = self.read('/b')
+        self.assertFalse(os.path.exists(path_a))
+        self.assertTrue(os.path.exists(path_b))
+
+    def test_files_in_use_count_against_max_size(self):
+        self.repository.files['/a'] = (b'1234567890', '"a1"')
+        self.repository.files['/b'] = (b'abc', '"b1"')
+        with self.staging.open(self.repository.url('/a'), timeout=5) as staged_file:
+            self.assertIsNone(self.staging.open(self.repository.url('/b'), timeout=5))
+            self.assertEqual(b''.join(staged_file.iter_chunks(stall_timeout=5)), b'1234567890')
+
+    def test_download_error_is_raised(self):
+        with self.assertRaises(Exception):
+            self.staging.open(self.repository.url('/missing'), timeout=5)
+
+    def test_disabled(self):
+        self.staging.max_size = 0
+        self.assertIsNone(self.staging.open(self.repository.url('/a'), timeout=5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import hashlib
+import threading
+import unittest
+
+from openstack_vim_driver.image_transfer import ImageChecksumRegistry, ImageStream, get_content_md5
+
+DATA = bytes(range(256)) * 1000
+
+
+def chunked(data, chunk_size=4096):
+    for offset in range(0, len(data), chunk_size):
+        yield data[offset:offset + chunk_size]
+
+
+class ImageStreamTest(unittest.TestCase):
+    def test_read_and_checksum(self):
+        stream = ImageStream(chunked(DATA), 'image', expected_size=len(DATA), buffer_chunks=2)
+        parts = []
+        while True:
+            part = stream.read(1000)
+            if len(part) == 0:
+                break
+            self.assertLessEqual(len(part), 1000)
+            parts.append(part)
+        self.assertEqual(b''.join(parts), DATA)
+        self.assertEqual(stream.checksum, hashlib.md5(DATA).hexdigest())
+        stream.verify(hashlib.md5(DATA).hexdigest())
+
+    def test_read_all(self):
+        stream = ImageStream(chunked(DATA), 'image')
+        self.assertEqual(stream.read(), DATA)
+        self.assertEqual(stream.read(), b'')
+        self.assertEqual(stream.bytes_read, len(DATA))
+
+    def test_verify_fails_on_checksum_mismatch(self):
+        stream = ImageStream(chunked(DATA), 'image')
+        stream.read()
+        with self.assertRaisesRegex(Exception, 'checksum'):
+            stream.verify('0' * 32)
+
+    def test_verify_fails_on_missing_bytes(self):
+        stream = ImageStream(chunked(DATA), 'image', expected_size=len(DATA) + 1)
+        stream.read()
+        with self.assertRaisesRegex(Exception, 'expected'):
+            stream.verify()
+
+    def test_verify_fails_if_not_read_completely(self):
+        stream = ImageStream(chunked(DATA), 'image')
+        stream.read(10)
+        with self.assertRaisesRegex(Exception, 'not been read completely'):
+            stream.verify()
+        stream.close()
+
+    def test_download_error_is_raised(self):
+        def failing_chunks():
+            yield DATA[:10]
+            raise IOError('connection reset')
+
+        stream = ImageStream(failing_chunks(), 'image')
+        with self.assertRaisesRegex(IOError, 'connection reset'):
+            stream.read()
+
+    def test_stall_timeout(self):
+        release = threading.Event()
+
+        def stalled_chunks():
+            yield DATA[:10]
+            release.wait(10)
+
+        stream = ImageStream(stalled_chunks(), 'image', stall_timeout=1)
+        self.assertEqual(stream.read(10), DATA[:10])
+        try:
+            with self.assertRaisesRegex(Exception, 'Timeout'):
+                stream.read()
+        finally:
+            release.set()
+            stream.close()
+
+
+class ImageChecksumRegistryTest(unittest.TestCase):
+    def test_lookup_requires_same_validator(self):
+        registry = ImageChecksumRegistry()
+        registry.record('http://repo/image', ('etag', None, '10'), 'checksum')
+        self.assertEqual(registry.lookup('http://repo/image', ('etag', None, '10')), 'checksum')
+        self.assertIsNone(registry.lookup('http://repo/image', ('other', None, '10')))
+        self.assertIsNone(registry.lookup('http://repo/image', None))
+
+    def test_max_entries(self):
+        registry = ImageChecksumRegistry(max_entries=2)
+        for url in ('a', 'b', 'c'):
+            registry.record(url, ('etag', None, None), url)
+        self.assertIsNone(registry.lookup('a', ('etag', None, None)))
+        self.assertEqual(registry.lookup('c', ('etag', None, None)), 'c')
+
+
+class ContentMd5Test(unittest.TestCase):
+    def test_get_content_md5(self):
+        self.assertEqual(get_content_md5({'Content-MD5': 'XUFAKrxLKna5cZ2REBfFkg=='}),
+                         '5d41402abc4b2a76b9719d911017c592')
+        self.assertIsNone(get_content_md5({'Content-MD5': '***'}))
+        self.assertIsNone(get_content_md5({'Content-MD5': 'aGVsbG8='}))
+        self.assertIsNone(get_content_md5({}))
+
+
+if __name__ == '__main__':
+    unittest.main()
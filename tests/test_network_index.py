@@ -0,0 +1,66 @@
+import unittest
+
+from openstack_vim_driver.network_index import RouterTopology, SubnetIndex
+
+
+class SubnetIndexTest(unittest.TestCase):
+    def test_find_subnet_id(self):
+        index = SubnetIndex([{'id': 'a', 'cidr': '10.0.0.0/24'}, {'id': 'b', 'cidr': '10.0.1.0/24'}])
+        self.assertEqual(index.find_subnet_id('10.0.0.5'), 'a')
+        self.assertEqual(index.find_subnet_id('10.0.1.254'), 'b')
+        self.assertIsNone(index.find_subnet_id('10.0.2.1'))
+
+    def test_network_and_broadcast_addresses_are_no_host_addresses(self):
+        index = SubnetIndex([{'id': 'a', 'cidr': '10.0.0.0/24'}])
+        self.assertIsNone(index.find_subnet_id('10.0.0.0'))
+        self.assertIsNone(index.find_subnet_id('10.0.0.255'))
+
+    def test_point_to_point_subnet(self):
+        index = SubnetIndex([{'id': 'a', 'cidr': '10.0.0.0/31'}])
+        self.assertEqual(index.find_subnet_id('10.0.0.0'), 'a')
+        self.assertEqual(index.find_subnet_id('10.0.0.1'), 'a')
+
+    def test_most_specific_subnet_is_preferred(self):
+        index = SubnetIndex([{'id': 'wide', 'cidr': '10.0.0.0/16'}, {'id': 'narrow', 'cidr': '10.0.3.0/24'}])
+        self.assertEqual(index.find_subnet_id('10.0.3.7'), 'narrow')
+        self.assertEqual(index.find_subnet_id('10.0.4.7'), 'wide')
+
+    def test_ipv6(self):
+        index = SubnetIndex([{'id': 'v4', 'cidr': '10.0.0.0/24'}, {'id': 'v6', 'cidr': 'fd00::/64'}])
+        self.assertEqual(index.find_subnet_id('fd00::5'), 'v6')
+        self.assertIsNone(index.find_subnet_id('fd00::'))
+        self.assertIsNone(index.find_subnet_id('fd01::5'))
+
+    def test_invalid_cidr_is_ignored(self):
+        index = SubnetIndex([{'id': 'invalid', 'cidr': 'not-a-cidr'}, {'id': 'a', 'cidr': '10.0.0.0/24'}])
+        self.assertEqual(index.find_subnet_id('10.0.0.5'), 'a')
+
+
+class RouterTopologyTest(unittest.TestCase):
+    def setUp(self):
+        routers = [{'id': 'r1', 'external_gateway_info': {'network_id': 'ext1'}},
+                   {'id': 'r2', 'external_gateway_info': {'network_id': 'ext2'}},
+                   {'id': 'r3', 'external_gateway_info': {'network_id': 'ext1'}},
+                   {'id': 'internal', 'external_gateway_info': None}]
+        router_ports = [{'device_id': 'r1', 'network_id': 'net1'},
+                        {'device_id': 'r2', 'network_id': 'net1'},
+                        {'device_id': 'r3', 'network_id': 'net1'},
+                        {'device_id': 'r1', 'network_id': 'net2'},
+                        {'device_id': 'internal', 'network_id': 'net3'}]
+        self.topology = RouterTopology(routers, router_ports)
+
+    def test_find_external_network_ids(self):
+        self.assertEqual(self.topology.find_external_network_ids('net1'), ['ext1', 'ext2'])
+        self.assertEqual(self.topology.find_external_network_ids('net2'), ['ext1'])
+
+    def test_network_without_gateway(self):
+        self.assertEqual(self.topology.find_external_network_ids('net3'), [])
+        self.assertEqual(self.topology.find_external_network_ids('unknown'), [])
+
+    def test_result_is_a_copy(self):
+        self.topology.find_external_network_ids('net2').append('ext2')
+        self.assertEqual(self.topology.find_external_network_ids('net2'), ['ext1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
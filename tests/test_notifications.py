@@ -0,0 +1,227 @@
+import json
+import threading
+import time
+import types
+import unittest
+from unittest import mock
+
+import pika.exceptions
+
+from openstack_vim_driver import notifications
+from openstack_vim_driver.notifications import NovaNotificationListener, parse_nova_notification
+from openstack_vim_driver.server_waiter import ServerWaiterRegistry
+from tests.test_server_waiter import FakeNovaClient, FakeServer, VIM_INSTANCE
+
+
+def versioned_notification(event_type, server_id, state=None):
+    data = {'uuid': server_id}
+    if state is not None:
+        data['state'] = state
+    message = {'event_type': event_type, 'publisher_id': 'nova-compute:compute-0',
+               'payload': {'nova_object.name': 'InstanceActionPayload', 'nova_object.data': data}}
+    return json.dumps({'oslo.version': '2.0', 'oslo.message': json.dumps(message)}).encode('utf-8')
+
+
+def legacy_notification(event_type, server_id, state=None):
+    payload = {'instance_id': server_id}
+    if state is not None:
+        payload['state'] = state
+    return json.dumps({'event_type': event_type, 'publisher_id': 'compute.compute-0', 'payload': payload})
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Condition not met within {} seconds'.format(timeout))
+        time.sleep(0.005)
+
+
+class FakeBroker(object):
+    """
+    In-process stand-in for RabbitMQ providing the part of pika's BlockingConnection used by the listener.
+    Messages published to an exchange are delivered to the queues bound to it with the same routing key.
+    """
+
+    def __init__(self):
+        self.available = True
+        self.bindings = []
+        self.queues = {}
+        self.acked = []
+        self.connections = 0
+        self.condition = threading.Condition()
+
+    def connect(self, parameters):
+        with self.condition:
+            if not self.available:
+                raise pika.exceptions.AMQPConnectionError('The broker is not available')
+            self.connections += 1
+        return FakeConnection(self)
+
+    def publish(self, exchange, routing_key, body):
+        with self.condition:
+            for bound_exchange, bound_key, queue in self.bindings:
+                if (bound_exchange, bound_key) == (exchange, routing_key):
+                    self.queues.get(queue).append(body)
+            self.condition.notify_all()
+
+    def is_bound(self, routing_key):
+        with self.condition:
+            return any(key == routing_key for _, key, _ in self.bindings)
+
+
+class FakeConnection(object):
+    def __init__(self, broker):
+        self.broker = broker
+        self.queues = []
+
+    def channel(self):
+        return FakeChannel(self)
+
+    def close(self):
+        # the exclusive queues are removed together with their connection
+        with self.broker.condition:
+            for queue in self.queues:
+                self.broker.queues.pop(queue, None)
+            self.broker.bindings = [b for b in self.broker.bindings if b[2] not in self.queues]
+
+
+class FakeChannel(object):
+    def __init__(self, connection):
+        self.connection = connection
+        self.broker = connection.broker
+
+    def queue_declare(self, queue='', exclusive=False, auto_delete=False):
+        with self.broker.condition:
+            queue = queue or 'amq.gen-{}'.format(len(self.broker.queues))
+            self.broker.queues[queue] = []
+            self.connection.queues.append(queue)
+        return types.SimpleNamespace(method=types.SimpleNamespace(queue=queue))
+
+    def queue_bind(self, queue, exchange, routing_key=None):
+        with self.broker.condition:
+            self.broker.bindings.append((exchange, routing_key, queue))
+
+    def consume(self, queue, inactivity_timeout=None):
+        delivery_tag = 0
+        while True:
+            with self.broker.condition:
+                messages = self.broker.queues.get(queue)
+                if messages is None:
+                    raise pika.exceptions.ConnectionClosed(320, 'The broker closed the connection')
+                if len(messages) == 0:
+                    # returning early is harmless and lets stopped listeners finish quickly
+                    self.broker.condition.wait(min(inactivity_timeout or 0.05, 0.05))
+                body = messages.pop(0) if len(messages) > 0 else None
+            if body is None:
+                yield None, None, None
+            else:
+                delivery_tag += 1
+                yield types.SimpleNamespace(delivery_tag=delivery_tag), None, body
+
+    def basic_ack(self, delivery_tag):
+        with self.broker.condition:
+            self.broker.acked.append(delivery_tag)
+
+
+class ParseNovaNotificationTest(unittest.TestCase):
+    def test_versioned(self):
+        self.assertEqual(parse_nova_notification(versioned_notification('instance.update', '1', 'ACTIVE')),
+                         ('1', 'active'))
+        self.assertEqual(parse_nova_notification(versioned_notification('instance.delete.end', '1')), ('1', 'deleted'))
+
+    def test_legacy(self):
+        self.assertEqual(parse_nova_notification(legacy_notification('compute.instance.create.end', '1', 'active')),
+                         ('1', 'active'))
+        self.assertEqual(parse_nova_notification(legacy_notification('compute.instance.delete.end', '1', 'active')),
+                         ('1', 'deleted'))
+
+    def test_unrelated_events(self):
+        self.assertIsNone(parse_nova_notification(versioned_notification('instance.shutdown.start', '1', 'ACTIVE')))
+        self.assertIsNone(parse_nova_notification(legacy_notification('volume.create.end', '1', 'available')))
+        self.assertIsNone(parse_nova_notification(legacy_notification('compute.instance.update', None, 'active')))
+        self.assertIsNone(parse_nova_notification(versioned_notification('instance.update', '1')))
+
+    def test_bad_messages(self):
+        with self.assertRaises(ValueError):
+            parse_nova_notification(b'not json')
+        with self.assertRaises(ValueError):
+            parse_nova_notification(json.dumps({'oslo.message': '{'}))
+
+
+class NovaNotificationListenerTest(unittest.TestCase):
+    def setUp(self):
+        self.broker = FakeBroker()
+        patcher = mock.patch.object(notifications.pika, 'BlockingConnection', self.broker.connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        delay_patcher = mock.patch.object(notifications, 'RECONNECT_DELAY', 0.01)
+        delay_patcher.start()
+        self.addCleanup(delay_patcher.stop)
+        self.received = []
+
+    def start_listener(self, handler=None, routing_key='versioned_notifications.info'):
+        listener = NovaNotificationListener(handler or (lambda *vm_state: self.received.append(vm_state)),
+                                            routing_key=routing_key)
+        listener.start()
+        self.addCleanup(listener.join, 5)
+        self.addCleanup(listener.stop)
+        if not self.broker.available:
+            time.sleep(0.05)
+            self.assertEqual(self.broker.connections, 0)
+            return listener
+        for key in routing_key.split(','):
+            wait_for(lambda: self.broker.is_bound(key))
+        return listener
+
+    def test_state_changes_are_passed_to_the_handler(self):
+        self.start_listener(routing_key='versioned_notifications.info,notifications.info')
+        self.broker.publish('nova', 'versioned_notifications.info', b'not json')
+        self.broker.publish('nova', 'versioned_notifications.info',
+                            versioned_notification('instance.shutdown.start', '1', 'ACTIVE'))
+        self.broker.publish('nova', 'versioned_notifications.error',
+                            versioned_notification('instance.update', '2', 'ERROR'))
+        self.broker.publish('nova', 'versioned_notifications.info',
+                            versioned_notification('instance.update', '1', 'ACTIVE'))
+        self.broker.publish('nova', 'notifications.info', legacy_notification('compute.instance.delete.end', '3'))
+        wait_for(lambda: len(self.received) == 2)
+        self.assertEqual(self.received, [('1', 'active'), ('3', 'deleted')])
+        # the messages which are ignored are acknowledged as well
+        wait_for(lambda: len(self.broker.acked) == 4)
+
+    def test_reconnects_when_the_broker_is_back(self):
+        self.broker.available = False
+        self.start_listener()
+        self.broker.available = True
+        wait_for(lambda: self.broker.is_bound('versioned_notifications.info'))
+        self.broker.publish('nova', 'versioned_notifications.info', versioned_notification('instance.update', '1',
+                                                                                            'ACTIVE'))
+        wait_for(lambda: self.received == [('1', 'active')])
+
+    def test_notification_ends_wait_early(self):
+        registry = ServerWaiterRegistry(min_interval=0.01, max_interval=0.05, poll_delay=60)
+        self.start_listener(handler=registry.notify)
+        nova_client = FakeNovaClient({'1': 'BUILD'})
+        future = registry.get_waiter(VIM_INSTANCE).wait(FakeServer('1', 'BUILD'), lambda: nova_client, timeout=10)
+        with nova_client.servers.lock:
+            nova_client.servers.statuses['1'] = 'ACTIVE'
+        self.broker.publish('nova', 'versioned_notifications.info',
+                            versioned_notification('instance.update', '1', 'ACTIVE'))
+        self.assertEqual(future.result(5).status, 'ACTIVE')
+        # the server was fetched on its own instead of being polled
+        self.assertEqual(nova_client.servers.list_calls, 0)
+
+    def test_waiter_polls_while_the_listener_is_down(self):
+        self.broker.available = False
+        registry = ServerWaiterRegistry(min_interval=0.01, max_interval=0.05, poll_delay=0.1)
+        self.start_listener(handler=registry.notify)
+        nova_client = FakeNovaClient({'1': 'BUILD'})
+        future = registry.get_waiter(VIM_INSTANCE).wait(FakeServer('1', 'BUILD'), lambda: nova_client, timeout=10)
+        with nova_client.servers.lock:
+            nova_client.servers.statuses['1'] = 'ACTIVE'
+        self.assertEqual(future.result(5).status, 'ACTIVE')
+        self.assertGreaterEqual(nova_client.servers.list_calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
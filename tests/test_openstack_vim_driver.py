@@ -0,0 +1,225 @@
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmarks.fake_openstack import FakeOpenStack, _Conflict
+from openstack_vim_driver import openstack_vim_driver as driver_module
+from tests.test_image_staging import FakeImageRepository
+
+logging.getLogger('neutronclient').setLevel(logging.ERROR)
+
+
+class DriverTestCase(unittest.TestCase):
+    """
+    Runs the VIM driver against a fake OpenStack with two networks attached to a router with an external gateway.
+    """
+
+    def setUp(self):
+        driver_module.OpenstackVimDriver.configure(wait_poll_interval_min=0.05, wait_poll_interval_max=0.1)
+        self.fake = FakeOpenStack(server_build_time=0.1, server_delete_time=0.1).start()
+        self.addCleanup(self.fake.stop)
+        self.fake.populate(networks=2, images=1, flavors=1, keypairs=1)
+        self.vim_instance = self.fake.vim_instance()
+        self.driver = driver_module.OpenstackVimDriver(wait_for_vm=5)
+
+    def network_id(self, name):
+        return next(n.get('id') for n in self.fake.networks.values() if n.get('name') == name)
+
+
+class CoalescingTest(DriverTestCase):
+    def tearDown(self):
+        driver_module.OpenstackVimDriver.configure()
+
+    def test_catalog_misses_follow_coalesce_requests(self):
+        self.assertIs(driver_module.catalog_cache.single_flight, driver_module.single_flight)
+        driver_module.OpenstackVimDriver.configure(coalesce_requests=False)
+        self.assertFalse(driver_module.catalog_cache.single_flight.enabled)
+
+    def test_get_network_by_id_finds_new_network(self):
+        self.driver.list_networks(self.vim_instance)
+        network = self.fake.create_network('new')
+        self.fake.create_subnet(network.get('id'), 'new-subnet', '192.168.7.0/24')
+        self.fake.reset_call_counts()
+        found = self.driver.get_network_by_id(self.vim_instance, network.get('id'))
+        self.assertEqual(found.name, 'new')
+        self.assertEqual([subnet.cidr for subnet in found.subnets], ['192.168.7.0/24'])
+        self.assertNotIn('network GET /network/v2.0/networks', self.fake.call_counts())
+
+    def test_get_network_by_id_not_found(self):
+        self.assertIsNone(self.driver.get_network_by_id(self.vim_instance, 'missing'))
+
+
+class ListServerTest(DriverTestCase):
+    def test_missing_image_does_not_reload_the_catalog(self):
+        flavor_id = next(iter(self.fake.flavors))
+        network_ids = [self.network_id('net-0')]
+        self.fake.create_server_with_ports('orphan', 'deleted-image', flavor_id, network_ids)
+        self.driver.list_server(self.vim_instance)
+        new_image = self.fake.create_image('new-image')
+        self.fake.create_server_with_ports('new', new_image.get('id'), flavor_id, network_ids)
+        self.fake.reset_call_counts()
+        for _ in range(2):
+            servers = {server.name: server for server in self.driver.list_server(self.vim_instance)}
+            self.assertIsNone(servers.get('orphan').image)
+            self.assertEqual(servers.get('new').image.name, 'new-image')
+            self.assertEqual(servers.get('new').flavor.extId, flavor_id)
+        call_counts = self.fake.call_counts()
+        self.assertNotIn('image GET /image/v2/images', call_counts)
+        self.assertNotIn('compute GET /compute/v2.1/flavors/detail', call_counts)
+        # the new image is fetched once, the deleted one is remembered since the first listing
+        self.assertEqual(call_counts.get('image GET /image/v2/images/{id}'), 1)
+
+
+class LaunchInstancesTest(DriverTestCase):
+    def instance(self, name, image='image-0', network='net-0', floating_ip='random'):
+        connection_point = {'virtual_link_reference': network, 'interfaceId': 0, 'id': name}
+        if floating_ip is not None:
+            connection_point['floatingIp'] = floating_ip
+        return {'instance_name': name, 'image': image, 'flavor': 'm1.flavor-0', 'key_pair': 'key-0',
+                'networks': [connection_point], 'security_groups': ['default'], 'user_data': ''}
+
+    def ports_of(self, name):
+        return [p for p in self.fake.ports.values() if p.get('name') == 'VNFD-{}'.format(name)]
+
+    def test_failing_instances_are_reported_and_cleaned_up(self):
+        create_server = self.fake.create_server
+
+        def failing_create_server(name, image_id, flavor_id, port_ids, status='BUILD'):
+            if name == 'no-host':
+                raise _Conflict('No valid host was found')
+            return create_server(name, image_id, flavor_id, port_ids, status='ERROR' if name == 'error' else status)
+
+        self.fake.create_server = failing_create_server
+        instances = [self.instance('ok'), self.instance('no-image', image='missing'),
+                     self.instance('no-network', network='missing'), self.instance('no-host'), self.instance('error')]
+        results = self.driver.launch_instances_and_wait(self.vim_instance, instances)
+
+        self.assertEqual([r.get('instanceName') for r in results], ['ok', 'no-image', 'no-network', 'no-host', 'error'])
+        self.assertEqual(results[0].get('server').get('status'), 'ACTIVE')
+        self.assertEqual(len(results[0].get('server').get('floatingIps')), 1)
+        messages = [r.get('exception', {}).get('detailMessage') for r in results]
+        self.assertIsNone(messages[0])
+        self.assertIn('Not found image missing', messages[1])
+        self.assertIn('Unable to find network with name missing', messages[2])
+        self.assertIn('No valid host', messages[3])
+        self.assertIn('VM error is in error state', messages[4])
+        # the ports and floating IPs created for the VM which Nova refused are removed again
+        self.assertEqual(self.ports_of('no-host'), [])
+        self.assertEqual(sorted((fip.get('port_id') for fip in self.fake.floatingips.values()), key=str),
+                         sorted(p.get('id') for name in ('ok', 'error') for p in self.ports_of(name)))
+
+    def test_existing_floating_ip_is_kept_on_failure(self):
+        fip = self.fake.create_floatingip(self.fake.public_network_id)
+
+        def failing_create_server(*args, **kwargs):
+            raise _Conflict('No valid host was found')
+
+        self.fake.create_server = failing_create_server
+        results = self.driver.launch_instances_and_wait(
+            self.vim_instance, [self.instance('no-host', floating_ip=fip.get('floating_ip_address'))])
+        self.assertIn('No valid host', results[0].get('exception').get('detailMessage'))
+        self.assertEqual(self.ports_of('no-host'), [])
+        self.assertEqual(list(self.fake.floatingips), [fip.get('id')])
+        self.assertIsNone(fip.get('port_id'))
+
+
+class DeleteServerTest(DriverTestCase):
+    def create_server(self, name):
+        flavor_id = next(iter(self.fake.flavors))
+        image_id = next(iter(self.fake.images))
+        return self.fake.create_server_with_ports(name, image_id, flavor_id, [self.network_id('net-0')],
+                                                  floating_ip=True).get('id')
+
+    def test_deletion_wait_timeout_is_logged(self):
+        ext_id = self.create_server('slow')
+        self.fake.server_delete_time = 60
+        self.driver.wait_for_vm_deletion = 0.2
+        with self.assertLogs(driver_module.log, logging.WARNING) as logs:
+            self.driver.delete_server_by_id_and_wait(self.vim_instance, ext_id)
+        self.assertIn('Deletion of VM slow', logs.output[-1])
+        self.assertEqual(self.fake.servers.get(ext_id).get('OS-EXT-STS:task_state'), 'deleting')
+        self.assertEqual([p for p in self.fake.ports.values() if p.get('device_id') == ext_id], [])
+        self.assertEqual(len(self.fake.floatingips), 0)
+
+    def test_missing_server_raises(self):
+        with self.assertRaises(Exception):
+            self.driver.delete_server_by_id_and_wait(self.vim_instance, 'missing')
+
+    def fail_deletion(self, failing_id, stuck_in_error=False):
+        delete_server = self.fake.delete_server
+
+        def failing_delete_server(server_id):
+            if server_id != failing_id:
+                return delete_server(server_id)
+            if not stuck_in_error:
+                raise _Conflict('Instance {} is locked'.format(server_id))
+            self.fake.servers.get(server_id)['status'] = 'ERROR'
+
+        self.fake.delete_server = failing_delete_server
+
+    def test_batch_delete_reports_refused_deletion(self):
+        ext_ids = [self.create_server('vm-{}'.format(i)) for i in range(3)]
+        self.fail_deletion(ext_ids[1])
+        results = self.driver.delete_servers_by_ids_and_wait(self.vim_instance, ext_ids + ['missing'])
+        self.assertEqual([r.get('extId') for r in results], ext_ids + ['missing'])
+        self.assertEqual(['exception' in r for r in results], [False, True, False, True])
+        self.assertIn('is locked', results[1].get('exception').get('detailMessage'))
+        self.assertEqual(list(self.fake.servers), [ext_ids[1]])
+        self.assertEqual([p for p in self.fake.ports.values() if p.get('device_id') in ext_ids], [])
+        self.assertEqual(len(self.fake.floatingips), 0)
+
+    def test_batch_delete_with_server_stuck_in_error(self):
+        ext_ids = [self.create_server('vm-{}'.format(i)) for i in range(3)]
+        self.fail_deletion(ext_ids[0], stuck_in_error=True)
+        self.driver.wait_for_vm_deletion = 0.5
+        with self.assertLogs(driver_module.log, logging.WARNING) as logs:
+            results = self.driver.delete_servers_by_ids_and_wait(self.vim_instance, ext_ids)
+        self.assertEqual(results, [{'extId': ext_id} for ext_id in ext_ids])
+        self.assertEqual([o for o in logs.output if 'WARNING' in o and 'vm-' in o],
+                         ['WARNING:{}:Deletion of VM vm-0 ({}) requested but not finished: Timeout: after 0.5 '
+                          'seconds the VM vm-0 is not yet deleted'.format(driver_module.log.name, ext_ids[0])])
+        self.assertEqual(list(self.fake.servers), [ext_ids[0]])
+
+
+class AddImageToVimsTest(DriverTestCase):
+    image = {'name': 'shared-image', 'containerFormat': 'bare', 'diskFormat': 'qcow2', 'isPublic': False,
+             'minDiskSpace': 0, 'minRam': 0}
+
+    def setUp(self):
+        DriverTestCase.setUp(self)
+        staging_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, staging_directory)
+        driver_module.OpenstackVimDriver.configure(image_staging_directory=staging_directory,
+                                                   image_staging_max_size=16)
+        self.addCleanup(driver_module.OpenstackVimDriver.configure)
+        self.repository = FakeImageRepository()
+        self.addCleanup(self.repository.stop)
+        self.repository.files['/image'] = (os.urandom(3 * 1048576), '"v1"')
+        self.other_fake = FakeOpenStack().start()
+        self.addCleanup(self.other_fake.stop)
+
+    def test_vims_share_one_download(self):
+        results = self.driver.add_image_to_vims([self.vim_instance, self.other_fake.vim_instance()], self.image,
+                                                self.repository.url('/image'))
+        self.assertEqual([r.get('vimInstanceId') for r in results],
+                         [self.vim_instance.get('id'), self.other_fake.vim_instance().get('id')])
+        for result, fake in zip(results, (self.fake, self.other_fake)):
+            self.assertNotIn('exception', result)
+            self.assertEqual(result.get('image').get('name'), 'shared-image')
+            self.assertIn('shared-image', [i.get('name') for i in fake.images.values()])
+        # the second upload shares the download or revalidates the staged file
+        self.assertEqual(len([r for r in self.repository.requests if r[1] is None]), 1)
+
+    def test_failing_vim_does_not_affect_the_others(self):
+        unreachable_vim_instance = dict(self.other_fake.vim_instance(), authUrl='http://127.0.0.1:1/identity/v3')
+        results = self.driver.add_image_to_vims([self.vim_instance, unreachable_vim_instance], self.image,
+                                                self.repository.url('/image'))
+        self.assertEqual(results[0].get('image').get('name'), 'shared-image')
+        self.assertNotIn('image', results[1])
+        self.assertIn('detailMessage', results[1].get('exception'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import threading
+import unittest
+
+from novaclient.exceptions import NotFound
+
+from openstack_vim_driver.server_waiter import ServerWaiter
+
+VIM_INSTANCE = {'id': 'vim', 'authUrl': 'http://keystone', 'tenant': 'tenant'}
+
+
+class FakeServer(object):
+    def __init__(self, server_id, status):
+        self.id = server_id
+        self.name = 'vm-{}'.format(server_id)
+        self.status = status
+
+
+class FakeServerManager(object):
+    """
+    Returns the servers of a dictionary mapping the server IDs to their status, servers missing in it do not exist.
+    """
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.lock = threading.Lock()
+        self.list_calls = 0
+
+    def list(self, search_opts=None, limit=None):
+        with self.lock:
+            self.list_calls += 1
+            return [FakeServer(server_id, status) for server_id, status in self.statuses.items()]
+
+    def get(self, server_id):
+        with self.lock:
+            if server_id not in self.statuses:
+                raise NotFound(404)
+            return FakeServer(server_id, self.statuses[server_id])
+
+
+class FakeNovaClient(object):
+    def __init__(self, statuses):
+        self.servers = FakeServerManager(statuses)
+
+
+class ServerWaiterTest(unittest.TestCase):
+    def setUp(self):
+        self.waiter = ServerWaiter(VIM_INSTANCE, min_interval=0.01, max_interval=0.05)
+
+    def test_active(self):
+        nova_client = FakeNovaClient({'1': 'BUILD'})
+        future = self.waiter.wait(FakeServer('1', 'BUILD'), lambda: nova_client, timeout=5)
+        with nova_client.servers.lock:
+            nova_client.servers.statuses['1'] = 'ACTIVE'
+        self.assertEqual(future.result(5).status, 'ACTIVE')
+
+    def test_error_fails_active_wait(self):
+        nova_client = FakeNovaClient({'1': 'ERROR'})
+        future = self.waiter.wait(FakeServer('1', 'BUILD'), lambda: nova_client, timeout=5)
+        with self.assertRaisesRegex(Exception, 'error state'):
+            future.result(5)
+
+    def test_error_does_not_fail_delete_wait(self):
+        nova_client = FakeNovaClient({'1': 'ERROR'})
+        future = self.waiter.wait(FakeServer('1', 'ERROR'), lambda: nova_client, timeout=5, target_status='deleted')
+        self.assertTrue(self.waiter.notify('1', 'error'))
+        while nova_client.servers.list_calls < 3:
+            self.assertFalse(future.done())
+            threading.Event().wait(0.01)
+        self.assertFalse(future.done())
+        with nova_client.servers.lock:
+            del nova_client.servers.statuses['1']
+        self.assertIsNone(future.result(5))
+
+    def test_missing_server_fails_active_wait(self):
+        nova_client = FakeNovaClient({})
+        future = self.waiter.wait(FakeServer('1', 'BUILD'), lambda: nova_client, timeout=5)
+        self.assertTrue(self.waiter.notify('1', 'active'))
+        with self.assertRaisesRegex(Exception, 'does not exist anymore'):
+            future.result(5)
+
+    def test_timeout(self):
+        nova_client = FakeNovaClient({'1': 'BUILD'})
+        future = self.waiter.wait(FakeServer('1', 'BUILD'), lambda: nova_client, timeout=0.1)
+        with self.assertRaisesRegex(Exception, 'Timeout'):
+            future.result(5)
+
+    def test_servers_are_polled_together(self):
+        nova_client = FakeNovaClient({'1': 'BUILD', '2': 'BUILD'})
+        futures = [self.waiter.wait(FakeServer(server_id, 'BUILD'), lambda: nova_client, timeout=5) for server_id in
+                   ('1', '2')]
+        with nova_client.servers.lock:
+            nova_client.servers.statuses.update({'1': 'ACTIVE', '2': 'ACTIVE'})
+            list_calls = nova_client.servers.list_calls
+        for future in futures:
+            future.result(5)
+        # a single poll after the change resolves both servers
+        self.assertLessEqual(nova_client.servers.list_calls - list_calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()